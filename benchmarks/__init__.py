@@ -0,0 +1 @@
+"""Benchmarks for Cheffu hot paths. Run individual modules with `python -m benchmarks.<module>`."""
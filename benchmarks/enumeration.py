@@ -0,0 +1,60 @@
+"""Compares walk enumeration strategies on the sample token paths.
+
+Run with `python -m benchmarks.enumeration`.
+"""
+
+import logging
+import timeit
+import typing as typ
+
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+
+BENCHMARKED_TOKEN_PATH_KEYS = ('kitchen_sink', 'symmetric_depth_2')
+
+ENUMERATORS: typ.Mapping[str, typ.Callable[..., typ.Iterable]] = {
+    'filter_after': par.yield_valid_hop_seqs,
+    'pruned': par.yield_pruned_valid_hop_seqs,
+}
+
+
+def bench_enumerators(*
+                      , token_path_key: str
+                      , number: int
+                      , repeat: int
+                      ) -> typ.Mapping[str, float]:
+    """Returns the best time per full enumeration, in seconds, for each enumerator."""
+    nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+        procedure_path=stp.SAMPLE_TOKEN_PATHS[token_path_key],
+    )
+
+    results = {}
+    for enumerator_name, enumerator in ENUMERATORS.items():
+        def run():
+            for _ in enumerator(nodule_out_edge_map=nodule_out_edge_map
+                                , edge_lookup_map=edge_lookup_map
+                                , start_nodule=start_nodule
+                                , close_nodule=close_nodule
+                                ):
+                pass
+
+        timings = timeit.repeat(run, number=number, repeat=repeat)
+        results[enumerator_name] = min(timings) / number
+
+    return results
+
+
+def main():
+    # Logging output would dominate the timings.
+    logging.disable(logging.CRITICAL)
+
+    for token_path_key in BENCHMARKED_TOKEN_PATH_KEYS:
+        results = bench_enumerators(token_path_key=token_path_key, number=10, repeat=5)
+        baseline = results['filter_after']
+        for enumerator_name, seconds in results.items():
+            print(f'{token_path_key:>20} {enumerator_name:>15}: {seconds * 1000:10.3f} ms '
+                  f'({baseline / seconds:6.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+"""Times the main stages of Cheffu on sample and synthetic token paths and sample recipes, and compares to a baseline.
+
+Run with `python -m benchmarks.suite`, optionally passing `--output` to write the timings as JSON, `--baseline` to
+compare them against a previously written file, and `--save-baseline` to store them as the new baseline. Passing
+`--baseline` without a file compares against the baseline committed alongside this module.
+
+Each benchmark case is warmed up before being timed, and the number of calls per round is chosen so that each round
+takes long enough to time reliably. The fastest round is used for comparisons, since it is the least affected by
+noise. Cases whose optional dependencies are not installed are skipped, and are left out of saved baselines along
+with cases that failed, so a baseline only ever holds real timings. The committed baseline was written with modgrammar,
+voluptuous and pydot installed, so it covers every benchmark.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import typing as typ
+
+import cheffu.parallel as par
+import cheffu.sample_recipes as srec
+import cheffu.sample_token_paths as stp
+import cheffu.synthetic as syn
+
+FORMAT_VERSION = 1
+
+# Baseline committed alongside this module. Timings depend on the machine, so it is best regenerated locally.
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+DEFAULT_WARM_UP = 3
+DEFAULT_REPEAT = 5
+
+# Minimum duration of a single timed round, in seconds.
+DEFAULT_MIN_ROUND_TIME = 0.05
+
+# How much slower than the baseline a case can be before it counts as a regression.
+DEFAULT_TOLERANCE = 0.25
+
+# Synthetic procedure paths benchmarked alongside the sample token paths, kept small enough to enumerate quickly.
+SYNTHETIC_PATH_PARAMS: typ.Mapping[str, syn.SyntheticPathParams] = {
+    'synthetic_long': syn.SyntheticPathParams(token_count=60
+                                              , alt_sequence_count=6
+                                              , slot_count=4
+                                              , slot_filter_overlap=0.5
+                                              ),
+    'synthetic_nested': syn.SyntheticPathParams(token_count=20
+                                                , alt_sequence_count=3
+                                                , alt_width=3
+                                                , nesting_depth=2
+                                                , null_alt_ratio=0.2
+                                                , slot_count=3
+                                                , slot_filter_overlap=0.3
+                                                ),
+}
+
+# Keys of all procedure paths that graph benchmarks are run on.
+TOKEN_PATH_KEYS: typ.Sequence[str] = (*stp.SAMPLE_TOKEN_PATHS, *SYNTHETIC_PATH_PARAMS)
+
+
+def _recipe_key(recipe_name: str, recipe: typ.Mapping[str, typ.Any]) -> str:
+    # Unnamed recipes are keyed by the last part of their URL instead, so no case name ends with an empty fixture.
+    if recipe_name:
+        return recipe_name
+    return os.path.splitext(recipe['url'].rstrip('/').rsplit('/', 1)[-1])[0]
+
+
+# Names of the sample recipes that recipe benchmarks are run on, by fixture key.
+RECIPE_NAMES: typ.Mapping[str, str] = {_recipe_key(name, recipe): name for name, recipe in srec.SAMPLE_RECIPES.items()}
+
+# Schemas used to validate the arguments of recipe tokens, by token keyword.
+# String, empty and integer arguments are validated by their type instead.
+ARGUMENT_SCHEMA_NAMES: typ.Mapping[str, str] = {
+    'QMAS': 'QUANTITY_MASS',
+    'QVOL': 'QUANTITY_VOLUME',
+    'QCNT': 'QUANTITY_COUNT',
+    'TIME': 'QUANTITY_TIME',
+    'DIVI': 'FRACTION',
+}
+
+# A benchmark case is set up once per fixture, and returns the function to time.
+CaseSetup = typ.Callable[[str], typ.Callable[[], typ.Any]]
+
+# Timings of a benchmark case, or the reason it was not timed.
+CaseResult = typ.Mapping[str, typ.Any]
+
+
+def yield_recipe_args(procedure: typ.Sequence) -> typ.Iterable[typ.Tuple[str, typ.Any]]:
+    """Yields the keyword and argument of each token in a sample recipe procedure, including nested alt items."""
+    for item in procedure:
+        if isinstance(item, dict):
+            yield from item.items()
+        elif isinstance(item, (list, tuple)):
+            yield from yield_recipe_args(item)
+
+
+def _get_recipe_procedure(recipe_key: str) -> typ.Sequence:
+    return srec.SAMPLE_RECIPES[RECIPE_NAMES[recipe_key]]['procedure']
+
+
+def _get_token_path(token_path_key: str) -> par.ProcedurePath:
+    if token_path_key in SYNTHETIC_PATH_PARAMS:
+        return syn.generate_procedure_path(params=SYNTHETIC_PATH_PARAMS[token_path_key])
+    return stp.SAMPLE_TOKEN_PATHS[token_path_key]
+
+
+def _process_token_path(token_path_key: str) -> typ.Tuple[par.NoduleOutEdgeMap, par.EdgeLookupMap,
+                                                           par.Nodule, par.Nodule]:
+    return par.process(procedure_path=_get_token_path(token_path_key))
+
+
+def setup_grammar_parsing(recipe_key: str) -> typ.Callable[[], typ.Any]:
+    import cheffu.defs as chdf
+
+    # Only string arguments are written in the recipe grammars. Some sample recipes use keywords that have no token
+    # definition yet, and those are left out.
+    def get_arg_conv(keyword: str):
+        token_def = chdf.TokenKeywordToDef.get(keyword)
+        return None if token_def is None else token_def.arg_conv
+
+    parsers_and_args = tuple((get_arg_conv(keyword).parser(), arg)
+                             for keyword, arg in yield_recipe_args(_get_recipe_procedure(recipe_key))
+                             if isinstance(arg, str) and get_arg_conv(keyword) is not None
+                             )
+
+    def run():
+        for parser, arg in parsers_and_args:
+            parser.parse_text(arg, reset=True, eof=True)
+
+    return run
+
+
+def setup_argument_validation(recipe_key: str) -> typ.Callable[[], typ.Any]:
+    import voluptuous
+
+    from cheffu.argument_schema import ArgumentSchemas
+
+    def get_schema(keyword: str, arg: typ.Any):
+        if keyword in ARGUMENT_SCHEMA_NAMES:
+            return getattr(ArgumentSchemas, ARGUMENT_SCHEMA_NAMES[keyword])
+        if isinstance(arg, int):
+            return ArgumentSchemas.POS_INT
+        return ArgumentSchemas.STRING_OR_NONE
+
+    schemas_and_args = tuple((get_schema(keyword, arg), arg)
+                             for keyword, arg in yield_recipe_args(_get_recipe_procedure(recipe_key))
+                             )
+
+    def run():
+        for schema, arg in schemas_and_args:
+            try:
+                schema(arg)
+            except voluptuous.Invalid:
+                pass
+
+    return run
+
+
+def setup_process(token_path_key: str) -> typ.Callable[[], typ.Any]:
+    token_path = _get_token_path(token_path_key)
+    return lambda: par.process(procedure_path=token_path)
+
+
+def setup_enumeration(token_path_key: str) -> typ.Callable[[], typ.Any]:
+    nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = _process_token_path(token_path_key)
+
+    def run():
+        for _ in par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                 , edge_lookup_map=edge_lookup_map
+                                                 , start_nodule=start_nodule
+                                                 , close_nodule=close_nodule
+                                                 ):
+            pass
+
+    return run
+
+
+def _all_stack_cmd_seqs(token_path_key: str) -> typ.Sequence[par.StackCommandSequence]:
+    nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = _process_token_path(token_path_key)
+
+    return tuple(par.flatten_stack_hop_seq(stack_hop_seq=stack_hop_seq)
+                 for _, stack_hop_seq in par.yield_all_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                , edge_lookup_map=edge_lookup_map
+                                                                , start_nodule=start_nodule
+                                                                , close_nodule=close_nodule
+                                                                )
+                 )
+
+
+def setup_stack_validation(token_path_key: str) -> typ.Callable[[], typ.Any]:
+    stack_cmd_seqs = _all_stack_cmd_seqs(token_path_key)
+
+    def run():
+        for stack_cmd_seq in stack_cmd_seqs:
+            par.validate_stack_cmd_seq(stack_cmd_seq=stack_cmd_seq)
+
+    return run
+
+
+def setup_vectorized_stack_validation(token_path_key: str) -> typ.Callable[[], typ.Any]:
+    import cheffu.vectorized as cvec
+
+    stack_cmd_seqs = _all_stack_cmd_seqs(token_path_key)
+    return lambda: cvec.validate_stack_cmd_seqs(stack_cmd_seqs=stack_cmd_seqs)
+
+
+def setup_graph_rendering(token_path_key: str) -> typ.Callable[[], typ.Any]:
+    import cheffu.graphviz as gv
+
+    nodule_out_edge_map, edge_lookup_map, _, _ = _process_token_path(token_path_key)
+
+    # Rendering to DOT source only needs pydot, and not the Graphviz binaries.
+    def run():
+        gv_graph = gv.make_graph(nodule_out_edge_map=nodule_out_edge_map, edge_lookup_map=edge_lookup_map)
+        return gv_graph.to_string()
+
+    return run
+
+
+# Benchmarks, along with their setup functions and the fixtures they are run on.
+BENCHMARKS: typ.Mapping[str, typ.Tuple[CaseSetup, typ.Sequence[str]]] = {
+    'grammar_parsing': (setup_grammar_parsing, tuple(RECIPE_NAMES)),
+    'argument_validation': (setup_argument_validation, tuple(RECIPE_NAMES)),
+    'process': (setup_process, TOKEN_PATH_KEYS),
+    'enumeration': (setup_enumeration, TOKEN_PATH_KEYS),
+    'stack_validation': (setup_stack_validation, TOKEN_PATH_KEYS),
+    'vectorized_stack_validation': (setup_vectorized_stack_validation, TOKEN_PATH_KEYS),
+    'graph_rendering': (setup_graph_rendering, TOKEN_PATH_KEYS),
+}
+
+
+def time_case(func: typ.Callable[[], typ.Any]
+              , *
+              , warm_up: int
+              , repeat: int
+              , min_round_time: float
+              ) -> CaseResult:
+    """Times a function, after warming it up. All times are in seconds per call."""
+    for _ in range(warm_up):
+        func()
+
+    # Pick the number of calls per round, so that each round takes at least the minimum round time.
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        round_time = timer.timeit(number)
+        if round_time >= min_round_time:
+            break
+        number *= 2 if round_time <= 0 else max(2, min(10, int(min_round_time / round_time) + 1))
+
+    timings = tuple(round_time / number for round_time in timer.repeat(repeat=repeat, number=number))
+
+    return {'status': 'ok'
+            , 'number': number
+            , 'repeat': repeat
+            , 'min': min(timings)
+            , 'median': statistics.median(timings)
+            , 'mean': statistics.mean(timings)
+            , 'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0
+            }
+
+
+def run_benchmarks(*
+                   , selected: typ.Optional[typ.Collection[str]] = None
+                   , warm_up: int = DEFAULT_WARM_UP
+                   , repeat: int = DEFAULT_REPEAT
+                   , min_round_time: float = DEFAULT_MIN_ROUND_TIME
+                   ) -> typ.Mapping[str, typ.Any]:
+    """Runs the selected benchmarks, or all of them, and returns a report of their timings by case name.
+    Case names are of the form '<benchmark>/<fixture>'.
+    """
+    results: typ.MutableMapping[str, CaseResult] = {}
+
+    for benchmark_name, (setup, fixture_keys) in BENCHMARKS.items():
+        if selected is not None and benchmark_name not in selected:
+            continue
+
+        for fixture_key in fixture_keys:
+            case_name = f'{benchmark_name}/{fixture_key}'
+            try:
+                func = setup(fixture_key)
+            except ImportError as e:
+                results[case_name] = {'status': 'skipped', 'reason': str(e)}
+                continue
+
+            try:
+                results[case_name] = time_case(func, warm_up=warm_up, repeat=repeat, min_round_time=min_round_time)
+            except Exception as e:
+                results[case_name] = {'status': 'error', 'reason': repr(e)}
+
+    return {'format_version': FORMAT_VERSION
+            , 'created': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+            , 'python': platform.python_version()
+            , 'platform': platform.platform()
+            , 'warm_up': warm_up
+            , 'min_round_time': min_round_time
+            , 'results': results
+            }
+
+
+def compare_to_baseline(*
+                        , report: typ.Mapping[str, typ.Any]
+                        , baseline: typ.Mapping[str, typ.Any]
+                        , tolerance: float = DEFAULT_TOLERANCE
+                        ) -> typ.Mapping[str, typ.Mapping[str, typ.Any]]:
+    """Compares the fastest timings of each case timed in both a report and a baseline.
+    A ratio above 1 means the case got slower.
+    """
+    comparisons = {}
+
+    for case_name, result in report['results'].items():
+        baseline_result = baseline['results'].get(case_name)
+        if result['status'] != 'ok' or baseline_result is None or baseline_result['status'] != 'ok':
+            continue
+
+        ratio = result['min'] / baseline_result['min']
+        comparisons[case_name] = {'baseline': baseline_result['min']
+                                  , 'current': result['min']
+                                  , 'ratio': ratio
+                                  , 'regressed': ratio > 1 + tolerance
+                                  }
+
+    return comparisons
+
+
+def format_report(report: typ.Mapping[str, typ.Any]
+                  , comparisons: typ.Mapping[str, typ.Mapping[str, typ.Any]]
+                  ) -> str:
+    lines = []
+    for case_name, result in report['results'].items():
+        if result['status'] != 'ok':
+            lines.append(f'{case_name:<50} {result["status"]}: {result["reason"]}')
+            continue
+
+        line = f'{case_name:<50} {result["min"] * 1e6:12.2f} us (median {result["median"] * 1e6:12.2f} us)'
+        if case_name in comparisons:
+            comparison = comparisons[case_name]
+            line += f' {comparison["ratio"]:6.2f}x baseline'
+            if comparison['regressed']:
+                line += ' REGRESSED'
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def main(args: typ.Optional[typ.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Times the main stages of Cheffu.')
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK'
+                        , help=f'benchmarks to run, out of: {", ".join(BENCHMARKS)}; all if not given')
+    parser.add_argument('--output', help='file to write the timings to, as JSON')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE_PATH
+                        , help='file of previously written timings to compare against; the committed one if not given')
+    parser.add_argument('--save-baseline', help='file to write only the timings to, for use as a future baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE
+                        , help='fraction by which a case can be slower than the baseline before it counts as regressed')
+    parser.add_argument('--warm-up', type=int, default=DEFAULT_WARM_UP, help='untimed calls before timing')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='number of timed rounds')
+    parser.add_argument('--min-round-time', type=float, default=DEFAULT_MIN_ROUND_TIME
+                        , help='minimum duration of a timed round, in seconds')
+    parsed = parser.parse_args(args)
+
+    unknown = [name for name in parsed.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+
+    # Logging output would dominate the timings.
+    logging.disable(logging.CRITICAL)
+
+    report = run_benchmarks(selected=parsed.benchmarks or None
+                            , warm_up=parsed.warm_up
+                            , repeat=parsed.repeat
+                            , min_round_time=parsed.min_round_time
+                            )
+
+    comparisons = {}
+    if parsed.baseline is not None:
+        with open(parsed.baseline) as f:
+            baseline = json.load(f)
+        comparisons = compare_to_baseline(report=report, baseline=baseline, tolerance=parsed.tolerance)
+
+    # Baselines only hold the raw timings of cases that were timed, since comparisons against an older baseline
+    # would go stale, and a case skipped on this machine says nothing about how fast it is on another.
+    if parsed.save_baseline is not None:
+        timed_results = {case_name: result for case_name, result in report['results'].items()
+                         if result['status'] == 'ok'}
+        with open(parsed.save_baseline, 'w') as f:
+            json.dump({**report, 'results': timed_results}, f, indent=2, sort_keys=True)
+
+    if parsed.output is not None:
+        with open(parsed.output, 'w') as f:
+            json.dump({**report, 'comparisons': comparisons}, f, indent=2, sort_keys=True)
+
+    print(format_report(report, comparisons))
+
+    failed = any(result['status'] == 'error' for result in report['results'].values())
+    regressed = any(comparison['regressed'] for comparison in comparisons.values())
+    return 1 if failed or regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Asyncio counterparts of the walk enumeration and resolution functions in cheffu.parallel.
+
+Walk enumeration is CPU-bound, so the async generators here either hand control back to the event loop every so many
+hops tried, including those of walks that turn out to be invalid, or run the synchronous generators in an executor
+one chunk at a time. Either way, walks are only produced as they are consumed, so a slow consumer never has more
+than a chunk of walks waiting for it. Closing or cancelling a generator stops its enumeration.
+"""
+
+import asyncio
+import concurrent.futures as cf
+import functools as ft
+import itertools
+import threading
+import typing as typ
+
+import cheffu.logging as clog
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.types.tokens as ctpt
+
+logger = clog.get_logger(__name__)
+
+# Number of hops tried after which control is handed back to the event loop.
+DEFAULT_HOPS_PER_YIELD = 1000
+
+# Number of walks enumerated by each executor job.
+DEFAULT_CHUNK_SIZE = 1000
+
+ValidHopSeq = typ.Tuple[par.GraphHopSequence, par.StackHopSequence, par.SlotFilterChoiceSequence]
+
+
+async def _yield_cooperatively(*
+                               , nodule_out_edge_map: par.NoduleOutEdgeMap
+                               , edge_lookup_map: par.EdgeLookupMap
+                               , start_nodule: par.Nodule
+                               , close_nodule: par.Nodule
+                               , prune: bool
+                               , hops_per_yield: int
+                               ) -> typ.AsyncIterator[ValidHopSeq]:
+    """Yields valid walks, handing control back to the event loop every so many hops tried."""
+    valid_hop_seqs = par.yield_valid_hop_seqs_in_steps(nodule_out_edge_map=nodule_out_edge_map
+                                                       , edge_lookup_map=edge_lookup_map
+                                                       , start_nodule=start_nodule
+                                                       , close_nodule=close_nodule
+                                                       , prune=prune
+                                                       , step_interval=hops_per_yield
+                                                       )
+    try:
+        for valid_hop_seq in valid_hop_seqs:
+            if valid_hop_seq is None:
+                await asyncio.sleep(0)
+            else:
+                yield valid_hop_seq
+    finally:
+        valid_hop_seqs.close()
+
+
+async def yield_valid_hop_seqs(*
+                               , nodule_out_edge_map: par.NoduleOutEdgeMap
+                               , edge_lookup_map: par.EdgeLookupMap
+                               , start_nodule: par.Nodule
+                               , close_nodule: par.Nodule = None
+                               , hops_per_yield: int = DEFAULT_HOPS_PER_YIELD
+                               ) -> typ.AsyncIterator[ValidHopSeq]:
+    """Async counterpart of parallel.yield_valid_hop_seqs, yielding to the event loop every so many hops."""
+    async for valid_hop_seq in _yield_cooperatively(nodule_out_edge_map=nodule_out_edge_map
+                                                    , edge_lookup_map=edge_lookup_map
+                                                    , start_nodule=start_nodule
+                                                    , close_nodule=close_nodule
+                                                    , prune=False
+                                                    , hops_per_yield=hops_per_yield
+                                                    ):
+        yield valid_hop_seq
+
+
+async def yield_pruned_valid_hop_seqs(*
+                                      , nodule_out_edge_map: par.NoduleOutEdgeMap
+                                      , edge_lookup_map: par.EdgeLookupMap
+                                      , start_nodule: par.Nodule
+                                      , close_nodule: par.Nodule = None
+                                      , hops_per_yield: int = DEFAULT_HOPS_PER_YIELD
+                                      ) -> typ.AsyncIterator[ValidHopSeq]:
+    """Async counterpart of parallel.yield_pruned_valid_hop_seqs, yielding to the event loop every so many hops."""
+    async for valid_hop_seq in _yield_cooperatively(nodule_out_edge_map=nodule_out_edge_map
+                                                    , edge_lookup_map=edge_lookup_map
+                                                    , start_nodule=start_nodule
+                                                    , close_nodule=close_nodule
+                                                    , prune=True
+                                                    , hops_per_yield=hops_per_yield
+                                                    ):
+        yield valid_hop_seq
+
+
+async def yield_pruned_valid_hop_seqs_in_executor(*
+                                                  , nodule_out_edge_map: par.NoduleOutEdgeMap
+                                                  , edge_lookup_map: par.EdgeLookupMap
+                                                  , start_nodule: par.Nodule
+                                                  , close_nodule: par.Nodule = None
+                                                  , executor: cf.Executor = None
+                                                  , chunk_size: int = DEFAULT_CHUNK_SIZE
+                                                  ) -> typ.AsyncIterator[ValidHopSeq]:
+    """Async counterpart of parallel.yield_pruned_valid_hop_seqs, enumerating chunks of walks in an executor.
+    The executor must run jobs in this process, such as a thread pool. If not given, the event loop's default
+    executor is used. The next chunk is only started once the previous one has been consumed.
+    """
+    valid_hop_seqs = par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                     , edge_lookup_map=edge_lookup_map
+                                                     , start_nodule=start_nodule
+                                                     , close_nodule=close_nodule
+                                                     )
+
+    # Lets a running chunk stop early once the consumer has gone away.
+    stopped = threading.Event()
+
+    # Held while a chunk is using the generator, since it cannot be closed from another thread meanwhile.
+    chunk_lock = threading.Lock()
+
+    def close_if_idle():
+        if chunk_lock.acquire(blocking=False):
+            try:
+                valid_hop_seqs.close()
+            finally:
+                chunk_lock.release()
+
+    def take_chunk() -> typ.Sequence[ValidHopSeq]:
+        chunk = []
+        with chunk_lock:
+            for valid_hop_seq in itertools.islice(valid_hop_seqs, chunk_size):
+                if stopped.is_set():
+                    break
+                chunk.append(valid_hop_seq)
+
+        # If the consumer went away while this chunk was running, it was not able to close the generator.
+        if stopped.is_set():
+            close_if_idle()
+
+        return chunk
+
+    loop = asyncio.get_running_loop()
+
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, take_chunk)
+            if not chunk:
+                break
+
+            for valid_hop_seq in chunk:
+                yield valid_hop_seq
+    finally:
+        stopped.set()
+        close_if_idle()
+
+
+async def _run_in_executor(executor: typ.Optional[cf.Executor], func: typ.Callable, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, ft.partial(func, **kwargs))
+
+
+async def resolve_walk_from_choice_seq(*
+                                       , nodule_out_edge_map: par.NoduleOutEdgeMap
+                                       , edge_lookup_map: par.EdgeLookupMap
+                                       , start_nodule: par.Nodule
+                                       , close_nodule: par.Nodule = None
+                                       , choice_seq: par.SlotFilterChoiceSequence
+                                       , executor: cf.Executor = None
+                                       ) -> typ.Tuple[par.GraphWalk, ctpt.TokenSequence]:
+    """Async counterpart of parallel.resolve_walk_from_choice_seq, run in an executor."""
+    return await _run_in_executor(executor
+                                  , par.resolve_walk_from_choice_seq
+                                  , nodule_out_edge_map=nodule_out_edge_map
+                                  , edge_lookup_map=edge_lookup_map
+                                  , start_nodule=start_nodule
+                                  , close_nodule=close_nodule
+                                  , choice_seq=choice_seq
+                                  )
+
+
+async def resolve_walk_from_slot_selection(*
+                                           , nodule_out_edge_map: par.NoduleOutEdgeMap
+                                           , edge_lookup_map: par.EdgeLookupMap
+                                           , start_nodule: par.Nodule
+                                           , close_nodule: par.Nodule = None
+                                           , slot_selection: sf.SlotSelection
+                                           , executor: cf.Executor = None
+                                           ) -> typ.Tuple[par.GraphWalk, ctpt.TokenSequence]:
+    """Async counterpart of parallel.resolve_walk_from_slot_selection, run in an executor."""
+    return await _run_in_executor(executor
+                                  , par.resolve_walk_from_slot_selection
+                                  , nodule_out_edge_map=nodule_out_edge_map
+                                  , edge_lookup_map=edge_lookup_map
+                                  , start_nodule=start_nodule
+                                  , close_nodule=close_nodule
+                                  , slot_selection=slot_selection
+                                  )
+
+
+async def get_valid_hop_seq(*
+                            , nodule_out_edge_map: par.NoduleOutEdgeMap
+                            , edge_lookup_map: par.EdgeLookupMap
+                            , start_nodule: par.Nodule
+                            , close_nodule: par.Nodule = None
+                            , index: int
+                            , walk_count_table: par.WalkCountTable = None
+                            , executor: cf.Executor = None
+                            ) -> ValidHopSeq:
+    """Async counterpart of parallel.get_valid_hop_seq, run in an executor."""
+    return await _run_in_executor(executor
+                                  , par.get_valid_hop_seq
+                                  , nodule_out_edge_map=nodule_out_edge_map
+                                  , edge_lookup_map=edge_lookup_map
+                                  , start_nodule=start_nodule
+                                  , close_nodule=close_nodule
+                                  , index=index
+                                  , walk_count_table=walk_count_table
+                                  )
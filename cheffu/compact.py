@@ -0,0 +1,208 @@
+"""Compact, integer-indexed representation of processed Cheffu graphs.
+
+Nodules and edges are numbered densely, starting from zero. Out edges are stored in compressed sparse row (CSR)
+form: edges are numbered in order of their source nodule, so the out edges of nodule N are exactly the edges
+numbered from out_edge_offsets[N] up to (but not including) out_edge_offsets[N + 1].
+"""
+
+import array
+import collections.abc
+import typing as typ
+
+import cheffu.helpers as chlp
+import cheffu.parallel as par
+import cheffu.types.tokens as ctpt
+
+# Array type code used for all integer tables.
+INDEX_TYPE_CODE = 'I'
+
+# Index of the no-op stack command in the stack command table.
+NO_OP_STACK_CMD_INDEX = 0
+
+
+class CompactGraph(typ.NamedTuple):
+    # Original nodule and edge IDs, indexed by their dense integer counterparts.
+    nodule_ids: typ.Sequence[par.Nodule]
+    edge_ids: typ.Sequence[par.EdgeId]
+
+    start_nodule: int
+    close_nodule: int
+
+    # CSR out edge table, with one more entry than there are nodules.
+    out_edge_offsets: typ.Sequence[int]
+
+    # Per-edge source and destination nodules.
+    edge_src_nodules: typ.Sequence[int]
+    edge_dst_nodules: typ.Sequence[int]
+
+    # Per-edge indices into the interned stack command table.
+    edge_start_cmds: typ.Sequence[int]
+    edge_close_cmds: typ.Sequence[int]
+    stack_cmds: typ.Sequence[par.StackCommand]
+
+    # Token table, with the tokens of edge E found from edge_token_offsets[E] up to edge_token_offsets[E + 1].
+    edge_token_offsets: typ.Sequence[int]
+    tokens: ctpt.TokenSequence
+
+    @property
+    def nodule_count(self) -> int:
+        return len(self.out_edge_offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_dst_nodules)
+
+    def out_edges(self, nodule: int) -> typ.Sequence[int]:
+        return range(self.out_edge_offsets[nodule], self.out_edge_offsets[nodule + 1])
+
+    def token_seq(self, edge: int) -> ctpt.TokenSequence:
+        return self.tokens[self.edge_token_offsets[edge]:self.edge_token_offsets[edge + 1]]
+
+    def edge_def(self, edge: int) -> par.EdgeDef:
+        return par.EdgeDef(id=edge
+                           , src_nodule=self.edge_src_nodules[edge]
+                           , dst_nodule=self.edge_dst_nodules[edge]
+                           , token_seq=self.token_seq(edge)
+                           , start_cmd=self.stack_cmds[self.edge_start_cmds[edge]]
+                           , close_cmd=self.stack_cmds[self.edge_close_cmds[edge]]
+                           )
+
+
+def make_compact_graph(*
+                       , nodule_out_edge_map: par.NoduleOutEdgeMap
+                       , edge_lookup_map: par.EdgeLookupMap
+                       , start_nodule: par.Nodule
+                       , close_nodule: par.Nodule
+                       ) -> CompactGraph:
+    """Converts a nodule out edge map/edge lookup map combo into a compact graph.
+    The iteration order of each nodule's out edges is preserved.
+    """
+    nodule_ids: typ.Sequence[par.Nodule] = tuple(nodule_out_edge_map)
+    nodule_index_map: typ.Mapping[par.Nodule, int] = {nodule: i for i, nodule in enumerate(nodule_ids)}
+
+    edge_ids: typ.MutableSequence[par.EdgeId] = []
+    out_edge_offsets = array.array(INDEX_TYPE_CODE, [0])
+    edge_src_nodules = array.array(INDEX_TYPE_CODE)
+    edge_dst_nodules = array.array(INDEX_TYPE_CODE)
+    edge_start_cmds = array.array(INDEX_TYPE_CODE)
+    edge_close_cmds = array.array(INDEX_TYPE_CODE)
+    edge_token_offsets = array.array(INDEX_TYPE_CODE, [0])
+    tokens: typ.MutableSequence[ctpt.Token] = []
+
+    # Stack commands are interned, since most of them are shared between many edges.
+    stack_cmds: typ.MutableSequence[par.StackCommand] = [None]
+    stack_cmd_index_map: typ.MutableMapping[par.StackCommand, int] = {None: NO_OP_STACK_CMD_INDEX}
+
+    def intern_stack_cmd(stack_cmd: par.StackCommand) -> int:
+        if stack_cmd not in stack_cmd_index_map:
+            stack_cmd_index_map[stack_cmd] = len(stack_cmds)
+            stack_cmds.append(stack_cmd)
+        return stack_cmd_index_map[stack_cmd]
+
+    for src_index, nodule in enumerate(nodule_ids):
+        for edge_id in nodule_out_edge_map[nodule]:
+            edge_def: par.EdgeDef = edge_lookup_map[edge_id]
+
+            edge_ids.append(edge_id)
+            edge_src_nodules.append(src_index)
+            edge_dst_nodules.append(nodule_index_map[edge_def.dst_nodule])
+            edge_start_cmds.append(intern_stack_cmd(edge_def.start_cmd))
+            edge_close_cmds.append(intern_stack_cmd(edge_def.close_cmd))
+
+            tokens.extend(edge_def.token_seq)
+            edge_token_offsets.append(len(tokens))
+
+        out_edge_offsets.append(len(edge_ids))
+
+    return CompactGraph(nodule_ids=nodule_ids
+                        , edge_ids=tuple(edge_ids)
+                        , start_nodule=nodule_index_map[start_nodule]
+                        , close_nodule=nodule_index_map[close_nodule]
+                        , out_edge_offsets=out_edge_offsets
+                        , edge_src_nodules=edge_src_nodules
+                        , edge_dst_nodules=edge_dst_nodules
+                        , edge_start_cmds=edge_start_cmds
+                        , edge_close_cmds=edge_close_cmds
+                        , stack_cmds=tuple(stack_cmds)
+                        , edge_token_offsets=edge_token_offsets
+                        , tokens=tuple(tokens)
+                        )
+
+
+class CompactNoduleOutEdgeMap(collections.abc.Mapping):
+    """Read-only nodule out edge map view over a compact graph, keyed by integer nodules."""
+    def __init__(self, compact_graph: CompactGraph):
+        self._compact_graph = compact_graph
+
+    def __getitem__(self, nodule: int) -> typ.Sequence[int]:
+        if not 0 <= nodule < self._compact_graph.nodule_count:
+            raise KeyError(nodule)
+        return self._compact_graph.out_edges(nodule)
+
+    def __iter__(self) -> typ.Iterator[int]:
+        return iter(range(self._compact_graph.nodule_count))
+
+    def __len__(self) -> int:
+        return self._compact_graph.nodule_count
+
+
+class CompactEdgeLookupMap(collections.abc.Mapping):
+    """Read-only edge lookup map view over a compact graph, keyed by integer edges.
+    Edge definitions are created on demand, and are not kept around.
+    """
+    def __init__(self, compact_graph: CompactGraph):
+        self._compact_graph = compact_graph
+
+    def __getitem__(self, edge: int) -> par.EdgeDef:
+        if not 0 <= edge < self._compact_graph.edge_count:
+            raise KeyError(edge)
+        return self._compact_graph.edge_def(edge)
+
+    def __iter__(self) -> typ.Iterator[int]:
+        return iter(range(self._compact_graph.edge_count))
+
+    def __len__(self) -> int:
+        return self._compact_graph.edge_count
+
+
+def view_compact_graph(compact_graph: CompactGraph
+                       ) -> typ.Tuple[par.NoduleOutEdgeMap, par.EdgeLookupMap, int, int]:
+    """Returns map views over a compact graph, keyed by integer nodules and edges.
+    These can be passed directly to the walk enumerators in cheffu.parallel, and to cheffu.graphviz.make_graph.
+    """
+    return (CompactNoduleOutEdgeMap(compact_graph)
+            , CompactEdgeLookupMap(compact_graph)
+            , compact_graph.start_nodule
+            , compact_graph.close_nodule
+            )
+
+
+def expand_compact_graph(compact_graph: CompactGraph
+                         ) -> typ.Tuple[par.NoduleOutEdgeMap, par.EdgeLookupMap, par.Nodule, par.Nodule]:
+    """Converts a compact graph back into a nodule out edge map/edge lookup map combo, using the original IDs."""
+    nodule_ids = compact_graph.nodule_ids
+    edge_ids = compact_graph.edge_ids
+
+    nodule_out_edge_map: par.MutNoduleOutEdgeMap = {}
+    edge_lookup_map: par.MutEdgeLookupMap = {}
+
+    for nodule in range(compact_graph.nodule_count):
+        out_edge_ids = chlp.OrderedSet()
+
+        for edge in compact_graph.out_edges(nodule):
+            compact_edge_def: par.EdgeDef = compact_graph.edge_def(edge)
+            edge_id: par.EdgeId = edge_ids[edge]
+
+            edge_lookup_map[edge_id] = compact_edge_def._replace(id=edge_id
+                                                                 , src_nodule=nodule_ids[nodule]
+                                                                 , dst_nodule=nodule_ids[compact_edge_def.dst_nodule]
+                                                                 )
+            out_edge_ids.add(edge_id)
+
+        nodule_out_edge_map[nodule_ids[nodule]] = out_edge_ids
+
+    return (nodule_out_edge_map
+            , edge_lookup_map
+            , nodule_ids[compact_graph.start_nodule]
+            , nodule_ids[compact_graph.close_nodule]
+            )
@@ -28,3 +28,15 @@ class SlotFilterStackNonempty(SlotFilterStackException):
 
 class SlotFilterStackResultMismatch(SlotFilterStackException):
     """Raised when the value popped from a slot filter stack does not match the expected value."""
+
+
+class InvalidWalkCursor(CheffuBaseException):
+    """Raised when a walk cursor does not describe a valid walk of a Cheffu graph."""
+
+
+class InvalidGraphFile(CheffuBaseException):
+    """Raised when a file does not contain a Cheffu graph in a supported binary format."""
+
+
+class UnsupportedGraphContent(CheffuBaseException):
+    """Raised when a Cheffu graph contains IDs or tokens that cannot be stored in the binary graph format."""
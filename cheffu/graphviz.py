@@ -4,6 +4,7 @@ import pydot
 
 import cheffu.parallel as par
 import cheffu.logging as clog
+import cheffu.tracing as ctr
 import cheffu.types.common as ctpc
 import cheffu.types.tokens as ctpt
 
@@ -13,6 +14,9 @@ GraphvizId = typ.NewType('GraphvizId', str)
 UniqueIdConverter = typ.Callable[[ctpc.UniqueId], GraphvizId]
 TokenConverter = typ.Callable[[ctpt.Token], str]
 
+NODULE_KIND = 'nodule'
+TOKEN_KIND = 'token'
+
 
 def make_graph(*
                , nodule_out_edge_map: par.NoduleOutEdgeMap
@@ -20,6 +24,8 @@ def make_graph(*
                , unique_id_conv: UniqueIdConverter=None
                , token_conv: TokenConverter=None
                ) -> pydot.Graph:
+    span = ctr.span('make_graph', edge_count=len(edge_lookup_map))
+
     # If ID converter is not specified, use the default.
     if unique_id_conv is None:
         logger.info('Unique ID converter not specified, using default converter')
@@ -36,37 +42,38 @@ def make_graph(*
             return str(token_data)
 
     # Storage for Graphviz nodes and edges.
-    gv_node_map: typ.MutableMapping[ctpc.UniqueId, pydot.Node] = {}
+    # Nodules and tokens may be allocated from separate ID generators, so their IDs are kept apart.
+    gv_node_map: typ.MutableMapping[typ.Tuple[str, ctpc.UniqueId], pydot.Node] = {}
     gv_edges: typ.MutableSequence[pydot.Edge] = []
 
     # Create Graphviz nodes from nodules.
     nodule_count = 0
     for nodule in nodule_out_edge_map:
-        nodule_gv_node = pydot.Node(name=unique_id_conv(nodule)
+        nodule_gv_node = pydot.Node(name=f'{NODULE_KIND}_{unique_id_conv(nodule)}'
                                     , shape='point'
                                     , width=0.125
                                     , height=0.125
                                     )
 
-        gv_node_map[nodule] = nodule_gv_node
+        gv_node_map[NODULE_KIND, nodule] = nodule_gv_node
         nodule_count += 1
 
-    logger.info(f'Created {nodule_count} Graphviz node(s) from nodules')
+    logger.info('Created %d Graphviz node(s) from nodules', nodule_count)
 
     # Create Graphviz nodes from tokens.
     token_count = 0
     for token in itertools.chain.from_iterable(edge_def.token_seq for edge_def in edge_lookup_map.values()):
         token_id: ctpt.TokenId = token.id
 
-        token_gv_node = pydot.Node(name=unique_id_conv(token_id)
+        token_gv_node = pydot.Node(name=f'{TOKEN_KIND}_{unique_id_conv(token_id)}'
                                    , shape='circle'
                                    , label=token_conv(token)
                                    )
 
-        gv_node_map[token_id] = token_gv_node
+        gv_node_map[TOKEN_KIND, token_id] = token_gv_node
         token_count += 1
 
-    logger.info(f'Created {token_count} Graphviz node(s) from tokens')
+    logger.info('Created %d Graphviz node(s) from tokens', token_count)
 
     # Creating Graphviz edges are more complicated.
     # An edge needs to be drawn between nodules and tokens, not just from nodule to nodule.
@@ -79,7 +86,7 @@ def make_graph(*
         token_seq: ctpt.TokenSequence = edge_def.token_seq
 
         # For this edge definition, this stores the newest node ID to connect a Graphviz edge from.
-        curr_anchor_node_id: ctpc.UniqueId = src_nodule
+        curr_anchor_node_key: typ.Tuple[str, ctpc.UniqueId] = (NODULE_KIND, src_nodule)
         tail_label: str = par.stack_cmd_label_str(edge_def.start_cmd)
         head_label: str = par.stack_cmd_label_str(edge_def.close_cmd)
 
@@ -87,8 +94,8 @@ def make_graph(*
             token_id: ctpt.TokenId = token.id
 
             # Draw a Graphviz edge (without arrowhead) from the current anchor node to this token.
-            gv_edge = pydot.Edge(gv_node_map[curr_anchor_node_id]
-                                 , gv_node_map[token_id]
+            gv_edge = pydot.Edge(gv_node_map[curr_anchor_node_key]
+                                 , gv_node_map[TOKEN_KIND, token_id]
                                  , arrowhead='none'
                                  , headlabel=''
                                  , taillabel=tail_label
@@ -98,13 +105,13 @@ def make_graph(*
 
             gv_edges.append(gv_edge)
 
-            # Update the current anchor node ID.
-            curr_anchor_node_id = token_id
+            # Update the current anchor node key.
+            curr_anchor_node_key = (TOKEN_KIND, token_id)
 
         # Draw a Graphviz edge from the current anchor node to the destination nodule.
         # This edge will have an arrowhead.
-        gv_edge = pydot.Edge(gv_node_map[curr_anchor_node_id]
-                             , gv_node_map[dst_nodule]
+        gv_edge = pydot.Edge(gv_node_map[curr_anchor_node_key]
+                             , gv_node_map[NODULE_KIND, dst_nodule]
                              , arrowhead='vee'
                              , headlabel=head_label
                              , taillabel=tail_label
@@ -115,7 +122,7 @@ def make_graph(*
 
     actual_edge_count = len(gv_edges)
 
-    logger.info(f'Created {actual_edge_count} Graphviz edge(s) from {virtual_edge_count} virtual edge(s)')
+    logger.info('Created %d Graphviz edge(s) from %d virtual edge(s)', actual_edge_count, virtual_edge_count)
 
     # Create Graphviz graph, and add nodes and edges to it.
     graph: pydot.Graph = pydot.Dot(graph_type='digraph'
@@ -130,4 +137,6 @@ def make_graph(*
     for gv_edge in gv_edges:
         graph.add_edge(gv_edge)
 
+    span.finish(gv_node_count=len(gv_node_map), gv_edge_count=actual_edge_count)
+
     return graph
@@ -1,3 +1,4 @@
+import collections.abc
 import itertools
 import contextlib
 import math
@@ -36,3 +37,111 @@ def yield_sum_splits(n: int) -> typ.Iterable[typ.Tuple[int, int]]:
     an = abs(n)
     for i in range(an + 1):
         yield (sign * i, sign * (an - i))
+
+
+class OrderedSet(collections.abc.MutableSet):
+    """A set that iterates over its items in insertion order."""
+    def __init__(self, iterable=()):
+        self._items = dict.fromkeys(iterable)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._items[item] = None
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self._items)!r})'
+
+
+class PersistentStack(collections.abc.Sequence):
+    """An immutable linked stack, where each pushed stack shares its items with the stack it was pushed onto.
+    Pushing, popping and peeking at the top item are O(1), and hashes are computed once and cached.
+    Items are indexed and iterated from the bottom of the stack to the top, like a tuple.
+    """
+    __slots__ = ('_parent', '_top', '_len', '_hash')
+
+    def __init__(self, parent: 'PersistentStack' = None, top: typ.Any = None):
+        """Creates an empty stack, or a stack with an item on top of a parent stack. Prefer using push()."""
+        self._parent = parent
+        self._top = top
+        self._len = 0 if parent is None else parent._len + 1
+        self._hash = hash(()) if parent is None else hash((parent._hash, top))
+
+    @classmethod
+    def from_iterable(cls, items: typ.Iterable) -> 'PersistentStack':
+        stack = cls()
+        for item in items:
+            stack = stack.push(item)
+        return stack
+
+    @property
+    def parent(self) -> typ.Optional['PersistentStack']:
+        return self._parent
+
+    @property
+    def top(self) -> typ.Any:
+        if not self._len:
+            raise IndexError('top of empty stack')
+        return self._top
+
+    def push(self, item: typ.Any) -> 'PersistentStack':
+        return PersistentStack(self, item)
+
+    def pop(self) -> 'PersistentStack':
+        if not self._len:
+            raise IndexError('pop from empty stack')
+        return self._parent
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('stack index out of range')
+
+        # Walk down from the top, so that items near the top are found quickly.
+        stack = self
+        for _ in range(self._len - 1 - index):
+            stack = stack._parent
+        return stack._top
+
+    def __iter__(self) -> typ.Iterator:
+        items = []
+        stack = self
+        while stack._len:
+            items.append(stack._top)
+            stack = stack._parent
+        return reversed(items)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PersistentStack):
+            return NotImplemented
+
+        # Stop as soon as both stacks share the rest of their items.
+        stack_a, stack_b = self, other
+        while stack_a is not stack_b:
+            if stack_a._len != stack_b._len or stack_a._hash != stack_b._hash or stack_a._top != stack_b._top:
+                return False
+            stack_a, stack_b = stack_a._parent, stack_b._parent
+        return True
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}.from_iterable({list(self)!r})'
@@ -0,0 +1,50 @@
+"""Allocation of IDs for nodules, edges and tokens.
+
+Any zero-argument callable returning hashable values can be used as an ID generator. The generators here avoid the
+cost of random UUIDs, and produce the same IDs for the same inputs across runs and processes.
+"""
+
+import hashlib
+import itertools
+import typing as typ
+import uuid
+
+import cheffu.types.common as ctpc
+
+# Size of content-addressed IDs, in bytes.
+CONTENT_ID_SIZE = 16
+
+
+def make_counter_id_gen(start: int = 0) -> ctpc.UniqueIdGen:
+    """Creates an ID generator that yields monotonically increasing integers.
+    IDs are only unique within a generator, so use a fresh generator per graph.
+    """
+    return itertools.count(start).__next__
+
+
+def make_content_id(*parts: typ.Any) -> ctpc.UniqueId:
+    """Creates an ID from the hash of one or more parts.
+    Parts are hashed using their repr, so they should have a repr that is stable across runs.
+    """
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=CONTENT_ID_SIZE).digest()
+    return uuid.UUID(bytes=digest)
+
+
+def make_seeded_id_gen(seed: typ.Any) -> ctpc.UniqueIdGen:
+    """Creates an ID generator that yields content-addressed IDs of a seed and a running count.
+    Generators with the same seed yield the same IDs, and generators with different seeds do not collide.
+    """
+    counter = itertools.count()
+
+    def seeded_id_gen() -> ctpc.UniqueId:
+        return make_content_id(seed, next(counter))
+
+    return seeded_id_gen
+
+
+def make_token_id(*
+                  , token_data: typ.Any
+                  , position: int
+                  ) -> ctpc.UniqueId:
+    """Creates a content-addressed token ID from the token data and its position in a recipe."""
+    return make_content_id('token', position, token_data)
@@ -1,17 +1,143 @@
+"""Logging setup shared by all Cheffu modules.
+
+All Cheffu loggers live under the 'cheffu' logger, which gets a single stream handler the first time a logger is
+requested. The level defaults to WARNING, and can be set using the CHEFFU_LOG_LEVEL environment variable or configure.
+
+Log calls should pass %-style arguments instead of pre-formatted strings, and wrap anything expensive to compute in
+lazy, so that messages below the current level cost no more than a level check.
+"""
+
+import collections
 import logging
+import os
+import sys
+import typing as typ
 
+ROOT_LOGGER_NAME = 'cheffu'
 
-def get_logger(name: str) -> logging.Logger:
-    """Gets logger instance, and sets options for consistency.
+# Environment variable holding the level name or number to use, if configure is not given one.
+LOG_LEVEL_ENV_VAR = 'CHEFFU_LOG_LEVEL'
+DEFAULT_LOG_LEVEL = logging.WARNING
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Number of records kept by a ring buffer sink.
+DEFAULT_RING_BUFFER_CAPACITY = 1000
+
+LogLevel = typ.Union[int, str]
+
+# The single stream handler attached to the root Cheffu logger, once configured.
+_handler: typ.Optional[logging.Handler] = None
+
+
+class LazyMessage:
+    """Log message that is only computed if it is actually emitted, and at most once even if there are many handlers."""
+    __slots__ = ('func', 'args', '_message')
+
+    def __init__(self, func: typ.Callable[..., typ.Any], *args):
+        self.func = func
+        self.args = args
+        self._message: typ.Optional[str] = None
+
+    def __str__(self) -> str:
+        if self._message is None:
+            self._message = str(self.func(*self.args))
+        return self._message
+
+
+def lazy(func: typ.Callable[..., typ.Any], *args) -> LazyMessage:
+    """Wraps a callable and its arguments, to be used as a log message or as a %-style log argument."""
+    return LazyMessage(func, *args)
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent log records in memory, discarding the oldest once full."""
+    def __init__(self, capacity: int = DEFAULT_RING_BUFFER_CAPACITY, level: LogLevel = logging.NOTSET):
+        super().__init__(level=level)
+        self.records: typ.Deque[logging.LogRecord] = collections.deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def messages(self) -> typ.Sequence[str]:
+        """Returns the kept records, oldest first, formatted using this handler's formatter."""
+        return tuple(self.format(record) for record in self.records)
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+def resolve_level(level: typ.Optional[LogLevel] = None) -> int:
+    """Converts a level name or number into a level number.
+    If no level is given, the level in the environment is used, falling back to the default level if not set.
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV_VAR) or DEFAULT_LOG_LEVEL
+
+    if isinstance(level, int):
+        return level
+
+    level = level.strip()
+    if level.isdigit():
+        return int(level)
+
+    level_number = logging.getLevelName(level.upper())
+    if not isinstance(level_number, int):
+        raise ValueError(f'Unknown log level: {level}')
+
+    return level_number
+
+
+def configure(*
+              , level: typ.Optional[LogLevel] = None
+              , stream: typ.Optional[typ.TextIO] = None
+              , fmt: str = LOG_FORMAT
+              ) -> logging.Logger:
+    """Sets the level of the root Cheffu logger, and replaces its shared stream handler.
+    The stream defaults to stderr. Can be called again at any time to change the level or stream.
+    """
+    global _handler
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(resolve_level(level))
+
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(logging.Formatter(fmt))
+
+    if _handler is not None:
+        root_logger.removeHandler(_handler)
+    root_logger.addHandler(handler)
+    _handler = handler
+
+    return root_logger
+
+
+def add_ring_buffer(*
+                    , capacity: int = DEFAULT_RING_BUFFER_CAPACITY
+                    , level: LogLevel = logging.NOTSET
+                    , fmt: str = LOG_FORMAT
+                    ) -> RingBufferHandler:
+    """Attaches a new in-memory ring buffer sink to the root Cheffu logger, and returns it.
+    The sink only receives records at or above the root Cheffu logger's level.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    handler = RingBufferHandler(capacity=capacity, level=resolve_level(level))
+    handler.setFormatter(logging.Formatter(fmt))
+    logging.getLogger(ROOT_LOGGER_NAME).addHandler(handler)
+    return handler
 
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
 
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    ch.setFormatter(formatter)
+def remove_ring_buffer(handler: RingBufferHandler) -> None:
+    logging.getLogger(ROOT_LOGGER_NAME).removeHandler(handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Gets a logger under the root Cheffu logger, configuring the root Cheffu logger if not yet done.
+    Names outside of the Cheffu package, such as that of a script, are placed under the root Cheffu logger.
+    """
+    if _handler is None:
+        configure()
+
+    if name != ROOT_LOGGER_NAME and not name.startswith(f'{ROOT_LOGGER_NAME}.'):
+        name = f'{ROOT_LOGGER_NAME}.{name}'
 
-    logger.addHandler(ch)
-    return logger
+    return logging.getLogger(name)
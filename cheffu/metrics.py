@@ -0,0 +1,165 @@
+"""Counters and latency histograms for the graph building and enumeration hot paths.
+
+Metrics are disabled by default, in which case recording a metric only costs a flag check. Hot loops keep their
+counts in local variables and record them once at the end, rather than recording every event as it happens.
+Snapshots can be written to a file as JSON, or in the Prometheus text exposition format.
+"""
+
+import bisect
+import contextlib
+import json
+import math
+import time
+import typing as typ
+
+# Upper bounds of the latency histogram buckets, in seconds.
+DEFAULT_LATENCY_BUCKETS: typ.Sequence[float] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0
+                                                , math.inf
+                                                )
+
+# Prefix of metric names in the Prometheus text format.
+PROMETHEUS_PREFIX = 'cheffu_'
+
+# Names of the metrics recorded by Cheffu itself.
+EDGES_CREATED = 'edges_created'
+NODULES_CREATED = 'nodules_created'
+HOPS_VISITED = 'hops_visited'
+WALKS_PRUNED = 'walks_pruned'
+VALIDATION_FAILURES = 'validation_failures'
+
+# Suffix of the names of histograms recorded by time_stage.
+STAGE_SECONDS_SUFFIX = '_seconds'
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Histogram:
+    """Counts observed values in buckets with fixed upper bounds, along with their total count and sum."""
+    __slots__ = ('buckets', 'bucket_counts', 'count', 'sum')
+
+    def __init__(self, buckets: typ.Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets: typ.Sequence[float] = tuple(buckets)
+        self.bucket_counts: typ.MutableSequence[int] = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> typ.Sequence[int]:
+        """Returns the number of values at or below each bucket's upper bound."""
+        total = 0
+        cumulative: typ.MutableSequence[int] = []
+        for bucket_count in self.bucket_counts:
+            total += bucket_count
+            cumulative.append(total)
+        return cumulative
+
+
+class MetricsRegistry:
+    """Holds named counters and histograms. Nothing is recorded unless the registry is enabled."""
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: typ.MutableMapping[str, int] = {}
+        self.histograms: typ.MutableMapping[str, Histogram] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        if self.enabled:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def time_stage(self, stage: str) -> typ.ContextManager:
+        """Returns a context manager that records how long its body takes, in seconds, in the stage's histogram."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._time_stage(stage)
+
+    @contextlib.contextmanager
+    def _time_stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f'{stage}{STAGE_SECONDS_SUFFIX}', time.perf_counter() - start)
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def snapshot(self) -> typ.Mapping[str, typ.Any]:
+        """Returns a JSON-compatible copy of all metrics."""
+        return {
+            'counters': dict(self.counters),
+            'histograms': {
+                name: {
+                    'buckets': [str(bucket) for bucket in histogram.buckets],
+                    'bucket_counts': list(histogram.bucket_counts),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                }
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    def prometheus_text(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines: typ.MutableSequence[str] = []
+
+        for name, value in sorted(self.counters.items()):
+            metric_name = f'{PROMETHEUS_PREFIX}{name}_total'
+            lines.append(f'# TYPE {metric_name} counter')
+            lines.append(f'{metric_name} {value}')
+
+        for name, histogram in sorted(self.histograms.items()):
+            metric_name = f'{PROMETHEUS_PREFIX}{name}'
+            lines.append(f'# TYPE {metric_name} histogram')
+            for bucket, cumulative_count in zip(histogram.buckets, histogram.cumulative_counts()):
+                le = '+Inf' if bucket == math.inf else repr(bucket)
+                lines.append(f'{metric_name}_bucket{{le="{le}"}} {cumulative_count}')
+            lines.append(f'{metric_name}_sum {histogram.sum!r}')
+            lines.append(f'{metric_name}_count {histogram.count}')
+
+        return ''.join(f'{line}\n' for line in lines)
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(self.prometheus_text())
+
+
+# Registry used by Cheffu itself.
+REGISTRY = MetricsRegistry()
+
+
+def enable() -> None:
+    REGISTRY.enabled = True
+
+
+def disable() -> None:
+    REGISTRY.enabled = False
+
+
+def increment(name: str, amount: int = 1) -> None:
+    if REGISTRY.enabled:
+        REGISTRY.increment(name, amount)
+
+
+def observe(name: str, value: float) -> None:
+    if REGISTRY.enabled:
+        REGISTRY.observe(name, value)
+
+
+def time_stage(stage: str) -> typ.ContextManager:
+    return REGISTRY.time_stage(stage)
@@ -1,13 +1,20 @@
+import concurrent.futures as cf
 import itertools
+import os
 import typing as typ
-import uuid
 
 import collections
+import collections.abc
 import enum
 import functools
+import importlib
 
 import cheffu.exceptions as chex
+import cheffu.helpers as chlp
+import cheffu.ids as cids
 import cheffu.logging as clog
+import cheffu.metrics as cmet
+import cheffu.tracing as ctr
 import cheffu.slot_filter as sf
 import cheffu.types.common as ctpc
 import cheffu.types.tokens as ctpt
@@ -45,6 +52,9 @@ class FilteredAlt(typ.NamedTuple):
 # A stack containing slot filters, used to determine what paths are legal to walk through.
 SlotFilterStack = typ.Sequence[sf.SlotFilter]
 
+# Empty persistent slot filter stack. Stacks built on top of this are pushed and popped in O(1), without copying.
+EMPTY_SLOT_FILTER_STACK: SlotFilterStack = chlp.PersistentStack()
+
 
 # Symbolic representation of a stack push/pop.
 class StackDirection(enum.Enum):
@@ -113,11 +123,79 @@ MutSlotFilterChoiceSequence = typ.MutableSequence[typ.MutableSequence[sf.SlotFil
 
 PathDepth = typ.NewType('PathDepth', int)
 
+# Positions of the out edges taken at each nodule of a walk, in out edge iteration order.
+OutEdgePositionSequence = typ.Sequence[int]
+
+
+# Called with the validation states before and after traversing an edge, along with the edge itself.
+# Returns False if the walk should not continue along that edge.
+HopAcceptor = typ.Callable[['StackValidationState', 'StackValidationState', EdgeDef], bool]
+
+# Called with a nodule on the current path of a walk, along with the validation state on reaching it,
+# once every walk continuing from there has been yielded or cut off.
+ExhaustionCallback = typ.Callable[[Nodule, typ.Optional['StackValidationState']], None]
+
+
+# Opaque position in the deterministic ordering of the valid walks of a graph.
+# Only meaningful for the graph that it was created from.
+class WalkCursor(typ.NamedTuple):
+    out_edge_positions: OutEdgePositionSequence = ()
+
+
+# Maximum number of normalized alt sequences to keep memoized.
+NORMALIZED_ALT_SEQ_CACHE_SIZE = 4096
+
+
+def _items_equal(items_a: ProcedurePath, items_b: ProcedurePath) -> bool:
+    """Checks if two procedure paths are structurally equal.
+    Tokens are compared by their type and data, ignoring their IDs, so that copies of the same tokens are equal.
+    """
+    if len(items_a) != len(items_b):
+        return False
+
+    for item_a, item_b in zip(items_a, items_b):
+        if isinstance(item_a, ctpt.Token) or isinstance(item_b, ctpt.Token):
+            if not (isinstance(item_a, ctpt.Token) and isinstance(item_b, ctpt.Token)):
+                return False
+            if item_a.type_def != item_b.type_def or item_a.data != item_b.data:
+                return False
+        else:
+            alt_seq_a: AltSequence = normalize_alt_sequence(item_a)
+            alt_seq_b: AltSequence = normalize_alt_sequence(item_b)
+
+            if len(alt_seq_a) != len(alt_seq_b):
+                return False
+            for alt_a, alt_b in zip(alt_seq_a, alt_seq_b):
+                if alt_a.slot_filter != alt_b.slot_filter or not _items_equal(alt_a.items, alt_b.items):
+                    return False
+
+    return True
+
 
 def normalize_alt_sequence(alt_sequence: AltSequence) -> AltSequence:
-    """Processes an alt sequence to remove multiple null alts, and to ensure that the union of all of its
-    contained slot filters allows all slots (i.e. is an allow-all filter).
+    """Processes an alt sequence to coalesce structurally equal alts (including null alts), and to ensure that the
+    union of all of its contained slot filters allows all slots (i.e. is an allow-all filter).
+    Alts are compared by token type and data, so when alts are coalesced, only the tokens of the first copy are kept,
+    along with their IDs. The IDs of the tokens in later copies do not appear anywhere in the result.
+    Results are memoized by content, if the alt sequence is hashable.
     """
+    alt_sequence = tuple(alt_sequence)
+
+    try:
+        hash(alt_sequence)
+    except TypeError:
+        # Token data may be unhashable, e.g. dicts.
+        return _normalize_alt_sequence(alt_sequence)
+
+    return _normalize_hashable_alt_sequence(alt_sequence)
+
+
+@functools.lru_cache(maxsize=NORMALIZED_ALT_SEQ_CACHE_SIZE)
+def _normalize_hashable_alt_sequence(alt_sequence: AltSequence) -> AltSequence:
+    return _normalize_alt_sequence(alt_sequence)
+
+
+def _normalize_alt_sequence(alt_sequence: AltSequence) -> AltSequence:
     # Calculate the value of the else-filter, which contains all slots not explicitly allowed in the alt sequence.
     coverage_filter = functools.reduce(
         sf.union,
@@ -135,10 +213,22 @@ def normalize_alt_sequence(alt_sequence: AltSequence) -> AltSequence:
     alt_sequence = tuple(filtered_alt for filtered_alt in alt_sequence if filtered_alt.slot_filter != sf.BLOCK_ALL)
 
     # Coalesce any null alts into a single null alt.
-    # TODO: If possible, coalesce non-null branches as well, but much trickier
     null_alts = tuple(alt for alt in alt_sequence if not alt.items)
     alt_sequence = tuple(alt for alt in alt_sequence if alt.items)
 
+    # Coalesce structurally equal non-null alts into the first of them, by union-ing their slot filters.
+    # Each redundant copy would otherwise multiply the number of walks.
+    coalesced_alts: typ.MutableSequence[FilteredAlt] = []
+    for alt in alt_sequence:
+        for i, coalesced_alt in enumerate(coalesced_alts):
+            if _items_equal(alt.items, coalesced_alt.items):
+                coalesced_alts[i] = coalesced_alt._replace(slot_filter=sf.union(coalesced_alt.slot_filter,
+                                                                                alt.slot_filter))
+                break
+        else:
+            coalesced_alts.append(alt)
+    alt_sequence = tuple(coalesced_alts)
+
     # Coalescing happens by union-ing the corresponding slot filters into one.
     if null_alts:
         null_filter = sf.BLOCK_ALL
@@ -159,6 +249,189 @@ def normalize_alt_sequence(alt_sequence: AltSequence) -> AltSequence:
     return alt_sequence
 
 
+class SharedTail:
+    """The last edge of a built procedure path, which all of the subgraphs interned along that path end with, along
+    with the entry edges of the alt paths that end with it.
+
+    The last edge of an alt's path pops the slot filter pushed by its entry edge, so sibling alts with different
+    slot filters cannot share it as is. When they need to, the entry edges of those alts are rewritten to pop their
+    own slot filters straight away, and are followed by an edge pushing an allow-all slot filter, which the last edge
+    then pops instead. Pushing an allow-all slot filter right after popping another at the same depth narrows
+    nothing, so this keeps the same walks and slot filter choices.
+    """
+    __slots__ = ('edge_id', 'entry_edge_ids')
+
+    def __init__(self):
+        # ID of the last edge, once it is built.
+        self.edge_id: typ.Optional[EdgeId] = None
+        self.entry_edge_ids: typ.MutableSequence[EdgeId] = []
+
+
+class SharedSubgraph:
+    """A subgraph built for a procedure path suffix, along with the tail it ends with and its number of edges."""
+    __slots__ = ('nodule', 'tail', 'edge_count')
+
+    def __init__(self, nodule: Nodule, tail: SharedTail):
+        self.nodule = nodule
+        self.tail = tail
+        self.edge_count = 0
+
+
+class SubgraphInterner:
+    """Hash-conses procedure path suffixes, so that identical subgraphs are only built once while processing.
+
+    A subgraph starts at either the start or the close nodule of an alt sequence, and is keyed by the procedure path
+    suffix that starts from there and by the nodule that the suffix closes on. Suffixes are compared by content, so
+    sibling alts whose paths end the same way can share everything after their own entry edges, even if their slot
+    filters differ (see SharedTail). Tokens are compared by their type and data, so walks through a shared subgraph
+    contain the tokens, and token IDs, of whichever copy of the suffix was built first.
+    """
+    ALT_SEQ_START = 'start'
+    ALT_SEQ_CLOSE = 'close'
+
+    def __init__(self):
+        # Maps structural keys to dense integer IDs.
+        self._ids: typ.MutableMapping[typ.Hashable, int] = {}
+
+        # Caches suffix IDs of procedure paths by object identity. The paths are kept alive by this cache.
+        self._suffix_id_cache: typ.MutableMapping[int, typ.Tuple[ProcedurePath, typ.Sequence[int]]] = {}
+
+        # Maps (nodule kind, suffix ID, close nodule) to the subgraph starting at a nodule of that kind.
+        # The nodule kind is needed since the start nodule of an alt sequence leads into the alt sequence itself,
+        # while the close nodule of the previous alt sequence leads into any tokens before it.
+        self._subgraphs: typ.MutableMapping[typ.Tuple[str, int, Nodule], SharedSubgraph] = {}
+
+    def _intern(self, key: typ.Hashable) -> int:
+        return self._ids.setdefault(key, len(self._ids))
+
+    @staticmethod
+    def _token_key(token: ctpt.Token) -> typ.Hashable:
+        key = ('token', token.type_def, token.data)
+        try:
+            hash(key)
+        except TypeError:
+            # Token data may be unhashable, e.g. dicts, in which case only the token itself is equal to it.
+            return 'token_id', token.id
+        return key
+
+    def suffix_ids(self, procedure_path: ProcedurePath) -> typ.Sequence[int]:
+        """Returns IDs for every suffix of a procedure path, where the Kth ID is the ID of procedure_path[K:].
+        Equal IDs are given to structurally equal suffixes. Tokens are compared by their type and data.
+        """
+        cached = self._suffix_id_cache.get(id(procedure_path))
+        if cached is not None:
+            return cached[1]
+
+        suffix_ids: typ.MutableSequence[int] = [self._intern(())]
+        for path_item in reversed(procedure_path):
+            if isinstance(path_item, ctpt.Token):
+                item_key = self._token_key(path_item)
+            else:
+                alt_sequence: AltSequence = normalize_alt_sequence(typ.cast(AltSequence, path_item))
+                item_key = ('alts', tuple((self.suffix_ids(alt.items)[0], alt.slot_filter) for alt in alt_sequence))
+
+            suffix_ids.append(self._intern((self._intern(item_key), suffix_ids[-1])))
+
+        suffix_ids.reverse()
+        self._suffix_id_cache[id(procedure_path)] = (procedure_path, suffix_ids)
+        return suffix_ids
+
+    def find_subgraph_to_share(self, *
+                               , kind: str
+                               , suffix_id: int
+                               , close_nodule: Nodule
+                               , close_cmd: StackCommand
+                               , edge_lookup_map: EdgeLookupMap
+                               ) -> typ.Optional[SharedSubgraph]:
+        """Finds a subgraph that has already been built for a suffix, if sharing it would take fewer edges than
+        building another copy of it. Joining up with a different pop may take a couple of edges (see SharedTail).
+        """
+        subgraph = self._subgraphs.get((kind, suffix_id, close_nodule))
+        if subgraph is None:
+            return None
+
+        join_cost = self.join_cost(tail=subgraph.tail, close_cmd=close_cmd, edge_lookup_map=edge_lookup_map)
+        if join_cost is None:
+            return None
+
+        return subgraph if subgraph.edge_count > join_cost else None
+
+    def add_subgraph(self, *
+                     , kind: str
+                     , suffix_id: int
+                     , close_nodule: Nodule
+                     , nodule: Nodule
+                     , tail: SharedTail
+                     ) -> SharedSubgraph:
+        subgraph = SharedSubgraph(nodule=nodule, tail=tail)
+        self._subgraphs[kind, suffix_id, close_nodule] = subgraph
+        return subgraph
+
+    @staticmethod
+    def join_cost(*
+                  , tail: SharedTail
+                  , close_cmd: StackCommand
+                  , edge_lookup_map: EdgeLookupMap
+                  ) -> typ.Optional[int]:
+        """Returns the number of edges that ending with a tail and a given pop would add, or None if not possible."""
+        tail_close_cmd: StackCommand = edge_lookup_map[tail.edge_id].close_cmd
+        if tail_close_cmd == close_cmd:
+            return 0
+        if tail_close_cmd is None or close_cmd is None:
+            return None
+
+        # Each entry edge that needs to pop its own slot filter gets an edge after it, pushing an allow-all one.
+        join_cost = 0 if tail_close_cmd.slot_filter == sf.ALLOW_ALL else len(tail.entry_edge_ids)
+        if close_cmd.slot_filter != sf.ALLOW_ALL:
+            join_cost += 1
+        return join_cost
+
+    @staticmethod
+    def join_tail(*
+                  , tail: SharedTail
+                  , entry_edge_id: typ.Optional[EdgeId]
+                  , close_cmd: StackCommand
+                  , nodule_gen: ctpc.UniqueIdGen
+                  , edge_id_gen: ctpc.UniqueIdGen
+                  , mut_nodule_out_edge_map: MutNoduleOutEdgeMap
+                  , mut_edge_lookup_map: MutEdgeLookupMap
+                  ) -> None:
+        """Makes a path with a given entry edge and pop end with a tail, rewriting entry edges if needed."""
+        def pop_at_entry(edge_id: EdgeId) -> None:
+            entry_edge_def: EdgeDef = mut_edge_lookup_map[edge_id]
+            pushed_nodule: Nodule = nodule_gen()
+
+            own_pop = StackOperation(direction=StackDirection.POP, slot_filter=entry_edge_def.start_cmd.slot_filter)
+            mut_edge_lookup_map[edge_id] = entry_edge_def._replace(dst_nodule=pushed_nodule, close_cmd=own_pop)
+            connect(edge_id_gen=edge_id_gen,
+                    src_nodule=pushed_nodule,
+                    dst_nodule=entry_edge_def.dst_nodule,
+                    mut_nodule_out_edge_map=mut_nodule_out_edge_map,
+                    mut_edge_lookup_map=mut_edge_lookup_map,
+                    encountered_tokens=(),
+                    start_slot_filter_stack_command=StackOperation(direction=StackDirection.PUSH
+                                                                   , slot_filter=sf.ALLOW_ALL
+                                                                   ),
+                    close_slot_filter_stack_command=None,
+                    )
+
+        last_edge_def: EdgeDef = mut_edge_lookup_map[tail.edge_id]
+        if last_edge_def.close_cmd != close_cmd:
+            if last_edge_def.close_cmd.slot_filter != sf.ALLOW_ALL:
+                for tail_entry_edge_id in tail.entry_edge_ids:
+                    pop_at_entry(tail_entry_edge_id)
+
+                mut_edge_lookup_map[tail.edge_id] = last_edge_def._replace(
+                    close_cmd=StackOperation(direction=StackDirection.POP, slot_filter=sf.ALLOW_ALL)
+                )
+
+            if close_cmd.slot_filter != sf.ALLOW_ALL:
+                pop_at_entry(entry_edge_id)
+
+        if entry_edge_id is not None:
+            tail.entry_edge_ids.append(entry_edge_id)
+
+
 def connect(*
             , edge_id_gen: ctpc.UniqueIdGen
             , src_nodule: Nodule
@@ -168,13 +441,13 @@ def connect(*
             , encountered_tokens: typ.Sequence[ctpt.Token]
             , start_slot_filter_stack_command: StackCommand
             , close_slot_filter_stack_command: StackCommand
-            ) -> None:
+            ) -> EdgeId:
     """Connects two nodules together with an edge.
     This edge will contain information about the tokens present on it,
-    as well as the stack commands on start and close.
+    as well as the stack commands on start and close. Returns the ID of the new edge.
     """
-    logger.debug(f'Connecting nodule {src_nodule} to nodule {dst_nodule}, '
-                 f'containing {len(encountered_tokens)} token(s)')
+    logger.debug('Connecting nodule %s to nodule %s, containing %d token(s)'
+                 , src_nodule, dst_nodule, len(encountered_tokens))
 
     # A new edge needs to be created.
     edge_id: EdgeId = edge_id_gen()
@@ -192,6 +465,8 @@ def connect(*
     # Add edge def and edge ID to edge lookup map.
     mut_edge_lookup_map[edge_id] = edge_def
 
+    return edge_id
+
 
 def process_token_path(*
                        , procedure_path: ProcedurePath
@@ -204,8 +479,52 @@ def process_token_path(*
                        , mut_edge_lookup_map: MutEdgeLookupMap
                        , start_slot_filter_stack_command: StackCommand
                        , close_slot_filter_stack_command: StackCommand
+                       , subgraph_interner: SubgraphInterner = None
                        ) -> None:
-    logger.debug(f'Starting processing of subprocedure path, with {len(procedure_path)} element(s)')
+    logger.debug('Starting processing of subprocedure path, with %d element(s)', len(procedure_path))
+
+    # If sharing subgraphs, look up the structural IDs of each suffix of this path.
+    suffix_ids = subgraph_interner.suffix_ids(procedure_path) if subgraph_interner is not None else None
+
+    # Subgraphs interned along this path, along with the number of edges there were when each of them was started.
+    # They all end with the last edge of this path, or with that of a subgraph this path goes on to share.
+    path_tail = SharedTail()
+    path_subgraphs: typ.MutableSequence[typ.Tuple[SharedSubgraph, int]] = []
+
+    # The edge pushing the slot filter of this path, if it is the path of an alt.
+    entry_edge_id: typ.Optional[EdgeId] = None
+
+    def intern_subgraph(kind: str, suffix_id: int, nodule: Nodule) -> None:
+        subgraph = subgraph_interner.add_subgraph(kind=kind
+                                                  , suffix_id=suffix_id
+                                                  , close_nodule=close_nodule
+                                                  , nodule=nodule
+                                                  , tail=path_tail
+                                                  )
+        path_subgraphs.append((subgraph, len(mut_edge_lookup_map)))
+
+    def finish_subgraphs(shared_subgraph: typ.Optional[SharedSubgraph]) -> None:
+        # The rest of this path is made up of the shared subgraph, if there is one.
+        edge_count = len(mut_edge_lookup_map)
+        tail = path_tail
+        if shared_subgraph is not None:
+            edge_count += shared_subgraph.edge_count
+            tail = shared_subgraph.tail
+            subgraph_interner.join_tail(tail=tail
+                                        , entry_edge_id=entry_edge_id
+                                        , close_cmd=close_slot_filter_stack_command
+                                        , nodule_gen=nodule_gen
+                                        , edge_id_gen=edge_id_gen
+                                        , mut_nodule_out_edge_map=mut_nodule_out_edge_map
+                                        , mut_edge_lookup_map=mut_edge_lookup_map
+                                        )
+
+        elif entry_edge_id is not None:
+            tail.entry_edge_ids.append(entry_edge_id)
+
+        for subgraph, initial_edge_count in path_subgraphs:
+            subgraph.tail = tail
+            subgraph.edge_count = edge_count - initial_edge_count
 
     # Keep track of the most recent parent nodule.
     curr_parent_nodule: Nodule = start_nodule
@@ -214,7 +533,7 @@ def process_token_path(*
     encountered_tokens: typ.MutableSequence[ctpt.Token] = []
 
     # Process each path item.
-    for path_item in procedure_path:
+    for item_index, path_item in enumerate(procedure_path):
         # We need to check if this is an instance of token first, since it would match the check for tuple.
         if isinstance(path_item, ctpt.Token):
             token: ctpt.Token = typ.cast(ctpt.Token, path_item)
@@ -229,24 +548,68 @@ def process_token_path(*
             #     3) Process the alt sequence, using NSN and NCN.
             alt_sequence: AltSequence = typ.cast(AltSequence, path_item)
 
+            # If sharing subgraphs, the rest of this path may have already been built elsewhere.
+            # If so, connect to it and stop, since there is nothing more to build.
+            shared_start_subgraph: typ.Optional[SharedSubgraph] = None
+            shared_close_subgraph: typ.Optional[SharedSubgraph] = None
+            if subgraph_interner is not None:
+                shared_start_subgraph = subgraph_interner.find_subgraph_to_share(
+                    kind=SubgraphInterner.ALT_SEQ_START
+                    , suffix_id=suffix_ids[item_index]
+                    , close_nodule=close_nodule
+                    , close_cmd=close_slot_filter_stack_command
+                    , edge_lookup_map=mut_edge_lookup_map
+                )
+                shared_close_subgraph = subgraph_interner.find_subgraph_to_share(
+                    kind=SubgraphInterner.ALT_SEQ_CLOSE
+                    , suffix_id=suffix_ids[item_index + 1]
+                    , close_nodule=close_nodule
+                    , close_cmd=close_slot_filter_stack_command
+                    , edge_lookup_map=mut_edge_lookup_map
+                )
+
+            if shared_start_subgraph is not None:
+                edge_id = connect(edge_id_gen=edge_id_gen,
+                                  src_nodule=curr_parent_nodule,
+                                  dst_nodule=shared_start_subgraph.nodule,
+                                  mut_nodule_out_edge_map=mut_nodule_out_edge_map,
+                                  mut_edge_lookup_map=mut_edge_lookup_map,
+                                  encountered_tokens=tuple(encountered_tokens),
+                                  start_slot_filter_stack_command=start_slot_filter_stack_command,
+                                  close_slot_filter_stack_command=None,
+                                  )
+                if start_slot_filter_stack_command is not None:
+                    entry_edge_id = edge_id
+
+                finish_subgraphs(shared_start_subgraph)
+
+                logger.debug('Finished processing of subprocedure path, using shared nodule %s'
+                             , shared_start_subgraph.nodule)
+                return
+
             # Create new start and close nodules for the to-be-processed alt sequence.
             alt_seq_start_nodule: Nodule = nodule_gen()
-            alt_seq_close_nodule: Nodule = nodule_gen()
+            alt_seq_close_nodule: Nodule = (nodule_gen() if shared_close_subgraph is None
+                                            else shared_close_subgraph.nodule)
 
             # Capture current list of encountered tokens.
             # Close off the current path by connecting to the new start nodule.
-            connect(edge_id_gen=edge_id_gen,
-                    src_nodule=curr_parent_nodule,
-                    dst_nodule=alt_seq_start_nodule,
-                    mut_nodule_out_edge_map=mut_nodule_out_edge_map,
-                    mut_edge_lookup_map=mut_edge_lookup_map,
-                    encountered_tokens=tuple(encountered_tokens),
-                    start_slot_filter_stack_command=start_slot_filter_stack_command,
-                    close_slot_filter_stack_command=None,
-                    )
+            edge_id = connect(edge_id_gen=edge_id_gen,
+                              src_nodule=curr_parent_nodule,
+                              dst_nodule=alt_seq_start_nodule,
+                              mut_nodule_out_edge_map=mut_nodule_out_edge_map,
+                              mut_edge_lookup_map=mut_edge_lookup_map,
+                              encountered_tokens=tuple(encountered_tokens),
+                              start_slot_filter_stack_command=start_slot_filter_stack_command,
+                              close_slot_filter_stack_command=None,
+                              )
+
+            if subgraph_interner is not None:
+                intern_subgraph(SubgraphInterner.ALT_SEQ_START, suffix_ids[item_index], alt_seq_start_nodule)
 
             # We only want to put the stack command on the first out path of a branch, not on any further down.
             if start_slot_filter_stack_command is not None:
+                entry_edge_id = edge_id
                 start_slot_filter_stack_command = None
 
             # Reset list of encountered tokens.
@@ -261,27 +624,42 @@ def process_token_path(*
                                  close_nodule=alt_seq_close_nodule,
                                  mut_nodule_out_edge_map=mut_nodule_out_edge_map,
                                  mut_edge_lookup_map=mut_edge_lookup_map,
+                                 subgraph_interner=subgraph_interner,
                                  )
 
+            # If the rest of this path has already been built, there is nothing more to do.
+            if shared_close_subgraph is not None:
+                finish_subgraphs(shared_close_subgraph)
+
+                logger.debug('Finished processing of subprocedure path, using shared nodule %s'
+                             , shared_close_subgraph.nodule)
+                return
+
+            if subgraph_interner is not None:
+                intern_subgraph(SubgraphInterner.ALT_SEQ_CLOSE, suffix_ids[item_index + 1], alt_seq_close_nodule)
+
             # Update current parent nodule.
             curr_parent_nodule = alt_seq_close_nodule
 
     # Close the path by making an edge from the current parent nodule to the close nodule.
     # Note that the value of start slot filter stack command will be None if an alt sequence is processed before here.
-    connect(edge_id_gen=edge_id_gen,
-            src_nodule=curr_parent_nodule,
-            dst_nodule=close_nodule,
-            mut_nodule_out_edge_map=mut_nodule_out_edge_map,
-            mut_edge_lookup_map=mut_edge_lookup_map,
-            encountered_tokens=encountered_tokens,
-            start_slot_filter_stack_command=start_slot_filter_stack_command,
-            close_slot_filter_stack_command=close_slot_filter_stack_command,
-            )
+    path_tail.edge_id = connect(edge_id_gen=edge_id_gen,
+                                src_nodule=curr_parent_nodule,
+                                dst_nodule=close_nodule,
+                                mut_nodule_out_edge_map=mut_nodule_out_edge_map,
+                                mut_edge_lookup_map=mut_edge_lookup_map,
+                                encountered_tokens=encountered_tokens,
+                                start_slot_filter_stack_command=start_slot_filter_stack_command,
+                                close_slot_filter_stack_command=close_slot_filter_stack_command,
+                                )
+
+    if subgraph_interner is not None:
+        finish_subgraphs(None)
 
     # This creates an entry for the close nodule if it does not already exist.
     _ = mut_nodule_out_edge_map[close_nodule]
 
-    logger.debug(f'Finished processing of subprocedure path')
+    logger.debug('Finished processing of subprocedure path')
 
 
 def process_alt_sequence(*
@@ -293,10 +671,14 @@ def process_alt_sequence(*
                          , close_nodule: Nodule
                          , mut_nodule_out_edge_map: MutNoduleOutEdgeMap
                          , mut_edge_lookup_map: MutEdgeLookupMap
+                         , subgraph_interner: SubgraphInterner = None
                          ):
     # Normalize alt sequence.
     alt_sequence = normalize_alt_sequence(alt_sequence)
 
+    span = ctr.span('process_alt_sequence', alt_count=len(alt_sequence), start_nodule=start_nodule)
+    edge_count = len(mut_edge_lookup_map)
+
     # For each alt in the alt sequence:
     #     1) Extract slot filter.
     #     2) Create slot filter stack commands for push and pop (SPSH, SPOP).
@@ -322,9 +704,13 @@ def process_alt_sequence(*
                            mut_edge_lookup_map=mut_edge_lookup_map,
                            start_slot_filter_stack_command=slot_filter_stack_push,
                            close_slot_filter_stack_command=slot_filter_stack_pop,
+                           subgraph_interner=subgraph_interner,
                            )
 
-DEFAULT_UNIQUE_ID_GEN = uuid.uuid4
+    span.finish(edge_count=len(mut_edge_lookup_map) - edge_count)
+
+# Creates a fresh ID generator for each processed graph, so that IDs are dense and reproducible per graph.
+DEFAULT_ID_GEN_FACTORY: typ.Callable[[], ctpc.UniqueIdGen] = cids.make_counter_id_gen
 
 
 def process(*
@@ -332,55 +718,345 @@ def process(*
             , nodule_gen: ctpc.UniqueIdGen=None
             , edge_id_gen: ctpc.UniqueIdGen=None
             , tok_id_gen: ctpc.UniqueIdGen=None
+            , share_subgraphs: bool=False
             ) -> typ.Tuple[NoduleOutEdgeMap, EdgeLookupMap, Nodule, Nodule]:
+    """Builds a nodule graph from a procedure path.
+    If sharing subgraphs, structurally identical subgraphs that lead to the same place are only built once, even
+    across sibling alts (see SubgraphInterner). Tokens in shared subgraphs are those of the first copy built.
+    """
     if nodule_gen is None:
         logger.info('Nodule generator not specified, using default generator')
-        nodule_gen = DEFAULT_UNIQUE_ID_GEN
+        nodule_gen = DEFAULT_ID_GEN_FACTORY()
     if edge_id_gen is None:
         logger.info('Edge ID generator not specified, using default generator')
-        edge_id_gen = DEFAULT_UNIQUE_ID_GEN
+        edge_id_gen = DEFAULT_ID_GEN_FACTORY()
     if tok_id_gen is None:
         logger.info('Token ID generator not specified, using default generator')
-        tok_id_gen = DEFAULT_UNIQUE_ID_GEN
+        tok_id_gen = DEFAULT_ID_GEN_FACTORY()
 
     # Create start and close nodules.
     start_nodule = nodule_gen()
-    logger.debug(f'Generated start nodule = {start_nodule}')
+    logger.debug('Generated start nodule = %s', start_nodule)
     close_nodule = nodule_gen()
-    logger.debug(f'Generated close nodule = {close_nodule}')
+    logger.debug('Generated close nodule = %s', close_nodule)
 
     # Mappings to store edge information.
-    mut_nodule_out_edge_map: MutNoduleOutEdgeMap = collections.defaultdict(set)
+    # Out edges are kept in creation order, so that walks are always enumerated in the same order.
+    mut_nodule_out_edge_map: MutNoduleOutEdgeMap = collections.defaultdict(chlp.OrderedSet)
     mut_edge_lookup_map: MutEdgeLookupMap = {}
 
     # # Create top level push and pop commands.
     # slot_filter_stack_push = StackOperation(direction=StackDirection.PUSH, slot_filter=sf.ALLOW_ALL)
     # slot_filter_stack_pop = StackOperation(direction=StackDirection.POP, slot_filter=sf.ALLOW_ALL)
 
-    logger.debug(f'Starting processing of main procedure path, with {len(procedure_path)} element(s)')
+    logger.debug('Starting processing of main procedure path, with %d element(s)', len(procedure_path))
+
+    with cmet.time_stage('process'), ctr.span('process', element_count=len(procedure_path)) as span:
+        process_token_path(edge_id_gen=edge_id_gen,
+                           nodule_gen=nodule_gen,
+                           tok_id_gen=tok_id_gen,
+                           procedure_path=procedure_path,
+                           start_nodule=start_nodule,
+                           close_nodule=close_nodule,
+                           mut_nodule_out_edge_map=mut_nodule_out_edge_map,
+                           mut_edge_lookup_map=mut_edge_lookup_map,
+                           start_slot_filter_stack_command=None,
+                           close_slot_filter_stack_command=None,
+                           subgraph_interner=SubgraphInterner() if share_subgraphs else None,
+                           )
+
+        span.set(nodule_count=len(mut_nodule_out_edge_map), edge_count=len(mut_edge_lookup_map))
 
-    process_token_path(edge_id_gen=edge_id_gen,
-                       nodule_gen=nodule_gen,
-                       tok_id_gen=tok_id_gen,
-                       procedure_path=procedure_path,
-                       start_nodule=start_nodule,
-                       close_nodule=close_nodule,
-                       mut_nodule_out_edge_map=mut_nodule_out_edge_map,
-                       mut_edge_lookup_map=mut_edge_lookup_map,
-                       start_slot_filter_stack_command=None,
-                       close_slot_filter_stack_command=None,
-                       )
+    cmet.increment(cmet.EDGES_CREATED, len(mut_edge_lookup_map))
+    cmet.increment(cmet.NODULES_CREATED, len(mut_nodule_out_edge_map))
 
-    logger.debug(f'Finished processing of procedure path')
+    logger.debug('Finished processing of procedure path')
 
     return mut_nodule_out_edge_map, mut_edge_lookup_map, start_nodule, close_nodule
 
 
+# Part of a procedure path that still needs to be turned into an edge, starting at an item position.
+# The edge is capped at the next alt sequence, or at the close nodule if there are no more alt sequences.
+class _PendingSegment(typ.NamedTuple):
+    procedure_path: ProcedurePath
+    position: int
+    start_cmd: StackCommand
+    close_nodule: Nodule
+    close_cmd: StackCommand
+
+
+class LazyGraph:
+    """Nodule graph over a procedure path that is only built as far as it is traversed.
+
+    Each nodule starts out with the pending segments of the procedure path that lead out of it. The out edges of a
+    nodule are built the first time they are looked up, and are kept from then on. The graph has the same walks as
+    the graph built by process, in the same order, although its IDs are allocated in a different order.
+    Iterating over the nodule out edge map or edge lookup map builds the whole graph.
+    """
+    def __init__(self, *
+                 , procedure_path: ProcedurePath
+                 , nodule_gen: ctpc.UniqueIdGen = None
+                 , edge_id_gen: ctpc.UniqueIdGen = None
+                 ):
+        self._nodule_gen = DEFAULT_ID_GEN_FACTORY() if nodule_gen is None else nodule_gen
+        self._edge_id_gen = DEFAULT_ID_GEN_FACTORY() if edge_id_gen is None else edge_id_gen
+
+        self.start_nodule: Nodule = self._nodule_gen()
+        self.close_nodule: Nodule = self._nodule_gen()
+        cmet.increment(cmet.NODULES_CREATED, 2)
+
+        # Nodules whose out edges have not been built yet.
+        self._pending: typ.MutableMapping[Nodule, typ.Sequence[_PendingSegment]] = {
+            self.start_nodule: (_PendingSegment(procedure_path=procedure_path
+                                                , position=0
+                                                , start_cmd=None
+                                                , close_nodule=self.close_nodule
+                                                , close_cmd=None
+                                                ),),
+            self.close_nodule: (),
+        }
+
+        self._out_edges: MutNoduleOutEdgeMap = {}
+        self._edge_defs: MutEdgeLookupMap = {}
+
+        self.nodule_out_edge_map: NoduleOutEdgeMap = _LazyNoduleOutEdgeMap(self)
+        self.edge_lookup_map: EdgeLookupMap = _LazyEdgeLookupMap(self)
+
+    @property
+    def built_edge_count(self) -> int:
+        return len(self._edge_defs)
+
+    def has_nodule(self, nodule: Nodule) -> bool:
+        return nodule in self._out_edges or nodule in self._pending
+
+    def out_edges(self, nodule: Nodule) -> OutEdgeIdSet:
+        """Returns the out edges of a nodule, building them if needed."""
+        if nodule not in self._out_edges:
+            if nodule not in self._pending:
+                raise KeyError(nodule)
+            self._build_out_edges(nodule)
+        return self._out_edges[nodule]
+
+    def edge_def(self, edge_id: EdgeId) -> EdgeDef:
+        """Returns an edge definition. Edges only exist once the out edges of their source nodule have been built."""
+        return self._edge_defs[edge_id]
+
+    def build_all(self) -> None:
+        """Builds every remaining nodule and edge of the graph."""
+        while self._pending:
+            self._build_out_edges(next(iter(self._pending)))
+
+    def _build_out_edges(self, nodule: Nodule) -> None:
+        out_edge_ids: MutOutEdgeIdSet = chlp.OrderedSet()
+
+        for segment in self._pending.pop(nodule):
+            procedure_path = segment.procedure_path
+
+            # Collect tokens up to the next alt sequence.
+            position = segment.position
+            while position < len(procedure_path) and isinstance(procedure_path[position], ctpt.Token):
+                position += 1
+            encountered_tokens = tuple(procedure_path[segment.position:position])
+
+            if position < len(procedure_path):
+                # Cap the segment at the start of the alt sequence. The alt sequence's close nodule carries on with
+                # the rest of the path.
+                alt_sequence: AltSequence = normalize_alt_sequence(typ.cast(AltSequence, procedure_path[position]))
+                dst_nodule: Nodule = self._nodule_gen()
+                alt_seq_close_nodule: Nodule = self._nodule_gen()
+                cmet.increment(cmet.NODULES_CREATED, 2)
+
+                self._pending[dst_nodule] = tuple(
+                    _PendingSegment(procedure_path=alt.items
+                                    , position=0
+                                    , start_cmd=StackOperation(direction=StackDirection.PUSH
+                                                               , slot_filter=alt.slot_filter
+                                                               )
+                                    , close_nodule=alt_seq_close_nodule
+                                    , close_cmd=StackOperation(direction=StackDirection.POP
+                                                               , slot_filter=alt.slot_filter
+                                                               )
+                                    )
+                    for alt in alt_sequence
+                )
+                self._pending[alt_seq_close_nodule] = (segment._replace(position=position + 1, start_cmd=None),)
+                close_cmd: StackCommand = None
+            else:
+                dst_nodule = segment.close_nodule
+                close_cmd = segment.close_cmd
+
+            edge_id: EdgeId = self._edge_id_gen()
+            self._edge_defs[edge_id] = EdgeDef(id=edge_id
+                                               , src_nodule=nodule
+                                               , dst_nodule=dst_nodule
+                                               , token_seq=encountered_tokens
+                                               , start_cmd=segment.start_cmd
+                                               , close_cmd=close_cmd
+                                               )
+            out_edge_ids.add(edge_id)
+
+        self._out_edges[nodule] = out_edge_ids
+        cmet.increment(cmet.EDGES_CREATED, len(out_edge_ids))
+        logger.debug('Built %d out edge(s) of nodule %s', len(out_edge_ids), nodule)
+
+
+class _LazyNoduleOutEdgeMap(collections.abc.Mapping):
+    def __init__(self, lazy_graph: LazyGraph):
+        self._lazy_graph = lazy_graph
+
+    def __getitem__(self, nodule: Nodule) -> OutEdgeIdSet:
+        return self._lazy_graph.out_edges(nodule)
+
+    def __contains__(self, nodule) -> bool:
+        return self._lazy_graph.has_nodule(nodule)
+
+    def __iter__(self) -> typ.Iterator[Nodule]:
+        self._lazy_graph.build_all()
+        return iter(self._lazy_graph._out_edges)
+
+    def __len__(self) -> int:
+        self._lazy_graph.build_all()
+        return len(self._lazy_graph._out_edges)
+
+
+class _LazyEdgeLookupMap(collections.abc.Mapping):
+    def __init__(self, lazy_graph: LazyGraph):
+        self._lazy_graph = lazy_graph
+
+    def __getitem__(self, edge_id: EdgeId) -> EdgeDef:
+        return self._lazy_graph.edge_def(edge_id)
+
+    def __iter__(self) -> typ.Iterator[EdgeId]:
+        self._lazy_graph.build_all()
+        return iter(self._lazy_graph._edge_defs)
+
+    def __len__(self) -> int:
+        self._lazy_graph.build_all()
+        return len(self._lazy_graph._edge_defs)
+
+
+def process_lazily(*
+                   , procedure_path: ProcedurePath
+                   , nodule_gen: ctpc.UniqueIdGen = None
+                   , edge_id_gen: ctpc.UniqueIdGen = None
+                   ) -> typ.Tuple[NoduleOutEdgeMap, EdgeLookupMap, Nodule, Nodule]:
+    """Lazy counterpart of process, returning maps that build the graph as they are looked up (see LazyGraph).
+    Resolving a single walk from the returned maps only builds the edges near that walk.
+    """
+    lazy_graph = LazyGraph(procedure_path=procedure_path, nodule_gen=nodule_gen, edge_id_gen=edge_id_gen)
+
+    return (lazy_graph.nodule_out_edge_map
+            , lazy_graph.edge_lookup_map
+            , lazy_graph.start_nodule
+            , lazy_graph.close_nodule
+            )
+
+
+# Modules that process_many workers can import before processing anything, so that their import costs are paid
+# once per worker instead of showing up in the first chunk. Processing itself does not need them, so warming up is
+# opt-in, and these depend on modgrammar.
+TOKEN_DEF_WARM_UP_MODULES: typ.Sequence[str] = ('cheffu.defs', 'cheffu.grammars')
+
+# Default number of procedure paths sent to a process_many worker at a time.
+DEFAULT_PROCESS_CHUNK_SIZE = 16
+
+
+def _init_process_worker(warm_up_modules: typ.Sequence[str]) -> None:
+    for module_name in warm_up_modules:
+        # Warming up is only an optimization, so a module missing an optional dependency is skipped.
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning("Skipping warm-up of module '%s', could not import it: %s", module_name, e)
+
+
+def _process_compact_chunk(procedure_paths: typ.Sequence[ProcedurePath]
+                           , share_subgraphs: bool
+                           ) -> typ.Sequence['cpt.CompactGraph']:
+    # Imported here, since cheffu.compact itself depends on this module.
+    import cheffu.compact as cpt
+
+    compact_graphs = []
+    for procedure_path in procedure_paths:
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = process(procedure_path=procedure_path
+                                                                                   , share_subgraphs=share_subgraphs
+                                                                                   )
+
+        compact_graphs.append(cpt.make_compact_graph(nodule_out_edge_map=nodule_out_edge_map
+                                                     , edge_lookup_map=edge_lookup_map
+                                                     , start_nodule=start_nodule
+                                                     , close_nodule=close_nodule
+                                                     ))
+
+    return compact_graphs
+
+
+def process_many(procedure_paths: typ.Iterable[ProcedurePath]
+                 , *
+                 , jobs: int = None
+                 , chunk_size: int = DEFAULT_PROCESS_CHUNK_SIZE
+                 , share_subgraphs: bool = False
+                 , warm_up_modules: typ.Sequence[str] = ()
+                 , window: int = None
+                 ) -> typ.Iterable['cpt.CompactGraph']:
+    """Builds nodule graphs from many procedure paths using a pool of worker processes.
+    Graphs are yielded as compact graphs (see cheffu.compact), in the same order as their procedure paths, and use
+    the default ID generators. Procedure paths are sent to workers in chunks, to cut down on messaging overhead.
+
+    Procedure paths are read lazily, and at most a window of chunks are submitted or waiting to be yielded at once,
+    defaulting to twice the number of workers. Each worker imports the given warm-up modules first, such as
+    TOKEN_DEF_WARM_UP_MODULES, skipping any that cannot be imported.
+    """
+    if window is None:
+        window = 2 * (jobs or os.cpu_count() or 1)
+
+    if window < 1:
+        raise ValueError(f'Submission window must be positive; window = {window}')
+
+    if chunk_size < 1:
+        raise ValueError(f'Chunk size must be positive; chunk_size = {chunk_size}')
+
+    procedure_path_iter = iter(procedure_paths)
+
+    executor = cf.ProcessPoolExecutor(max_workers=jobs
+                                      , initializer=_init_process_worker
+                                      , initargs=(tuple(warm_up_modules),)
+                                      )
+
+    try:
+        # Chunk futures in the order of their procedure paths.
+        pending: typ.Deque[cf.Future] = collections.deque()
+
+        def fill_window():
+            while len(pending) < window:
+                chunk = tuple(itertools.islice(procedure_path_iter, chunk_size))
+                if not chunk:
+                    break
+
+                pending.append(executor.submit(_process_compact_chunk, chunk, share_subgraphs))
+
+        fill_window()
+
+        while pending:
+            compact_graphs = pending.popleft().result()
+
+            # Keep the workers busy while the caller consumes this chunk.
+            fill_window()
+
+            yield from compact_graphs
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def process_stack(*
                   , stack: SlotFilterStack
                   , stack_cmd: StackCommand
                   ) -> SlotFilterStack:
-    """Process a slot filter stack according to a stack command."""
+    """Process a slot filter stack according to a stack command.
+    Persistent stacks are pushed and popped in O(1), any other stacks are copied into new tuples.
+    """
+    is_persistent = isinstance(stack, chlp.PersistentStack)
+
     if stack_cmd is None:
         # A no-op, return the stack unchanged.
         return stack
@@ -393,6 +1069,8 @@ def process_stack(*
 
         if direction == StackDirection.PUSH:
             # Append the slot filter to the end of the stack and return.
+            if is_persistent:
+                return stack.push(slot_filter)
             return tuple(stack) + (slot_filter,)
         else:
             # Try and index the last slot filter in the stack.
@@ -400,12 +1078,14 @@ def process_stack(*
             if not stack:
                 raise chex.SlotFilterStackEmpty(f'Slot filter stack empty; expected = {slot_filter}')
 
-            popped = stack[-1]
+            popped = stack.top if is_persistent else stack[-1]
 
             if not popped == slot_filter:
                 raise chex.SlotFilterStackResultMismatch(f'Unexpected value popped from slot filter stack; '
                                                          f'expected = {slot_filter}, found = {popped}')
 
+            if is_persistent:
+                return stack.pop()
             return stack[:-1]
 
 
@@ -418,7 +1098,7 @@ def make_graph_hop_from_edge_id(*
     edge_def: EdgeDef = edge_lookup_map[edge_id]
     dst_nodule: Nodule = edge_def.dst_nodule
 
-    return GraphHop(edge_id=edge_id, dst_nodule=dst_nodule)
+    return GraphHop(edge_id=edge_id, nodule=dst_nodule)
 
 
 def make_stack_hop_from_edge_id(*
@@ -441,42 +1121,13 @@ def yield_all_hop_seqs(*
                        ) -> typ.Iterable[typ.Tuple[GraphHopSequence, StackHopSequence]]:
     """Yields all hop sequences (graph and stack) of a constructed nodule out edge map/edge lookup map combo.
     """
-    def helper(*
-               , curr_nodule: Nodule
-               , curr_graph_hop_seq: GraphHopSequence
-               , curr_stack_hop_seq: StackHopSequence
-               ) -> typ.Iterable[typ.Tuple[GraphHopSequence, StackHopSequence]]:
-        out_edges: OutEdgeIdSet = nodule_out_edge_map[curr_nodule]
-        if out_edges:
-            for edge_id in out_edges:
-                # Calculate the next addition to the graph walk.
-                next_graph_hop: GraphHop = make_graph_hop_from_edge_id(edge_id=edge_id, edge_lookup_map=edge_lookup_map)
-                next_graph_hop_seq: GraphHopSequence = (*curr_graph_hop_seq, next_graph_hop)
-
-                # Calculate the next addition to the stack walk.
-                next_stack_hop: StackHop = make_stack_hop_from_edge_id(edge_id=edge_id, edge_lookup_map=edge_lookup_map)
-                next_stack_hop_seq: StackHopSequence = (*curr_stack_hop_seq, next_stack_hop)
-
-                # Get the next nodule from this edge we traversed.
-                next_nodule: Nodule = edge_lookup_map[edge_id].dst_nodule
-
-                yield from helper(curr_nodule=next_nodule
-                                  , curr_graph_hop_seq=next_graph_hop_seq
-                                  , curr_stack_hop_seq=next_stack_hop_seq
-                                  )
-        # Base case, stop when this nodule is a dead end.
-        else:
-            if close_nodule is not None and curr_nodule != close_nodule:
-                logger.warning(f'Found branch that does not end with expected close nodule, '
-                               f'expected = {close_nodule}, found = {curr_nodule}')
-                return
-
-            yield curr_graph_hop_seq, curr_stack_hop_seq
-
-    yield from helper(curr_nodule=start_nodule
-                      , curr_graph_hop_seq=()
-                      , curr_stack_hop_seq=()
-                      )
+    for graph_hop_seq, stack_hop_seq, _, _ in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                              , edge_lookup_map=edge_lookup_map
+                                                              , start_nodule=start_nodule
+                                                              , close_nodule=close_nodule
+                                                              , prune=False
+                                                              ):
+        yield graph_hop_seq, stack_hop_seq
 
 
 def validate_stack_cmd_seq(*
@@ -495,7 +1146,7 @@ def validate_stack_cmd_seq(*
     # This tracks the slot filter selected when a new scope is created.
     selections: typ.DefaultDict[PathDepth, typ.List[sf.SlotFilter]] = collections.defaultdict(list)
 
-    curr_stack: SlotFilterStack = ()
+    curr_stack: SlotFilterStack = EMPTY_SLOT_FILTER_STACK
 
     # Iterate over all stack commands in stack hop sequence.
     # This requires some unpacking.
@@ -504,8 +1155,8 @@ def validate_stack_cmd_seq(*
         next_stack = process_stack(stack=curr_stack, stack_cmd=stack_cmd)
 
         # Assert that one stack is a prefix of the other.
-        for c, n in zip(curr_stack, next_stack):
-            assert c == n
+        # Since persistent stacks share their items, this only needs to check their links.
+        assert next_stack is curr_stack or next_stack.parent is curr_stack or curr_stack.parent is next_stack
 
         # The path depth of a stack is equal to its length.
         curr_depth: PathDepth = len(curr_stack)
@@ -532,8 +1183,9 @@ def validate_stack_cmd_seq(*
 
                 intersect = sf.intersection(cached_sf, tested_sf)
                 if intersect == sf.BLOCK_ALL:
-                    logger.debug(f'New and cached slot filters did not intersect; '
-                                 f'new = {tested_sf}, cached = {cached_sf}')
+                    logger.debug('New and cached slot filters did not intersect; new = %s, cached = %s'
+                                 , tested_sf, cached_sf)
+                    cmet.increment(cmet.VALIDATION_FAILURES)
                     return False, None
 
                 # Update cache and stack with new intersected slot filter, since it may have been narrowed in scope.
@@ -554,7 +1206,8 @@ def validate_stack_cmd_seq(*
 
     # If stack hop sequence is valid, we should be once again left with an empty stack.
     if curr_stack:
-        logger.debug(f'Final stack was not empty, contained {curr_stack}')
+        logger.debug('Final stack was not empty, contained %s', curr_stack)
+        cmet.increment(cmet.VALIDATION_FAILURES)
         return False, None
 
     # Convert stacks into proper choice sequence.
@@ -566,6 +1219,79 @@ def validate_stack_cmd_seq(*
     return True, choice_sequence
 
 
+# Incremental form of the bookkeeping done in validate_stack_cmd_seq, so that it can be carried along a walk.
+# Caches hold the current allowed slot filter for each path depth, and selections hold the slot filters chosen
+# for each new scope, grouped by path depth. Both are immutable so that branches of a walk can share them.
+class StackValidationState(typ.NamedTuple):
+    stack: SlotFilterStack = EMPTY_SLOT_FILTER_STACK
+    caches: typ.Sequence[sf.SlotFilter] = ()
+    selections: SlotFilterChoiceSequence = ()
+
+
+def _advance_stack_caches(*
+                          , stack: SlotFilterStack
+                          , caches: typ.Sequence[sf.SlotFilter]
+                          , stack_cmd: StackCommand
+                          ) -> typ.Optional[typ.Tuple[SlotFilterStack, typ.Sequence[sf.SlotFilter]]]:
+    """Applies a single stack command to a slot filter stack and its per-depth caches.
+    Returns None if the command makes the sequence illegal, i.e. if a slot filter intersection becomes block-all.
+    """
+    if stack_cmd is None:
+        return stack, caches
+
+    next_stack: SlotFilterStack = process_stack(stack=stack, stack_cmd=stack_cmd)
+
+    if stack_cmd.direction == StackDirection.PUSH:
+        # The path depth of the pushed slot filter.
+        depth: PathDepth = len(stack)
+        tested_sf: sf.SlotFilter = stack_cmd.slot_filter
+
+        # If there is an existing scope at this depth, narrow its cached slot filter.
+        # Otherwise, a new scope starts with the pushed slot filter.
+        intersect = sf.intersection(caches[depth], tested_sf) if depth < len(caches) else tested_sf
+        if intersect == sf.BLOCK_ALL:
+            return None
+
+        return next_stack, (*caches[:depth], intersect)
+    else:
+        # Drop the caches of any scopes nested inside of the popped scope.
+        return next_stack, caches[:len(next_stack) + 1]
+
+
+def advance_stack_validation_state(*
+                                   , state: StackValidationState
+                                   , stack_cmd: StackCommand
+                                   ) -> typ.Optional[StackValidationState]:
+    """Applies a single stack command to a stack validation state.
+    Returns None if the command makes the sequence illegal, i.e. if a slot filter intersection becomes block-all.
+    """
+    if stack_cmd is None:
+        return state
+
+    result = _advance_stack_caches(stack=state.stack, caches=state.caches, stack_cmd=stack_cmd)
+    if result is None:
+        return None
+
+    next_stack, next_caches = result
+    selections = state.selections
+
+    if stack_cmd.direction == StackDirection.PUSH:
+        depth: PathDepth = len(state.stack)
+        selected_sf: sf.SlotFilter = next_caches[depth]
+
+        if depth < len(state.caches):
+            # An existing scope was narrowed, update its latest selection.
+            selections = (*selections[:depth], (*selections[depth][:-1], selected_sf), *selections[depth + 1:])
+        elif depth < len(selections):
+            # A new scope was started at a depth that has been seen before.
+            selections = (*selections[:depth], (*selections[depth], selected_sf), *selections[depth + 1:])
+        else:
+            # A new scope was started at a new depth.
+            selections = (*selections, (selected_sf,))
+
+    return StackValidationState(stack=next_stack, caches=next_caches, selections=selections)
+
+
 def flatten_stack_hop_seq(*
                           , stack_hop_seq: StackHopSequence
                           ) -> StackCommandSequence:
@@ -592,6 +1318,531 @@ def yield_valid_hop_seqs(*
             yield graph_hop_seq, stack_hop_seq, choice_seq
 
 
+def _yield_hop_seqs(*
+                    , nodule_out_edge_map: NoduleOutEdgeMap
+                    , edge_lookup_map: EdgeLookupMap
+                    , start_nodule: Nodule
+                    , close_nodule: Nodule
+                    , prune: bool
+                    , start_positions: OutEdgePositionSequence = ()
+                    , track_positions: bool = False
+                    , accept_hop: typ.Optional[HopAcceptor] = None
+                    , on_exhausted: typ.Optional[ExhaustionCallback] = None
+                    , fixed_depth: int = 0
+                    , step_interval: int = 0
+                    ) -> typ.Iterable[typ.Optional[typ.Tuple[GraphHopSequence, StackHopSequence,
+                                                             typ.Optional[StackValidationState],
+                                                             typ.Optional[OutEdgePositionSequence]]]]:
+    """Walks a nodule graph depth-first, yielding the hop sequences of each walk that reaches a dead end.
+    If pruning, a stack validation state is carried along each walk, and branches that become illegal are cut off;
+    the final validation state of each walk is yielded as well. Otherwise, None is yielded in its place.
+
+    If tracking positions, the out edge positions taken at each nodule of a walk are yielded as well.
+    If start positions are given, the walk is resumed from the walk with those out edge positions.
+    If a hop acceptor is given, branches are also cut off whenever it rejects a hop.
+    If an exhaustion callback is given, it is called for each nodule on the path that has no walks left to try.
+    If a fixed depth is given, the out edges taken at that many of the first nodules are never changed,
+    which confines the walk to the subspace below the first start positions.
+    If a step interval is given, None is also yielded each time that many more hops have been tried, whether they
+    were taken or cut off.
+
+    An explicit stack is used instead of recursion, so long recipes do not hit the recursion limit.
+    All walks share a single path buffer, which is only copied when a complete walk is yielded.
+    """
+    graph_hop_buf: typ.MutableSequence[GraphHop] = []
+    stack_hop_buf: typ.MutableSequence[StackHop] = []
+    state_buf: typ.MutableSequence[typ.Optional[StackValidationState]] = [StackValidationState() if prune else None]
+
+    # Remaining out edges to try for each nodule with out edges on the current path,
+    # along with how many out edges have been taken from each of them so far.
+    edge_iter_stack: typ.MutableSequence[typ.Iterator[EdgeId]] = []
+    taken_count_stack: typ.MutableSequence[int] = []
+
+    def take_hop(edge_def: EdgeDef) -> bool:
+        next_state: typ.Optional[StackValidationState] = None
+        if prune:
+            # Advance the validation state, and prune this branch if it has become illegal.
+            next_state = advance_stack_validation_state(state=state_buf[-1], stack_cmd=edge_def.start_cmd)
+            if next_state is None:
+                return False
+            next_state = advance_stack_validation_state(state=next_state, stack_cmd=edge_def.close_cmd)
+            if next_state is None:
+                return False
+            if accept_hop is not None and not accept_hop(state_buf[-1], next_state, edge_def):
+                return False
+
+        graph_hop_buf.append(GraphHop(edge_id=edge_def.id, nodule=edge_def.dst_nodule))
+        stack_hop_buf.append(StackHop(start_cmd=edge_def.start_cmd, close_cmd=edge_def.close_cmd))
+        state_buf.append(next_state)
+        return True
+
+    def backtrack():
+        # The start nodule is the only nodule on the path not reached by a hop.
+        if graph_hop_buf:
+            graph_hop_buf.pop()
+            stack_hop_buf.pop()
+            state_buf.pop()
+
+    next_nodule: typ.Optional[Nodule] = start_nodule
+
+    # Rebuild the path leading to the start positions, if any.
+    for position in start_positions:
+        edge_iter = iter(nodule_out_edge_map[next_nodule])
+        edge_id = next(itertools.islice(edge_iter, position, None), None)
+        if edge_id is None:
+            raise chex.InvalidWalkCursor(f'Out edge position out of range for nodule {next_nodule}; '
+                                         f'position = {position}')
+
+        edge_iter_stack.append(edge_iter)
+        taken_count_stack.append(position + 1)
+
+        edge_def: EdgeDef = edge_lookup_map[edge_id]
+        if not take_hop(edge_def):
+            raise chex.InvalidWalkCursor(f'Out edge positions do not lead to a valid walk; '
+                                         f'positions = {start_positions}')
+
+        next_nodule = edge_def.dst_nodule
+
+    # Counted locally, and only recorded once enumeration stops.
+    hops_visited = 0
+    walks_pruned = 0
+    walk_count = 0
+    steps_since_yield = 0
+
+    # The span also covers time spent by the consumer between walks.
+    span = ctr.span('enumerate_walks', prune=prune, start_depth=len(start_positions))
+
+    try:
+        while True:
+            if next_nodule is not None:
+                out_edges: OutEdgeIdSet = nodule_out_edge_map[next_nodule]
+                if out_edges:
+                    edge_iter_stack.append(iter(out_edges))
+                    taken_count_stack.append(0)
+                # Base case, stop when this nodule is a dead end.
+                else:
+                    if close_nodule is not None and next_nodule != close_nodule:
+                        logger.warning('Found branch that does not end with expected close nodule, '
+                                       'expected = %s, found = %s', close_nodule, next_nodule)
+                    else:
+                        positions = tuple(c - 1 for c in taken_count_stack) if track_positions else None
+                        walk_count += 1
+                        yield tuple(graph_hop_buf), tuple(stack_hop_buf), state_buf[-1], positions
+
+                    if on_exhausted is not None:
+                        on_exhausted(next_nodule, state_buf[-1])
+
+                    backtrack()
+
+                next_nodule = None
+
+            if len(edge_iter_stack) <= fixed_depth:
+                break
+
+            edge_id: typ.Optional[EdgeId] = next(edge_iter_stack[-1], None)
+            if edge_id is None:
+                # All out edges of this nodule have been tried.
+                edge_iter_stack.pop()
+                taken_count_stack.pop()
+                if on_exhausted is not None:
+                    on_exhausted(graph_hop_buf[-1].nodule if graph_hop_buf else start_nodule, state_buf[-1])
+                backtrack()
+                continue
+
+            taken_count_stack[-1] += 1
+
+            edge_def: EdgeDef = edge_lookup_map[edge_id]
+            if take_hop(edge_def):
+                hops_visited += 1
+                next_nodule = edge_def.dst_nodule
+            else:
+                walks_pruned += 1
+
+            if step_interval:
+                steps_since_yield += 1
+                if steps_since_yield >= step_interval:
+                    steps_since_yield = 0
+                    yield None
+    finally:
+        cmet.increment(cmet.HOPS_VISITED, hops_visited)
+        cmet.increment(cmet.WALKS_PRUNED, walks_pruned)
+        span.finish(walk_count=walk_count, hops_visited=hops_visited, walks_pruned=walks_pruned)
+
+
+def yield_pruned_valid_hop_seqs(*
+                                , nodule_out_edge_map: NoduleOutEdgeMap
+                                , edge_lookup_map: EdgeLookupMap
+                                , start_nodule: Nodule
+                                , close_nodule: Nodule = None
+                                ) -> typ.Iterable[typ.Tuple[GraphHopSequence, StackHopSequence,
+                                                            SlotFilterChoiceSequence]]:
+    """Yields the same results as yield_valid_hop_seqs, but validates stack commands while walking the graph.
+    Any branch whose slot filter intersection becomes block-all is cut off as soon as it is found,
+    instead of walking every complete path and filtering afterwards.
+    """
+    for graph_hop_seq, stack_hop_seq, state, _ in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                  , edge_lookup_map=edge_lookup_map
+                                                                  , start_nodule=start_nodule
+                                                                  , close_nodule=close_nodule
+                                                                  , prune=True
+                                                                  ):
+        # If the walk is valid, we should be once again left with an empty stack.
+        if state.stack:
+            logger.debug('Final stack was not empty, contained %s', state.stack)
+            continue
+
+        yield graph_hop_seq, stack_hop_seq, state.selections
+
+
+def yield_valid_hop_seqs_in_steps(*
+                                  , nodule_out_edge_map: NoduleOutEdgeMap
+                                  , edge_lookup_map: EdgeLookupMap
+                                  , start_nodule: Nodule
+                                  , close_nodule: Nodule = None
+                                  , prune: bool
+                                  , step_interval: int
+                                  ) -> typ.Iterable[typ.Optional[typ.Tuple[GraphHopSequence, StackHopSequence,
+                                                                           SlotFilterChoiceSequence]]]:
+    """Yields the same walks as yield_pruned_valid_hop_seqs if pruning, or yield_valid_hop_seqs if not.
+    In between walks, None is also yielded each time another step interval of hops have been tried, even if none of
+    them lead to a valid walk. This lets a caller regain control at a steady rate, such as to share an event loop.
+    """
+    for result in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                  , edge_lookup_map=edge_lookup_map
+                                  , start_nodule=start_nodule
+                                  , close_nodule=close_nodule
+                                  , prune=prune
+                                  , step_interval=step_interval
+                                  ):
+        if result is None:
+            yield None
+            continue
+
+        graph_hop_seq, stack_hop_seq, state, _ = result
+        if prune:
+            if state.stack:
+                logger.debug('Final stack was not empty, contained %s', state.stack)
+                continue
+
+            yield graph_hop_seq, stack_hop_seq, state.selections
+        else:
+            stack_cmd_seq = flatten_stack_hop_seq(stack_hop_seq=stack_hop_seq)
+            is_valid, choice_seq = validate_stack_cmd_seq(stack_cmd_seq=stack_cmd_seq)
+            if is_valid:
+                yield graph_hop_seq, stack_hop_seq, choice_seq
+
+
+# Key for memoizing walk counts, made of a nodule, a slot filter stack and its per-depth caches.
+_WalkCountKey = typ.Tuple[Nodule, SlotFilterStack, typ.Sequence[sf.SlotFilter]]
+
+
+def _make_child_walk_count_key(*
+                               , key: _WalkCountKey
+                               , edge_def: EdgeDef
+                               ) -> typ.Optional[_WalkCountKey]:
+    """Returns the walk count key reached by traversing an edge, or None if traversing it is illegal."""
+    _, stack, caches = key
+
+    result = _advance_stack_caches(stack=stack, caches=caches, stack_cmd=edge_def.start_cmd)
+    if result is not None:
+        result = _advance_stack_caches(stack=result[0], caches=result[1], stack_cmd=edge_def.close_cmd)
+    if result is None:
+        return None
+
+    return (edge_def.dst_nodule, *result)
+
+
+def _count_valid_walks_memo(*
+                            , nodule_out_edge_map: NoduleOutEdgeMap
+                            , edge_lookup_map: EdgeLookupMap
+                            , start_nodule: Nodule
+                            , close_nodule: Nodule
+                            ) -> typ.Tuple[typ.Mapping[_WalkCountKey, int], _WalkCountKey]:
+    """Returns the memoized valid walk counts for every reachable walk count key, along with the start key."""
+    # Maps (nodule, stack, caches) to the number of valid walks from that point onwards.
+    memo: typ.MutableMapping[_WalkCountKey, int] = {}
+
+    # Each frame contains a memo key, the remaining out edges to try, the running count,
+    # and the memo key of a child frame whose count has not been added yet.
+    frames: typ.MutableSequence[typ.List] = []
+
+    def open_frame(key):
+        nodule, stack, _ = key
+        out_edges: OutEdgeIdSet = nodule_out_edge_map[nodule]
+        if out_edges:
+            frames.append([key, iter(out_edges), 0, None])
+        # Base case, this nodule is a dead end.
+        else:
+            if close_nodule is not None and nodule != close_nodule:
+                logger.warning('Found branch that does not end with expected close nodule, '
+                               'expected = %s, found = %s', close_nodule, nodule)
+                memo[key] = 0
+            else:
+                # If the walk is valid, we should be once again left with an empty stack.
+                memo[key] = 0 if stack else 1
+
+    start_key = (start_nodule, EMPTY_SLOT_FILTER_STACK, ())
+    open_frame(start_key)
+
+    while frames:
+        frame = frames[-1]
+        key, edge_iter, _, pending_key = frame
+
+        if pending_key is not None:
+            frame[2] += memo[pending_key]
+            frame[3] = None
+
+        for edge_id in edge_iter:
+            child_key = _make_child_walk_count_key(key=key, edge_def=edge_lookup_map[edge_id])
+            if child_key is None:
+                continue
+
+            if child_key not in memo:
+                open_frame(child_key)
+
+            if child_key in memo:
+                frame[2] += memo[child_key]
+            else:
+                # Descend into the child frame, and come back to this frame afterwards.
+                frame[3] = child_key
+                break
+        else:
+            memo[key] = frame[2]
+            frames.pop()
+
+    return memo, start_key
+
+
+class WalkCountTable(typ.NamedTuple):
+    """Memoized valid walk counts of a nodule graph, used to look up walks by index without enumerating others.
+    Can be made once per graph with make_walk_count_table, and reused for any number of lookups.
+    """
+    counts: typ.Mapping[_WalkCountKey, int]
+    start_key: _WalkCountKey
+
+    @property
+    def walk_count(self) -> int:
+        return self.counts[self.start_key]
+
+
+def make_walk_count_table(*
+                          , nodule_out_edge_map: NoduleOutEdgeMap
+                          , edge_lookup_map: EdgeLookupMap
+                          , start_nodule: Nodule
+                          , close_nodule: Nodule = None
+                          ) -> WalkCountTable:
+    memo, start_key = _count_valid_walks_memo(nodule_out_edge_map=nodule_out_edge_map
+                                              , edge_lookup_map=edge_lookup_map
+                                              , start_nodule=start_nodule
+                                              , close_nodule=close_nodule
+                                              )
+    return WalkCountTable(counts=memo, start_key=start_key)
+
+
+def count_valid_walks(*
+                      , nodule_out_edge_map: NoduleOutEdgeMap
+                      , edge_lookup_map: EdgeLookupMap
+                      , start_nodule: Nodule
+                      , close_nodule: Nodule = None
+                      ) -> int:
+    """Counts the valid walks of a nodule graph, without enumerating them.
+
+    The number of valid walks leading out of a nodule only depends on the slot filter stack and per-depth cached
+    slot filters at that point, so counts are memoized on (nodule, stack, caches) and summed up over the graph.
+    """
+    with cmet.time_stage('count_valid_walks'), ctr.span('count_valid_walks') as span:
+        memo, start_key = _count_valid_walks_memo(nodule_out_edge_map=nodule_out_edge_map
+                                                  , edge_lookup_map=edge_lookup_map
+                                                  , start_nodule=start_nodule
+                                                  , close_nodule=close_nodule
+                                                  )
+        span.set(variant_count=memo[start_key], memo_size=len(memo))
+
+    return memo[start_key]
+
+
+def find_valid_walk_cursor(*
+                           , nodule_out_edge_map: NoduleOutEdgeMap
+                           , edge_lookup_map: EdgeLookupMap
+                           , start_nodule: Nodule
+                           , close_nodule: Nodule = None
+                           , index: int
+                           , walk_count_table: WalkCountTable = None
+                           ) -> WalkCursor:
+    """Finds the cursor of the valid walk at a given index, in the order yielded by yield_pruned_valid_hop_seqs.
+    Uses the memoized walk counts to skip over whole subgraphs, instead of enumerating the walks before it.
+    If no walk count table is given, one is made for this call only, which takes time linear in its size.
+    """
+    if walk_count_table is None:
+        walk_count_table = make_walk_count_table(nodule_out_edge_map=nodule_out_edge_map
+                                                 , edge_lookup_map=edge_lookup_map
+                                                 , start_nodule=start_nodule
+                                                 , close_nodule=close_nodule
+                                                 )
+
+    memo, start_key = walk_count_table
+
+    if not 0 <= index < memo[start_key]:
+        raise IndexError(f'Valid walk index out of range; index = {index}, count = {memo[start_key]}')
+
+    positions: typ.MutableSequence[int] = []
+    key: _WalkCountKey = start_key
+
+    # Keep following out edges until the dead end of the walk is reached.
+    while nodule_out_edge_map[key[0]]:
+        for position, edge_id in enumerate(nodule_out_edge_map[key[0]]):
+            child_key = _make_child_walk_count_key(key=key, edge_def=edge_lookup_map[edge_id])
+            if child_key is None:
+                continue
+
+            child_count = memo[child_key]
+            if index < child_count:
+                positions.append(position)
+                key = child_key
+                break
+
+            index -= child_count
+
+    return WalkCursor(out_edge_positions=tuple(positions))
+
+
+def yield_valid_hop_seqs_from_cursor(*
+                                     , nodule_out_edge_map: NoduleOutEdgeMap
+                                     , edge_lookup_map: EdgeLookupMap
+                                     , start_nodule: Nodule
+                                     , close_nodule: Nodule = None
+                                     , cursor: WalkCursor = WalkCursor()
+                                     ) -> typ.Iterable[typ.Tuple[WalkCursor, GraphHopSequence, StackHopSequence,
+                                                                 SlotFilterChoiceSequence]]:
+    """Yields valid hop sequences in the same order as yield_pruned_valid_hop_seqs, starting at (and including)
+    the walk pointed to by a cursor. Each walk is yielded along with its own cursor, so enumeration can be resumed
+    later on from any walk.
+    """
+    for graph_hop_seq, stack_hop_seq, state, positions in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                          , edge_lookup_map=edge_lookup_map
+                                                                          , start_nodule=start_nodule
+                                                                          , close_nodule=close_nodule
+                                                                          , prune=True
+                                                                          , start_positions=cursor.out_edge_positions
+                                                                          , track_positions=True
+                                                                          ):
+        if state.stack:
+            continue
+
+        yield WalkCursor(out_edge_positions=positions), graph_hop_seq, stack_hop_seq, state.selections
+
+
+def get_valid_hop_seq(*
+                      , nodule_out_edge_map: NoduleOutEdgeMap
+                      , edge_lookup_map: EdgeLookupMap
+                      , start_nodule: Nodule
+                      , close_nodule: Nodule = None
+                      , index: int
+                      , walk_count_table: WalkCountTable = None
+                      ) -> typ.Tuple[GraphHopSequence, StackHopSequence, SlotFilterChoiceSequence]:
+    """Gets the valid hop sequence at a given index, in the order yielded by yield_pruned_valid_hop_seqs.
+    Pass in a walk count table made once for the graph to make repeated lookups cheap.
+    """
+    cursor = find_valid_walk_cursor(nodule_out_edge_map=nodule_out_edge_map
+                                    , edge_lookup_map=edge_lookup_map
+                                    , start_nodule=start_nodule
+                                    , close_nodule=close_nodule
+                                    , index=index
+                                    , walk_count_table=walk_count_table
+                                    )
+
+    _, graph_hop_seq, stack_hop_seq, choice_seq = next(iter(
+        yield_valid_hop_seqs_from_cursor(nodule_out_edge_map=nodule_out_edge_map
+                                         , edge_lookup_map=edge_lookup_map
+                                         , start_nodule=start_nodule
+                                         , close_nodule=close_nodule
+                                         , cursor=cursor
+                                         )
+    ))
+
+    return graph_hop_seq, stack_hop_seq, choice_seq
+
+
+# Sets of valid walks, as bitsets of walk indices in the order yielded by yield_pruned_valid_hop_seqs.
+# Bit N of a bitset is set if the walk with index N is in the set.
+VariantBitset = int
+
+
+# Maps each edge and token to the bitset of the valid walks that contain it.
+# Tokens are keyed by their token ID, and edges and tokens not in any valid walk are left out.
+class VariantIndex(typ.NamedTuple):
+    variant_count: int
+    edge_variants: typ.Mapping[EdgeId, VariantBitset]
+    token_variants: typ.Mapping[ctpt.TokenId, VariantBitset]
+
+
+def yield_variant_indices(variant_bitset: VariantBitset) -> typ.Iterable[int]:
+    """Yields the walk indices in a variant bitset, in increasing order."""
+    while variant_bitset:
+        lowest_bit = variant_bitset & -variant_bitset
+        yield lowest_bit.bit_length() - 1
+        variant_bitset ^= lowest_bit
+
+
+def build_variant_index(*
+                        , nodule_out_edge_map: NoduleOutEdgeMap
+                        , edge_lookup_map: EdgeLookupMap
+                        , start_nodule: Nodule
+                        , close_nodule: Nodule = None
+                        ) -> VariantIndex:
+    """Finds which valid walks contain each edge and token, without enumerating the walks.
+
+    The walks leading out of a walk count key always take up a contiguous run of walk indices, one for each of its
+    memoized walks, starting at some base index. A key can be reached along several prefixes, so each key gets a
+    bitset of its base indices. These are pushed forward from the start key, with the walks of each out edge starting
+    after those of its earlier siblings. The walks containing an edge are then the runs starting at its base indices.
+    Bitsets take up one bit per valid walk.
+    """
+    span = ctr.span('build_variant_index')
+
+    memo, start_key = _count_valid_walks_memo(nodule_out_edge_map=nodule_out_edge_map
+                                              , edge_lookup_map=edge_lookup_map
+                                              , start_nodule=start_nodule
+                                              , close_nodule=close_nodule
+                                              )
+
+    base_bitsets: typ.DefaultDict[_WalkCountKey, VariantBitset] = collections.defaultdict(int)
+    base_bitsets[start_key] = 1
+    edge_variants: typ.DefaultDict[EdgeId, VariantBitset] = collections.defaultdict(int)
+
+    # Keys are memoized after all of their children, so going backwards over the memo visits parents first.
+    for key in reversed(tuple(memo)):
+        base_bitset = base_bitsets.pop(key, 0)
+        if not base_bitset or not memo[key]:
+            continue
+
+        offset = 0
+        for edge_id in nodule_out_edge_map[key[0]]:
+            child_key = _make_child_walk_count_key(key=key, edge_def=edge_lookup_map[edge_id])
+            if child_key is None or not memo[child_key]:
+                continue
+
+            child_base_bitset = base_bitset << offset
+            base_bitsets[child_key] |= child_base_bitset
+
+            # Runs of walks from different bases never overlap, so this multiplication never carries.
+            edge_variants[edge_id] |= child_base_bitset * ((1 << memo[child_key]) - 1)
+
+            offset += memo[child_key]
+
+    token_variants: typ.DefaultDict[ctpt.TokenId, VariantBitset] = collections.defaultdict(int)
+    for edge_id, variant_bitset in edge_variants.items():
+        for token in edge_lookup_map[edge_id].token_seq:
+            token_variants[token.id] |= variant_bitset
+
+    span.finish(variant_count=memo[start_key], edge_count=len(edge_variants))
+
+    return VariantIndex(variant_count=memo[start_key]
+                        , edge_variants=dict(edge_variants)
+                        , token_variants=dict(token_variants)
+                        )
+
+
 def yield_tokens_from_graph_walk(*
                                  , nodule_out_edge_map: NoduleOutEdgeMap
                                  , edge_lookup_map: EdgeLookupMap
@@ -613,13 +1864,717 @@ def yield_tokens_from_graph_walk(*
         edge_def: EdgeDef = edge_lookup_map[desired_out_edge_id]
 
         assert edge_def.src_nodule == curr_nodule
-        assert edge_def.dst_nodule == desired_out_edge_id
+        assert edge_def.dst_nodule == desired_dst_nodule
 
         yield from edge_def.token_seq
 
         curr_nodule = desired_dst_nodule
 
 
+def yield_split_cursors(*
+                        , nodule_out_edge_map: NoduleOutEdgeMap
+                        , edge_lookup_map: EdgeLookupMap
+                        , start_nodule: Nodule
+                        , close_nodule: Nodule = None
+                        , split_count: int = 1
+                        ) -> typ.Iterable[WalkCursor]:
+    """Splits the valid walks of a nodule graph into disjoint subspaces, at the first branching nodules reachable
+    from the start nodule. Yields a cursor for the walk prefix of each subspace, in walk order.
+    Each prefix ends just after passing a given number of branching nodules, or at a dead end.
+    """
+    # Each entry contains a nodule, its validation state, the out edge positions taken to reach it,
+    # and the number of branching nodules passed along the way.
+    pending: typ.MutableSequence[typ.Tuple[Nodule, StackValidationState, OutEdgePositionSequence, int]] = [
+        (start_nodule, StackValidationState(), (), 0),
+    ]
+
+    while pending:
+        nodule, state, positions, branch_count = pending.pop()
+        out_edges: OutEdgeIdSet = nodule_out_edge_map[nodule]
+
+        if not out_edges or branch_count >= split_count:
+            yield WalkCursor(out_edge_positions=positions)
+            continue
+
+        next_branch_count = branch_count + (1 if len(out_edges) > 1 else 0)
+        children = []
+        for position, edge_id in enumerate(out_edges):
+            edge_def: EdgeDef = edge_lookup_map[edge_id]
+
+            next_state = advance_stack_validation_state(state=state, stack_cmd=edge_def.start_cmd)
+            if next_state is not None:
+                next_state = advance_stack_validation_state(state=next_state, stack_cmd=edge_def.close_cmd)
+            if next_state is None:
+                continue
+
+            children.append((edge_def.dst_nodule, next_state, (*positions, position), next_branch_count))
+
+        # Pushed in reverse, so that subspaces are yielded in walk order.
+        pending.extend(reversed(children))
+
+
+# Graph used by walk enumeration worker processes, set once per worker.
+_walk_worker_graph: typ.Optional[typ.Tuple[NoduleOutEdgeMap, EdgeLookupMap, Nodule, Nodule]] = None
+
+
+def _init_walk_worker(nodule_out_edge_map: NoduleOutEdgeMap
+                      , edge_lookup_map: EdgeLookupMap
+                      , start_nodule: Nodule
+                      , close_nodule: Nodule
+                      ) -> None:
+    global _walk_worker_graph
+    _walk_worker_graph = (nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule)
+
+
+def _enumerate_walk_chunk(prefix_positions: OutEdgePositionSequence
+                          , resume_positions: OutEdgePositionSequence
+                          , chunk_size: int
+                          ) -> typ.Tuple[typ.Sequence[typ.Tuple[GraphHopSequence, StackHopSequence,
+                                                                SlotFilterChoiceSequence]],
+                                         typ.Optional[OutEdgePositionSequence]]:
+    """Enumerates up to a chunk of valid walks in the subspace below a prefix, starting at a resume position.
+    Returns the walks, along with the position to resume from for the next chunk, or None if the subspace is done.
+    """
+    nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = _walk_worker_graph
+
+    walks = []
+    for graph_hop_seq, stack_hop_seq, state, positions in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                          , edge_lookup_map=edge_lookup_map
+                                                                          , start_nodule=start_nodule
+                                                                          , close_nodule=close_nodule
+                                                                          , prune=True
+                                                                          , start_positions=resume_positions
+                                                                          , track_positions=True
+                                                                          , fixed_depth=len(prefix_positions)
+                                                                          ):
+        if state.stack:
+            continue
+
+        if len(walks) >= chunk_size:
+            return walks, positions
+
+        walks.append((graph_hop_seq, stack_hop_seq, state.selections))
+
+    return walks, None
+
+
+def yield_valid_hop_seqs_in_pool(*
+                                 , nodule_out_edge_map: NoduleOutEdgeMap
+                                 , edge_lookup_map: EdgeLookupMap
+                                 , start_nodule: Nodule
+                                 , close_nodule: Nodule = None
+                                 , split_count: int = 1
+                                 , jobs: int = None
+                                 , chunk_size: int = 1000
+                                 , ordered: bool = True
+                                 , window: int = None
+                                 ) -> typ.Iterable[typ.Tuple[GraphHopSequence, StackHopSequence,
+                                                             SlotFilterChoiceSequence]]:
+    """Yields the same results as yield_pruned_valid_hop_seqs, using a pool of worker processes.
+
+    The walks are split into subspaces at the first branching nodules (see yield_split_cursors), and each subspace
+    is enumerated by workers in chunks, resuming from the last walk of the previous chunk.
+    If ordered, results are yielded in the same order as yield_pruned_valid_hop_seqs, which may require buffering
+    chunks of later subspaces. Otherwise, chunks are yielded as soon as they are ready.
+
+    At most a window of chunks are submitted or buffered at once, defaulting to twice the number of workers. The
+    earliest unfinished subspace may always go on, so that ordered results keep flowing while the window is full.
+    """
+    if window is None:
+        window = 2 * (jobs or os.cpu_count() or 1)
+
+    if window < 1:
+        raise ValueError(f'Submission window must be positive; window = {window}')
+
+    split_cursors: typ.Sequence[WalkCursor] = tuple(yield_split_cursors(nodule_out_edge_map=nodule_out_edge_map
+                                                                        , edge_lookup_map=edge_lookup_map
+                                                                        , start_nodule=start_nodule
+                                                                        , close_nodule=close_nodule
+                                                                        , split_count=split_count
+                                                                        ))
+
+    logger.info('Split walks into %d subspace(s), with a window of %d chunk(s)', len(split_cursors), window)
+
+    executor = cf.ProcessPoolExecutor(max_workers=jobs
+                                      , initializer=_init_walk_worker
+                                      , initargs=(nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule)
+                                      )
+
+    try:
+        # Maps pending chunk futures to the index of their subspace.
+        pending: typ.MutableMapping[cf.Future, int] = {}
+
+        # Maps started but unfinished subspaces to the position their next chunk resumes from, while not pending.
+        paused: typ.MutableMapping[int, OutEdgePositionSequence] = {}
+        next_unstarted_index = 0
+
+        # Used if ordered, to hold finished chunks until all of the subspaces before them are yielded.
+        buffered_chunks = [collections.deque() for _ in split_cursors]
+        buffered_count = 0
+        finished = [False for _ in split_cursors]
+        next_subspace_index = 0
+
+        def submit(subspace_index: int, resume_positions: OutEdgePositionSequence):
+            prefix_positions = split_cursors[subspace_index].out_edge_positions
+            future = executor.submit(_enumerate_walk_chunk, prefix_positions, resume_positions, chunk_size)
+            pending[future] = subspace_index
+
+        def fill_window():
+            nonlocal next_unstarted_index
+
+            # Whatever is next to be yielded may go on regardless of the window, otherwise nothing would drain it.
+            if ordered and next_subspace_index in paused:
+                submit(next_subspace_index, paused.pop(next_subspace_index))
+
+            # Earlier subspaces are continued before later ones are started, to keep the buffered chunks few.
+            while len(pending) + buffered_count < window:
+                if paused:
+                    subspace_index = min(paused)
+                    submit(subspace_index, paused.pop(subspace_index))
+                elif next_unstarted_index < len(split_cursors):
+                    submit(next_unstarted_index, split_cursors[next_unstarted_index].out_edge_positions)
+                    next_unstarted_index += 1
+                else:
+                    break
+
+        fill_window()
+
+        while pending:
+            done, _ = cf.wait(pending, return_when=cf.FIRST_COMPLETED)
+
+            for future in done:
+                subspace_index = pending.pop(future)
+                walks, resume_positions = future.result()
+
+                if resume_positions is not None:
+                    paused[subspace_index] = resume_positions
+                else:
+                    finished[subspace_index] = True
+
+                if ordered:
+                    buffered_chunks[subspace_index].append(walks)
+                    buffered_count += 1
+                else:
+                    yield from walks
+
+            if ordered:
+                while next_subspace_index < len(split_cursors):
+                    chunks = buffered_chunks[next_subspace_index]
+                    while chunks:
+                        buffered_count -= 1
+                        yield from chunks.popleft()
+
+                    if not finished[next_subspace_index]:
+                        break
+
+                    next_subspace_index += 1
+
+            fill_window()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _resolve_walk(*
+                  , nodule_out_edge_map: NoduleOutEdgeMap
+                  , edge_lookup_map: EdgeLookupMap
+                  , start_nodule: Nodule
+                  , close_nodule: Nodule
+                  , accept_hop: HopAcceptor
+                  , accept_selections: typ.Callable[[SlotFilterChoiceSequence], bool]
+                  , on_exhausted: typ.Optional[ExhaustionCallback] = None
+                  ) -> typ.Optional[GraphWalk]:
+    """Finds the first valid walk whose hops are all accepted, and whose slot filter selections are accepted.
+    Returns None if there is no such walk.
+    Since the search stops at the first accepted walk, every exhausted nodule passed to the callback is a failure.
+    """
+    for graph_hop_seq, _, state, _ in _yield_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                      , edge_lookup_map=edge_lookup_map
+                                                      , start_nodule=start_nodule
+                                                      , close_nodule=close_nodule
+                                                      , prune=True
+                                                      , accept_hop=accept_hop
+                                                      , on_exhausted=on_exhausted
+                                                      ):
+        if state.stack or not accept_selections(state.selections):
+            continue
+
+        return GraphWalk(start=start_nodule, hop_seq=graph_hop_seq)
+
+    return None
+
+
+def _with_token_seq(*
+                    , nodule_out_edge_map: NoduleOutEdgeMap
+                    , edge_lookup_map: EdgeLookupMap
+                    , graph_walk: GraphWalk
+                    ) -> typ.Tuple[GraphWalk, ctpt.TokenSequence]:
+    token_seq = tuple(yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                   , edge_lookup_map=edge_lookup_map
+                                                   , graph_walk=graph_walk
+                                                   ))
+    return graph_walk, token_seq
+
+
+def _find_removable_slots(*
+                          , nodule_out_edge_map: NoduleOutEdgeMap
+                          , edge_lookup_map: EdgeLookupMap
+                          , nodule: Nodule
+                          , depth: PathDepth
+                          , removable_map: typ.MutableMapping[Nodule, typ.Sequence[sf.SlotFilter]]
+                          ) -> typ.Sequence[sf.SlotFilter]:
+    """Finds the slots that could still be narrowed away from each scope open at a nodule, by any walk from there.
+    Entry N of the result has every slot blocked by some slot filter pushed at depth N before that scope closes.
+    Results are cached in the removable map for the nodule and every nodule reachable from it.
+    """
+    # Nodules are expanded once to queue their successors, and finished once all of those are in the map.
+    pending: typ.MutableSequence[typ.Tuple[Nodule, PathDepth, bool]] = [(nodule, depth, False)]
+
+    while pending:
+        curr_nodule, curr_depth, expanded = pending.pop()
+        if curr_nodule in removable_map:
+            continue
+
+        if not expanded:
+            pending.append((curr_nodule, curr_depth, True))
+
+        removable: typ.MutableSequence[sf.SlotFilter] = [sf.BLOCK_ALL] * (curr_depth + 1)
+
+        for edge_id in nodule_out_edge_map[curr_nodule]:
+            edge_def: EdgeDef = edge_lookup_map[edge_id]
+
+            # Track the lowest depth reached along the edge, since scopes deeper than that are closed by it.
+            edge_depth = low_depth = curr_depth
+            for stack_cmd in (edge_def.start_cmd, edge_def.close_cmd):
+                if stack_cmd is None:
+                    continue
+
+                if stack_cmd.direction == StackDirection.PUSH:
+                    if expanded and edge_depth == low_depth:
+                        removable[edge_depth] = sf.union(removable[edge_depth], sf.invert(stack_cmd.slot_filter))
+                    edge_depth += 1
+                else:
+                    edge_depth -= 1
+                    low_depth = min(low_depth, edge_depth)
+
+            if not expanded:
+                if edge_def.dst_nodule not in removable_map:
+                    pending.append((edge_def.dst_nodule, PathDepth(edge_depth), False))
+                continue
+
+            dst_removable = removable_map[edge_def.dst_nodule]
+            for scope_depth in range(low_depth + 1):
+                removable[scope_depth] = sf.union(removable[scope_depth], dst_removable[scope_depth])
+
+        if expanded:
+            removable_map[curr_nodule] = tuple(removable)
+
+    return removable_map[nodule]
+
+
+def find_walk_from_choice_seq(*
+                              , nodule_out_edge_map: NoduleOutEdgeMap
+                              , edge_lookup_map: EdgeLookupMap
+                              , start_nodule: Nodule
+                              , close_nodule: Nodule = None
+                              , choice_seq: SlotFilterChoiceSequence
+                              ) -> GraphWalk:
+    """Finds the first valid walk with a given slot filter choice sequence, without materializing its tokens.
+    At each branch, only out edges whose pushed slot filter still covers the expected choice are followed,
+    and each scope must match its expected choice exactly once it closes.
+
+    Each failed state is tried only once. Once a nodule has failed, the slots that walks from it could still narrow
+    away are found, and later walks reaching it with any other slots left to narrow away are cut off right away.
+    Walks that succeed without backtracking never look ahead, so only the graph along the walk gets traversed.
+    """
+    expected_selections = tuple(tuple(choices) for choices in choice_seq)
+
+    # The validation state on reaching a nodule is fully described by its stack and caches along with how many scopes
+    # have been seen at each depth, since every closed scope already matches its expected choice.
+    def state_key(nodule: Nodule, state: StackValidationState) -> typ.Hashable:
+        return nodule, tuple(state.stack), tuple(state.caches), tuple(len(s) for s in state.selections)
+
+    failed_keys: typ.MutableSet[typ.Hashable] = set()
+    removable_map: typ.MutableMapping[Nodule, typ.Sequence[sf.SlotFilter]] = {}
+
+    def accept_hop(prev_state: StackValidationState, next_state: StackValidationState, edge_def: EdgeDef) -> bool:
+        if edge_def.start_cmd is not None:
+            # Check the narrowed slot filter of the scope that was pushed to against the expected choice for it.
+            depth: PathDepth = len(prev_state.stack)
+            selections = next_state.selections[depth]
+            index = len(selections) - 1
+
+            if depth >= len(expected_selections) or index >= len(expected_selections[depth]):
+                return False
+
+            if not sf.all_pass(selections[index], expected_selections[depth][index]):
+                return False
+
+        # Scopes closed by this hop can no longer be narrowed.
+        for depth in range(len(next_state.caches), len(prev_state.caches)):
+            selections = next_state.selections[depth]
+            if selections[-1] != expected_selections[depth][len(selections) - 1]:
+                return False
+
+        dst_nodule = edge_def.dst_nodule
+        removable = removable_map.get(dst_nodule)
+        if removable is not None:
+            for depth, cache in enumerate(next_state.caches):
+                excess = sf.subtract(cache, expected_selections[depth][len(next_state.selections[depth]) - 1])
+                if sf.subtract(excess, removable[depth]) != sf.BLOCK_ALL:
+                    return False
+
+        return state_key(dst_nodule, next_state) not in failed_keys
+
+    def on_exhausted(nodule: Nodule, state: StackValidationState):
+        failed_keys.add(state_key(nodule, state))
+        _find_removable_slots(nodule_out_edge_map=nodule_out_edge_map
+                              , edge_lookup_map=edge_lookup_map
+                              , nodule=nodule
+                              , depth=PathDepth(len(state.stack))
+                              , removable_map=removable_map
+                              )
+
+    graph_walk = _resolve_walk(nodule_out_edge_map=nodule_out_edge_map
+                               , edge_lookup_map=edge_lookup_map
+                               , start_nodule=start_nodule
+                               , close_nodule=close_nodule
+                               , accept_hop=accept_hop
+                               , accept_selections=lambda selections: selections == expected_selections
+                               , on_exhausted=on_exhausted
+                               )
+
+    if graph_walk is None:
+        raise chex.InvalidSlotFilterPath(f'No valid walk has choice sequence {expected_selections}')
+
+    return graph_walk
+
+
+def resolve_walk_from_choice_seq(*
+                                 , nodule_out_edge_map: NoduleOutEdgeMap
+                                 , edge_lookup_map: EdgeLookupMap
+                                 , start_nodule: Nodule
+                                 , close_nodule: Nodule = None
+                                 , choice_seq: SlotFilterChoiceSequence
+                                 ) -> typ.Tuple[GraphWalk, ctpt.TokenSequence]:
+    """Finds the first valid walk with a given slot filter choice sequence, along with its tokens."""
+    graph_walk = find_walk_from_choice_seq(nodule_out_edge_map=nodule_out_edge_map
+                                           , edge_lookup_map=edge_lookup_map
+                                           , start_nodule=start_nodule
+                                           , close_nodule=close_nodule
+                                           , choice_seq=choice_seq
+                                           )
+
+    return _with_token_seq(nodule_out_edge_map=nodule_out_edge_map
+                           , edge_lookup_map=edge_lookup_map
+                           , graph_walk=graph_walk
+                           )
+
+
+def resolve_walk_from_slot_selection(*
+                                     , nodule_out_edge_map: NoduleOutEdgeMap
+                                     , edge_lookup_map: EdgeLookupMap
+                                     , start_nodule: Nodule
+                                     , close_nodule: Nodule = None
+                                     , slot_selection: sf.SlotSelection
+                                     ) -> typ.Tuple[GraphWalk, ctpt.TokenSequence]:
+    """Finds the first valid walk where every chosen alt allows all of the selected slots, along with its tokens.
+    At each branch, only out edges whose pushed slot filter allows the selected slots are followed.
+    """
+    def accept_hop(prev_state: StackValidationState, next_state: StackValidationState, edge_def: EdgeDef) -> bool:
+        if edge_def.start_cmd is None:
+            return True
+
+        depth: PathDepth = len(prev_state.stack)
+        return sf.all_pass(next_state.caches[depth], slot_selection)
+
+    graph_walk = _resolve_walk(nodule_out_edge_map=nodule_out_edge_map
+                               , edge_lookup_map=edge_lookup_map
+                               , start_nodule=start_nodule
+                               , close_nodule=close_nodule
+                               , accept_hop=accept_hop
+                               , accept_selections=lambda _: True
+                               )
+
+    if graph_walk is None:
+        raise chex.InvalidSlotFilterPath(f'No valid walk allows slot selection {slot_selection}')
+
+    return _with_token_seq(nodule_out_edge_map=nodule_out_edge_map
+                           , edge_lookup_map=edge_lookup_map
+                           , graph_walk=graph_walk
+                           )
+
+
+# A region where two walks over the same graph take different hops.
+# Both walks leave the same nodule and next meet again at the same nodule. The hop ranges are half-open ranges of
+# indices into the hop sequences of each walk, and the token sequences are the tokens along those hops.
+class WalkDifference(typ.NamedTuple):
+    src_nodule: Nodule
+
+    # Nodule where both walks arrive at the end of the region, or None if they never meet again and end apart.
+    dst_nodule: typ.Optional[Nodule]
+    hop_range_a: range
+    hop_range_b: range
+    token_seq_a: ctpt.TokenSequence
+    token_seq_b: ctpt.TokenSequence
+
+
+WalkDifferenceSequence = typ.Sequence[WalkDifference]
+
+
+def _find_rejoin(*
+                 , graph_walk_a: GraphWalk
+                 , graph_walk_b: GraphWalk
+                 , index_a: int
+                 , index_b: int
+                 ) -> typ.Tuple[int, int]:
+    """Given hop indices where two walks leave the same nodule along different edges, finds the hop indices where
+    they next arrive at the same nodule. Returns the lengths of the walks if they never meet again.
+    Both walks are advanced in turn, so this only looks at about as many hops as are in the differing region.
+    """
+    hop_seq_a = graph_walk_a.hop_seq
+    hop_seq_b = graph_walk_b.hop_seq
+
+    # Maps each nodule reached so far in the differing region to the index of the hop that arrived at it.
+    seen_a: typ.MutableMapping[Nodule, int] = {}
+    seen_b: typ.MutableMapping[Nodule, int] = {}
+
+    while index_a < len(hop_seq_a) or index_b < len(hop_seq_b):
+        if index_a < len(hop_seq_a):
+            nodule = hop_seq_a[index_a].nodule
+            if nodule in seen_b:
+                return index_a + 1, seen_b[nodule] + 1
+            seen_a[nodule] = index_a
+            index_a += 1
+
+        if index_b < len(hop_seq_b):
+            nodule = hop_seq_b[index_b].nodule
+            if nodule in seen_a:
+                return seen_a[nodule] + 1, index_b + 1
+            seen_b[nodule] = index_b
+            index_b += 1
+
+    return len(hop_seq_a), len(hop_seq_b)
+
+
+def diff_graph_walks(*
+                     , edge_lookup_map: EdgeLookupMap
+                     , graph_walk_a: GraphWalk
+                     , graph_walk_b: GraphWalk
+                     ) -> WalkDifferenceSequence:
+    """Finds the regions where two walks over the same graph differ.
+    Walks are compared hop by hop while they share edges, and are rejoined at the next nodule they share after
+    diverging. Tokens are only looked up for the hops in differing regions.
+    Either walk may have no hops in a region, such as when it ends before the other walk does. If the walks never
+    meet again and end at different nodules, the last region has no destination nodule.
+    """
+    if graph_walk_a.start != graph_walk_b.start:
+        raise ValueError(f'Walks do not share a start nodule; '
+                         f'start A = {graph_walk_a.start}, start B = {graph_walk_b.start}')
+
+    hop_seq_a = graph_walk_a.hop_seq
+    hop_seq_b = graph_walk_b.hop_seq
+
+    def region_token_seq(hop_seq: GraphHopSequence, hop_range: range) -> ctpt.TokenSequence:
+        return tuple(token for i in hop_range for token in edge_lookup_map[hop_seq[i].edge_id].token_seq)
+
+    differences: typ.MutableSequence[WalkDifference] = []
+
+    curr_nodule: Nodule = graph_walk_a.start
+    index_a = 0
+    index_b = 0
+
+    while index_a < len(hop_seq_a) or index_b < len(hop_seq_b):
+        if (index_a < len(hop_seq_a) and index_b < len(hop_seq_b)
+                and hop_seq_a[index_a].edge_id == hop_seq_b[index_b].edge_id):
+            curr_nodule = hop_seq_a[index_a].nodule
+            index_a += 1
+            index_b += 1
+            continue
+
+        rejoin_a, rejoin_b = _find_rejoin(graph_walk_a=graph_walk_a
+                                          , graph_walk_b=graph_walk_b
+                                          , index_a=index_a
+                                          , index_b=index_b
+                                          )
+
+        hop_range_a = range(index_a, rejoin_a)
+        hop_range_b = range(index_b, rejoin_b)
+        end_nodule_a: Nodule = hop_seq_a[rejoin_a - 1].nodule if rejoin_a > index_a else curr_nodule
+        end_nodule_b: Nodule = hop_seq_b[rejoin_b - 1].nodule if rejoin_b > index_b else curr_nodule
+        dst_nodule: typ.Optional[Nodule] = end_nodule_a if end_nodule_a == end_nodule_b else None
+
+        differences.append(WalkDifference(src_nodule=curr_nodule
+                                          , dst_nodule=dst_nodule
+                                          , hop_range_a=hop_range_a
+                                          , hop_range_b=hop_range_b
+                                          , token_seq_a=region_token_seq(hop_seq_a, hop_range_a)
+                                          , token_seq_b=region_token_seq(hop_seq_b, hop_range_b)
+                                          ))
+
+        curr_nodule = dst_nodule
+        index_a = rejoin_a
+        index_b = rejoin_b
+
+    return tuple(differences)
+
+
+def diff_choice_seqs(*
+                     , nodule_out_edge_map: NoduleOutEdgeMap
+                     , edge_lookup_map: EdgeLookupMap
+                     , start_nodule: Nodule
+                     , close_nodule: Nodule = None
+                     , choice_seq_a: SlotFilterChoiceSequence
+                     , choice_seq_b: SlotFilterChoiceSequence
+                     ) -> WalkDifferenceSequence:
+    """Finds the regions where the walks for two slot filter choice sequences differ."""
+    graph_walk_a, graph_walk_b = (find_walk_from_choice_seq(nodule_out_edge_map=nodule_out_edge_map
+                                                            , edge_lookup_map=edge_lookup_map
+                                                            , start_nodule=start_nodule
+                                                            , close_nodule=close_nodule
+                                                            , choice_seq=choice_seq
+                                                            )
+                                  for choice_seq in (choice_seq_a, choice_seq_b)
+                                  )
+
+    return diff_graph_walks(edge_lookup_map=edge_lookup_map
+                            , graph_walk_a=graph_walk_a
+                            , graph_walk_b=graph_walk_b
+                            )
+
+
+# Index of the root node of a token trie, which stands for an empty token sequence.
+TOKEN_TRIE_ROOT = 0
+
+
+# Prefix-shared token sequences of many walks at once.
+# Each non-root trie node adds the tokens of one edge to the tokens of its parent node. The tokens themselves are
+# never copied, they are read from the edge definitions on demand. Each walk is a pointer to a leaf node.
+class TokenTrie(typ.NamedTuple):
+    edge_lookup_map: EdgeLookupMap
+    node_parents: typ.Sequence[typ.Optional[int]]
+    node_edge_ids: typ.Sequence[typ.Optional[EdgeId]]
+    walk_leaves: typ.Sequence[int]
+
+
+def build_token_trie(*
+                     , edge_lookup_map: EdgeLookupMap
+                     , graph_hop_seqs: typ.Iterable[GraphHopSequence]
+                     ) -> TokenTrie:
+    """Builds a token trie from many graph hop sequences, such as those yielded by yield_pruned_valid_hop_seqs.
+    Walks that share a prefix of edges share the trie nodes for that prefix. Edges without tokens do not get
+    their own trie nodes.
+    """
+    node_parents: typ.MutableSequence[typ.Optional[int]] = [None]
+    node_edge_ids: typ.MutableSequence[typ.Optional[EdgeId]] = [None]
+    walk_leaves: typ.MutableSequence[int] = []
+
+    # Maps (parent node, edge ID) to child node.
+    child_map: typ.MutableMapping[typ.Tuple[int, EdgeId], int] = {}
+
+    for graph_hop_seq in graph_hop_seqs:
+        node = TOKEN_TRIE_ROOT
+        for graph_hop in graph_hop_seq:
+            edge_id: EdgeId = graph_hop.edge_id
+            if not edge_lookup_map[edge_id].token_seq:
+                continue
+
+            child = child_map.get((node, edge_id))
+            if child is None:
+                child = len(node_parents)
+                node_parents.append(node)
+                node_edge_ids.append(edge_id)
+                child_map[node, edge_id] = child
+
+            node = child
+
+        walk_leaves.append(node)
+
+    return TokenTrie(edge_lookup_map=edge_lookup_map
+                     , node_parents=tuple(node_parents)
+                     , node_edge_ids=tuple(node_edge_ids)
+                     , walk_leaves=tuple(walk_leaves)
+                     )
+
+
+def yield_tokens_from_token_trie(*
+                                 , token_trie: TokenTrie
+                                 , walk_index: int
+                                 ) -> typ.Iterable[ctpt.Token]:
+    """Yields the tokens of one of the walks in a token trie."""
+    # Collect the edges from the leaf up to the root, and then yield their tokens in walk order.
+    edge_ids: typ.MutableSequence[EdgeId] = []
+    node = token_trie.walk_leaves[walk_index]
+    while node != TOKEN_TRIE_ROOT:
+        edge_ids.append(token_trie.node_edge_ids[node])
+        node = token_trie.node_parents[node]
+
+    for edge_id in reversed(edge_ids):
+        yield from token_trie.edge_lookup_map[edge_id].token_seq
+
+
+def _token_content(token: ctpt.Token) -> typ.Tuple[typ.Optional[ctpt.TokenKeyword], ctpt.TokenData]:
+    """Returns the parts of a token that make up its content, leaving out its ID."""
+    keyword = None if token.type_def is None else token.type_def.keyword
+    return keyword, token.data
+
+
+def fingerprint_nodules(*
+                        , nodule_out_edge_map: NoduleOutEdgeMap
+                        , edge_lookup_map: EdgeLookupMap
+                        , start_nodule: Nodule
+                        ) -> typ.Mapping[Nodule, ctpc.UniqueId]:
+    """Calculates a content-based fingerprint for every nodule reachable from a start nodule.
+
+    The fingerprint of a nodule is a hash over its out edges, in order. The fingerprint of an edge is a hash over
+    the contents of its tokens, its stack commands and the fingerprint of its destination nodule. IDs are never
+    hashed, so nodules with the same graph ahead of them have the same fingerprint, even across separate graphs.
+    """
+    fingerprints: typ.MutableMapping[Nodule, ctpc.UniqueId] = {}
+
+    # Nodules are fingerprinted after all of their destination nodules, using an explicit stack.
+    pending: typ.MutableSequence[Nodule] = [start_nodule]
+    while pending:
+        nodule = pending[-1]
+        if nodule in fingerprints:
+            pending.pop()
+            continue
+
+        edge_defs = tuple(edge_lookup_map[edge_id] for edge_id in nodule_out_edge_map.get(nodule, ()))
+        unfinished = tuple(edge_def.dst_nodule for edge_def in edge_defs if edge_def.dst_nodule not in fingerprints)
+        if unfinished:
+            pending.extend(unfinished)
+            continue
+
+        edge_fingerprints = tuple(cids.make_content_id('edge'
+                                                       , tuple(map(_token_content, edge_def.token_seq))
+                                                       , stack_cmd_str(edge_def.start_cmd)
+                                                       , stack_cmd_str(edge_def.close_cmd)
+                                                       , fingerprints[edge_def.dst_nodule]
+                                                       )
+                                  for edge_def in edge_defs
+                                  )
+        fingerprints[nodule] = cids.make_content_id('nodule', edge_fingerprints)
+        pending.pop()
+
+    return fingerprints
+
+
+def fingerprint_graph(*
+                      , nodule_out_edge_map: NoduleOutEdgeMap
+                      , edge_lookup_map: EdgeLookupMap
+                      , start_nodule: Nodule
+                      ) -> ctpc.UniqueId:
+    """Calculates a content-based fingerprint of a nodule graph, which is the same for graphs with the same structure,
+    tokens and stack commands, regardless of their IDs. Graphs processed from the same procedure path always have
+    the same fingerprint, whether or not they share subgraphs.
+    Token contents are hashed using their repr, so token data should have a repr that is stable across runs.
+    """
+    return fingerprint_nodules(nodule_out_edge_map=nodule_out_edge_map
+                               , edge_lookup_map=edge_lookup_map
+                               , start_nodule=start_nodule
+                               )[start_nodule]
+
+
 def stack_cmd_str(stack_cmd: StackCommand) -> str:
     if not stack_cmd:
         return 'NoOp'
@@ -638,6 +2593,3 @@ def stack_cmd_label_str(stack_cmd: StackCommand) -> str:
         slot_filter: sf.SlotFilter = stack_cmd.slot_filter
 
         return f'{direction.value} {sf.pretty_string(slot_filter)}'
-
-
-# TODO: Need a way to list all legal filtered paths through a recipe, as well as a way to address each unique path.
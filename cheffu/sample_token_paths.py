@@ -0,0 +1,379 @@
+"""Sample Cheffu procedure paths, built directly from tokens and filtered alts.
+"""
+
+import itertools
+import typing as typ
+
+import cheffu.ids as cids
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.types.tokens as ctpt
+
+l_sf = sf.make_white_list(0, 1)
+r_sf = sf.invert(l_sf)
+
+sf_p_0_1 = sf.make_white_list(0, 1)
+
+sample_slot_filters = {
+    '0_1': sf.make_white_list(0, 1),
+}
+
+
+# Position of each created token, used to give tokens the same IDs on every run.
+_token_positions = itertools.count()
+
+
+def token(x: str) -> ctpt.Token:
+    return ctpt.Token(id=cids.make_token_id(token_data=x, position=next(_token_positions)), type_def=None, data=x)
+
+
+SAMPLE_TOKEN_PATHS: typ.Mapping[str, par.ProcedurePath] = {
+    'empty': (),
+    'sequence': (
+        token('A'),
+        token('B'),
+        token('C'),
+        token('D'),
+        token('E'),
+    ),
+    'simple_ub_split': (
+        token('A'),
+        token('B'),
+        (
+            par.FilteredAlt(
+                items=(token('C'), token('D'),),
+            ),
+            par.FilteredAlt(
+                items=(token('C~'), token('D~'),),
+            ),
+        ),
+        (
+            par.FilteredAlt(
+                items=(token('E'), token('F'),),
+            ),
+            par.FilteredAlt(
+                items=(token('E~'), token('F~'),),
+            ),
+        ),
+        token('G'),
+    ),
+    'singleton_ub_split': (
+        (
+            par.FilteredAlt(items=(token('A'), token('B'))),
+            par.FilteredAlt(items=(token('A~'), token('B~'))),
+        ),
+    ),
+    'kitchen_sink': (
+        token('A'),
+        token('B'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('C'),
+                    token('D'),
+                ),
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('C~'),
+                    token('D~'),
+                ),
+            ),
+        ),
+        token('E'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('F'),
+                    token('G'),
+                ),
+                slot_filter=sf.make_white_list(0),
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('F~'),
+                ),
+                slot_filter=sf.make_white_list(1),
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('G~'),
+                ),
+                slot_filter=sf.make_white_list(0, 1),
+            ),
+        ),
+        token('H'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('I'),
+                ),
+            ),
+            par.FilteredAlt(),
+        ),
+        token('J'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('K'),
+                ),
+                slot_filter=sf.make_white_list(0),
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('K~'),
+                ),
+                slot_filter=sf.make_white_list(1),
+            ),
+            par.FilteredAlt(
+                slot_filter=sf.make_white_list(2),
+            ),
+        ),
+        token('L'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('M'),
+                    token('N'),
+                    token('NN'),
+                    token('NNN'),
+                ),
+                slot_filter=sf.make_white_list(0),
+            ),
+        ),
+        token('O'),
+        (
+            par.FilteredAlt(
+                items=(
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('P'),
+                            ),
+                            slot_filter=sf.make_white_list(0),
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('Q'),
+                            ),
+                            slot_filter=sf.make_white_list(1),
+                        ),
+                    ),
+                    token('R'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('S'),
+                            ),
+                            slot_filter=sf.make_white_list(0),
+                        ),
+                    ),
+                ),
+                slot_filter=sf.make_white_list(0),
+            ),
+            par.FilteredAlt(
+                items=(
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('P~'),
+                            ),
+                            slot_filter=sf.make_white_list(0),
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('Q~'),
+                            ),
+                            slot_filter=sf.make_white_list(1),
+                        ),
+                    ),
+                    token('R~'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('S~'),
+                            ),
+                            slot_filter=sf.make_white_list(0),
+                        ),
+                        par.FilteredAlt(
+                            slot_filter=sf.make_white_list(1),
+                        ),
+                    ),
+                ),
+                slot_filter=sf.make_white_list(2),
+            ),
+        ),
+        token('T'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('U'),
+                ),
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('V'),
+                ),
+                slot_filter=sf.make_white_list(1),
+            ),
+            par.FilteredAlt(
+                slot_filter=sf.make_white_list(2),
+            ),
+        ),
+        token('W'),
+    ),
+    'symmetric_depth_2': (
+        token('A'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('B'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('D'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('E'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('H'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('J'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('K'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('N'),
+                ),
+                slot_filter=l_sf,
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('C'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('F'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('G'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('I'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('L'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('M'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('O'),
+                ),
+                slot_filter=r_sf,
+            ),
+        ),
+        token('P'),
+        (
+            par.FilteredAlt(
+                items=(
+                    token('Q'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('S'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('T'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('W'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('Y'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('Z'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('2'),
+                ),
+                slot_filter=l_sf,
+            ),
+            par.FilteredAlt(
+                items=(
+                    token('R'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('U'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('V'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('X'),
+                    (
+                        par.FilteredAlt(
+                            items=(
+                                token('0'),
+                            ),
+                            slot_filter=l_sf,
+                        ),
+                        par.FilteredAlt(
+                            items=(
+                                token('1'),
+                            ),
+                            slot_filter=r_sf,
+                        ),
+                    ),
+                    token('3'),
+                ),
+                slot_filter=r_sf,
+            ),
+        ),
+        token('4'),
+    ),
+}
+
@@ -0,0 +1,469 @@
+"""Versioned binary on-disk format for compact Cheffu graphs.
+
+A file starts with a fixed header and a table of sections, each tagged with four bytes and found at an 8-byte aligned
+offset. Integer tables are little-endian and fixed-width: 32-bit unsigned for indices and offsets, and 64-bit signed
+for integer IDs. On little-endian platforms with matching native widths, a loaded file uses them directly as
+memory-mapped views, and other platforms get decoded copies instead. Stack commands and slot filters are interned,
+and edges refer to tokens through a table of unique tokens.
+
+Nodule and edge IDs must all be integers, all be UUIDs or all be strings. Tokens are stored as JSON, holding their ID,
+the keyword of their token type and their data, so token data must be made of JSON types. Nothing is ever pickled, so
+loading a file never runs code from it.
+
+Loading a file only decodes its header and stack command table. Everything else, including the edge definitions
+themselves, is decoded on demand from the memory-mapped file.
+"""
+
+import array
+import collections.abc
+import json
+import mmap
+import struct
+import sys
+import typing as typ
+import uuid
+
+import cheffu.compact as cpt
+import cheffu.exceptions as chex
+import cheffu.logging as clog
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.types.tokens as ctpt
+
+logger = clog.get_logger(__name__)
+
+MAGIC = b'CHEFFUGR'
+FORMAT_VERSION = 2
+
+# Magic, format version, reserved flags and section count.
+HEADER_STRUCT = struct.Struct('<8sHHI')
+
+# Tag, offset from start of file and length in bytes.
+SECTION_STRUCT = struct.Struct('<4sQQ')
+
+# Start nodule, close nodule, nodule ID kind and edge ID kind.
+META_STRUCT = struct.Struct('<IIBB6x')
+
+SECTION_ALIGNMENT = 8
+
+# Ways of storing nodule and edge IDs.
+ID_KIND_INT = 0
+ID_KIND_UUID = 1
+ID_KIND_STR = 2
+
+# Struct format characters of the integer tables, always used with standard sizes.
+INDEX_FORMAT = 'I'
+INT_ID_FORMAT = 'q'
+UUID_SIZE = 16
+
+# Direction codes for the stored stack command table.
+NO_OP_CODE = 0
+PUSH_CODE = 1
+POP_CODE = 2
+
+META = b'META'
+NODULE_IDS = b'NIDS'
+NODULE_ID_OFFSETS = b'NIDO'
+EDGE_IDS = b'EIDS'
+EDGE_ID_OFFSETS = b'EIDO'
+OUT_EDGE_OFFSETS = b'OEOF'
+EDGE_SRC_NODULES = b'ESRC'
+EDGE_DST_NODULES = b'EDST'
+EDGE_START_CMDS = b'ESTC'
+EDGE_CLOSE_CMDS = b'ECLC'
+STACK_CMDS = b'SCMD'
+SLOT_FILTERS = b'SFDT'
+SLOT_FILTER_OFFSETS = b'SFOF'
+EDGE_TOKEN_OFFSETS = b'ETOF'
+TOKEN_REFS = b'TREF'
+TOKENS = b'TKDT'
+TOKEN_OFFSETS = b'TKOF'
+
+# Errors that decoding corrupt data can raise, all of which are reported as an invalid graph file.
+_DECODE_ERRORS = (struct.error, ValueError, TypeError, KeyError, IndexError, OverflowError)
+
+
+def _int_table_bytes(values: typ.Sequence[int], fmt: str = INDEX_FORMAT) -> bytes:
+    try:
+        return struct.pack(f'<{len(values)}{fmt}', *values)
+    except struct.error as e:
+        raise chex.UnsupportedGraphContent(f'Integer table value out of range; {e}')
+
+
+def _view_int_table(buffer: memoryview, fmt: str = INDEX_FORMAT) -> typ.Sequence[int]:
+    item_size = struct.calcsize(f'<{fmt}')
+    if len(buffer) % item_size:
+        raise chex.InvalidGraphFile(f'Integer table length is not a multiple of {item_size} bytes')
+
+    if sys.byteorder == 'little' and array.array(fmt).itemsize == item_size:
+        return buffer.cast(fmt)
+
+    # Platforms whose native layout differs cannot use the mapped bytes directly, and get a decoded copy instead.
+    return tuple(value for value, in struct.iter_unpack(f'<{fmt}', buffer))
+
+
+def _blob_table_sections(blobs: typ.Iterable[bytes]) -> typ.Tuple[bytes, bytes]:
+    """Concatenates variable length blobs, returning the data and a table of offsets with one extra entry."""
+    offsets = [0]
+    data = bytearray()
+    for blob in blobs:
+        data.extend(blob)
+        offsets.append(len(data))
+    return bytes(data), _int_table_bytes(offsets)
+
+
+def _id_table_sections(ids: typ.Sequence[typ.Hashable]) -> typ.Tuple[int, bytes, bytes]:
+    """Chooses the most compact way of storing a table of IDs, returning the kind, data and offsets."""
+    if all(type(i) is int for i in ids):
+        return ID_KIND_INT, _int_table_bytes(ids, INT_ID_FORMAT), b''
+    if all(isinstance(i, uuid.UUID) for i in ids):
+        return ID_KIND_UUID, b''.join(i.bytes for i in ids), b''
+    if all(type(i) is str for i in ids):
+        data, offsets = _blob_table_sections(i.encode('utf-8') for i in ids)
+        return ID_KIND_STR, data, offsets
+
+    raise chex.UnsupportedGraphContent('IDs must all be integers, all be UUIDs or all be strings')
+
+
+def _encode_token_id(token_id: ctpt.TokenId) -> typ.Any:
+    if type(token_id) is int:
+        return ['int', token_id]
+    if isinstance(token_id, uuid.UUID):
+        return ['uuid', str(token_id)]
+    if type(token_id) is str:
+        return ['str', token_id]
+
+    raise chex.UnsupportedGraphContent(f'Token IDs must be integers, UUIDs or strings; found = {token_id!r}')
+
+
+def _decode_token_id(encoded: typ.Any) -> ctpt.TokenId:
+    kind, value = encoded
+    if kind == 'int' and type(value) is int:
+        return value
+    if kind == 'uuid':
+        return uuid.UUID(value)
+    if kind == 'str' and type(value) is str:
+        return value
+
+    raise chex.InvalidGraphFile(f'Unknown token ID encoding = {encoded!r}')
+
+
+def _token_bytes(token: ctpt.Token) -> bytes:
+    keyword = None
+    if token.type_def is not None:
+        import cheffu.defs as chdf
+
+        # Token types are looked up by keyword when loading, so only the standard token types can be stored.
+        keyword = token.type_def.keyword
+        if chdf.TokenKeywordToDef.get(keyword) is not token.type_def:
+            raise chex.UnsupportedGraphContent(f'Token type is not a standard token type; keyword = {keyword}')
+
+    encoded = {'id': _encode_token_id(token.id), 'keyword': keyword, 'data': token.data}
+    try:
+        encoded_json = json.dumps(encoded, allow_nan=False, separators=(',', ':'))
+    except (TypeError, ValueError) as e:
+        raise chex.UnsupportedGraphContent(f'Token data is not JSON-compatible; {e}')
+
+    # Data that only survives JSON in a changed form, such as tuples, would not load back as the same token.
+    if json.loads(encoded_json)['data'] != token.data:
+        raise chex.UnsupportedGraphContent(f'Token data does not load back from JSON unchanged; data = {token.data!r}')
+
+    return encoded_json.encode('utf-8')
+
+
+def _decode_token(blob: memoryview) -> ctpt.Token:
+    try:
+        encoded = json.loads(bytes(blob).decode('utf-8'))
+        keyword = encoded['keyword']
+
+        type_def = None
+        if keyword is not None:
+            import cheffu.defs as chdf
+            type_def = chdf.TokenKeywordToDef[keyword]
+
+        return ctpt.Token(id=_decode_token_id(encoded['id']), type_def=type_def, data=encoded['data'])
+    except _DECODE_ERRORS as e:
+        raise chex.InvalidGraphFile(f'Invalid token; {e!r}')
+
+
+def _slot_filter_bytes(slot_filter: sf.SlotFilter) -> bytes:
+    return slot_filter.to_bytes(slot_filter.bit_length() // 8 + 1, 'little', signed=True)
+
+
+def dump_compact_graph(compact_graph: cpt.CompactGraph) -> bytes:
+    """Serializes a compact graph into the binary graph format."""
+    nodule_id_kind, nodule_id_data, nodule_id_offsets = _id_table_sections(compact_graph.nodule_ids)
+    edge_id_kind, edge_id_data, edge_id_offsets = _id_table_sections(compact_graph.edge_ids)
+
+    # Slot filters are interned separately from the stack commands that use them.
+    slot_filters: typ.MutableSequence[sf.SlotFilter] = []
+    slot_filter_index_map: typ.MutableMapping[sf.SlotFilter, int] = {}
+    stack_cmd_codes: typ.MutableSequence[int] = []
+
+    for stack_cmd in compact_graph.stack_cmds:
+        if stack_cmd is None:
+            stack_cmd_codes.extend((NO_OP_CODE, 0))
+            continue
+
+        slot_filter: sf.SlotFilter = stack_cmd.slot_filter
+        if slot_filter not in slot_filter_index_map:
+            slot_filter_index_map[slot_filter] = len(slot_filters)
+            slot_filters.append(slot_filter)
+
+        direction_code = PUSH_CODE if stack_cmd.direction == par.StackDirection.PUSH else POP_CODE
+        stack_cmd_codes.extend((direction_code, slot_filter_index_map[slot_filter]))
+
+    # Tokens are stored once each, and referred to by index.
+    unique_tokens: typ.MutableSequence[ctpt.Token] = []
+    token_index_map: typ.MutableMapping[ctpt.TokenId, int] = {}
+    token_refs: typ.MutableSequence[int] = []
+
+    for token in compact_graph.tokens:
+        if token.id not in token_index_map:
+            token_index_map[token.id] = len(unique_tokens)
+            unique_tokens.append(token)
+        token_refs.append(token_index_map[token.id])
+
+    slot_filter_data, slot_filter_offsets = _blob_table_sections(map(_slot_filter_bytes, slot_filters))
+    token_data, token_offsets = _blob_table_sections(map(_token_bytes, unique_tokens))
+
+    sections: typ.Sequence[typ.Tuple[bytes, bytes]] = (
+        (META, META_STRUCT.pack(compact_graph.start_nodule, compact_graph.close_nodule, nodule_id_kind, edge_id_kind)),
+        (NODULE_IDS, nodule_id_data),
+        (NODULE_ID_OFFSETS, nodule_id_offsets),
+        (EDGE_IDS, edge_id_data),
+        (EDGE_ID_OFFSETS, edge_id_offsets),
+        (OUT_EDGE_OFFSETS, _int_table_bytes(compact_graph.out_edge_offsets)),
+        (EDGE_SRC_NODULES, _int_table_bytes(compact_graph.edge_src_nodules)),
+        (EDGE_DST_NODULES, _int_table_bytes(compact_graph.edge_dst_nodules)),
+        (EDGE_START_CMDS, _int_table_bytes(compact_graph.edge_start_cmds)),
+        (EDGE_CLOSE_CMDS, _int_table_bytes(compact_graph.edge_close_cmds)),
+        (STACK_CMDS, _int_table_bytes(stack_cmd_codes)),
+        (SLOT_FILTERS, slot_filter_data),
+        (SLOT_FILTER_OFFSETS, slot_filter_offsets),
+        (EDGE_TOKEN_OFFSETS, _int_table_bytes(compact_graph.edge_token_offsets)),
+        (TOKEN_REFS, _int_table_bytes(token_refs)),
+        (TOKENS, token_data),
+        (TOKEN_OFFSETS, token_offsets),
+    )
+
+    def align(offset: int) -> int:
+        return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+    # Lay out the sections after the header and section table.
+    section_table = bytearray()
+    offset = align(HEADER_STRUCT.size + SECTION_STRUCT.size * len(sections))
+    for tag, section in sections:
+        section_table.extend(SECTION_STRUCT.pack(tag, offset, len(section)))
+        offset = align(offset + len(section))
+
+    out = bytearray(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, 0, len(sections)))
+    out.extend(section_table)
+    for _, section in sections:
+        out.extend(bytes(align(len(out)) - len(out)))
+        out.extend(section)
+
+    return bytes(out)
+
+
+def save_compact_graph(*
+                       , compact_graph: cpt.CompactGraph
+                       , path: str
+                       ):
+    """Writes a compact graph to a file in the binary graph format."""
+    data = dump_compact_graph(compact_graph)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    logger.debug('Saved graph with %d edges to %s, %d bytes', compact_graph.edge_count, path, len(data))
+
+
+class _LazySequence(collections.abc.Sequence):
+    """Read-only sequence whose items are decoded on first access, and optionally kept around afterwards."""
+    def __init__(self, length: int, decode_item: typ.Callable[[int], typ.Any], memoize: bool = True):
+        self._length = length
+        self._decode_item = decode_item
+        self._memo: typ.Optional[typ.MutableMapping[int, typ.Any]] = {} if memoize else None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(self._length)))
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+
+        if self._memo is None:
+            return self._decode_item(index)
+        if index not in self._memo:
+            self._memo[index] = self._decode_item(index)
+        return self._memo[index]
+
+    def __len__(self) -> int:
+        return self._length
+
+
+def _view_blob_table(data: memoryview
+                     , offsets: typ.Sequence[int]
+                     , decode_blob: typ.Callable[[memoryview], typ.Any]
+                     ) -> typ.Sequence:
+    if not offsets or offsets[0] != 0 or offsets[-1] != len(data):
+        raise chex.InvalidGraphFile('Blob offsets do not match blob data')
+
+    return _LazySequence(len(offsets) - 1, lambda i: decode_blob(data[offsets[i]:offsets[i + 1]]))
+
+
+def _decode_str_id(blob: memoryview) -> str:
+    try:
+        return bytes(blob).decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise chex.InvalidGraphFile(f'Invalid string ID; {e}')
+
+
+def _view_id_table(kind: int, data: memoryview, offsets: memoryview) -> typ.Sequence[typ.Hashable]:
+    if kind == ID_KIND_INT:
+        return _view_int_table(data, INT_ID_FORMAT)
+    if kind == ID_KIND_UUID:
+        if len(data) % UUID_SIZE:
+            raise chex.InvalidGraphFile(f'UUID table length is not a multiple of {UUID_SIZE} bytes')
+        return _LazySequence(len(data) // UUID_SIZE
+                             , lambda i: uuid.UUID(bytes=bytes(data[i * UUID_SIZE:(i + 1) * UUID_SIZE]))
+                             )
+    if kind == ID_KIND_STR:
+        return _view_blob_table(data, _view_int_table(offsets), _decode_str_id)
+
+    raise chex.InvalidGraphFile(f'Unknown ID kind = {kind}')
+
+
+def _check_table_length(name: str, table: typ.Sized, expected: int) -> None:
+    if len(table) != expected:
+        raise chex.InvalidGraphFile(f'Unexpected length of {name} table; expected = {expected}, found = {len(table)}')
+
+
+def load_compact_graph_from_buffer(buffer: typ.Union[bytes, mmap.mmap]) -> cpt.CompactGraph:
+    """Creates a compact graph backed by a buffer holding the binary graph format.
+    Tables are views over the buffer, and IDs and tokens are decoded when first accessed.
+    Raises InvalidGraphFile if the buffer is not a valid graph file, including when decoding a corrupt token later on.
+    """
+    try:
+        return _load_compact_graph_from_buffer(buffer)
+    except _DECODE_ERRORS as e:
+        raise chex.InvalidGraphFile(f'Corrupt graph file; {e!r}')
+
+
+def _load_compact_graph_from_buffer(buffer: typ.Union[bytes, mmap.mmap]) -> cpt.CompactGraph:
+    view = memoryview(buffer)
+
+    if len(view) < HEADER_STRUCT.size:
+        raise chex.InvalidGraphFile(f'File too short to contain a header, {len(view)} bytes')
+
+    magic, version, _, section_count = HEADER_STRUCT.unpack_from(view)
+    if magic != MAGIC:
+        raise chex.InvalidGraphFile(f'Unexpected file magic; expected = {MAGIC}, found = {magic}')
+    if version != FORMAT_VERSION:
+        raise chex.InvalidGraphFile(f'Unsupported format version; expected = {FORMAT_VERSION}, found = {version}')
+
+    sections_start = HEADER_STRUCT.size + section_count * SECTION_STRUCT.size
+    if sections_start > len(view):
+        raise chex.InvalidGraphFile(f'Section table of {section_count} section(s) extends past end of file')
+
+    sections: typ.MutableMapping[bytes, memoryview] = {}
+    for i in range(section_count):
+        tag, offset, length = SECTION_STRUCT.unpack_from(view, HEADER_STRUCT.size + i * SECTION_STRUCT.size)
+        if offset < sections_start or offset + length > len(view):
+            raise chex.InvalidGraphFile(f'Section {tag} lies outside of the section data; '
+                                        f'offset = {offset}, length = {length}')
+        if offset % SECTION_ALIGNMENT:
+            raise chex.InvalidGraphFile(f'Section {tag} is not aligned; offset = {offset}')
+        if tag in sections:
+            raise chex.InvalidGraphFile(f'Duplicate section {tag}')
+        sections[tag] = view[offset:offset + length]
+
+    def section(tag: bytes) -> memoryview:
+        if tag not in sections:
+            raise chex.InvalidGraphFile(f'Missing section {tag}')
+        return sections[tag]
+
+    meta = section(META)
+    if len(meta) != META_STRUCT.size:
+        raise chex.InvalidGraphFile(f'Unexpected length of META section; expected = {META_STRUCT.size}, '
+                                    f'found = {len(meta)}')
+    start_nodule, close_nodule, nodule_id_kind, edge_id_kind = META_STRUCT.unpack(meta)
+
+    nodule_ids = _view_id_table(nodule_id_kind, section(NODULE_IDS), section(NODULE_ID_OFFSETS))
+    edge_ids = _view_id_table(edge_id_kind, section(EDGE_IDS), section(EDGE_ID_OFFSETS))
+
+    # Table lengths are checked up front, so that only corrupt table contents can go unnoticed until used.
+    nodule_count = len(nodule_ids)
+    edge_count = len(edge_ids)
+    if not (start_nodule < nodule_count and close_nodule < nodule_count):
+        raise chex.InvalidGraphFile(f'Start or close nodule out of range; nodule count = {nodule_count}')
+
+    out_edge_offsets = _view_int_table(section(OUT_EDGE_OFFSETS))
+    _check_table_length('out edge offset', out_edge_offsets, nodule_count + 1)
+
+    edge_tables = {tag: _view_int_table(section(tag))
+                   for tag in (EDGE_SRC_NODULES, EDGE_DST_NODULES, EDGE_START_CMDS, EDGE_CLOSE_CMDS)
+                   }
+    for tag, table in edge_tables.items():
+        _check_table_length(tag.decode('ascii'), table, edge_count)
+
+    edge_token_offsets = _view_int_table(section(EDGE_TOKEN_OFFSETS))
+    _check_table_length('edge token offset', edge_token_offsets, edge_count + 1)
+
+    # The stack command table is small, and is used by most edges, so it is decoded up front.
+    slot_filters = _view_blob_table(section(SLOT_FILTERS)
+                                    , _view_int_table(section(SLOT_FILTER_OFFSETS))
+                                    , lambda blob: sf.SlotFilter(int.from_bytes(blob, 'little', signed=True))
+                                    )
+    stack_cmd_codes = _view_int_table(section(STACK_CMDS))
+    if len(stack_cmd_codes) % 2:
+        raise chex.InvalidGraphFile('Stack command table has an odd number of entries')
+
+    stack_cmds: typ.MutableSequence[par.StackCommand] = []
+    for direction_code, slot_filter_index in zip(stack_cmd_codes[::2], stack_cmd_codes[1::2]):
+        if direction_code == NO_OP_CODE:
+            stack_cmds.append(None)
+            continue
+
+        if direction_code not in (PUSH_CODE, POP_CODE):
+            raise chex.InvalidGraphFile(f'Unknown stack direction code = {direction_code}')
+
+        direction = par.StackDirection.PUSH if direction_code == PUSH_CODE else par.StackDirection.POP
+        stack_cmds.append(par.StackOperation(direction=direction, slot_filter=slot_filters[slot_filter_index]))
+
+    unique_tokens = _view_blob_table(section(TOKENS), _view_int_table(section(TOKEN_OFFSETS)), _decode_token)
+    token_refs = _view_int_table(section(TOKEN_REFS))
+    if edge_token_offsets[edge_count] != len(token_refs):
+        raise chex.InvalidGraphFile('Edge token offsets do not match token table')
+
+    def get_token(i: int) -> ctpt.Token:
+        try:
+            return unique_tokens[token_refs[i]]
+        except IndexError:
+            raise chex.InvalidGraphFile(f'Token reference out of range; reference = {token_refs[i]}')
+
+    return cpt.CompactGraph(nodule_ids=nodule_ids
+                            , edge_ids=edge_ids
+                            , start_nodule=start_nodule
+                            , close_nodule=close_nodule
+                            , out_edge_offsets=out_edge_offsets
+                            , edge_src_nodules=edge_tables[EDGE_SRC_NODULES]
+                            , edge_dst_nodules=edge_tables[EDGE_DST_NODULES]
+                            , edge_start_cmds=edge_tables[EDGE_START_CMDS]
+                            , edge_close_cmds=edge_tables[EDGE_CLOSE_CMDS]
+                            , stack_cmds=tuple(stack_cmds)
+                            , edge_token_offsets=edge_token_offsets
+                            , tokens=_LazySequence(len(token_refs), get_token, memoize=False)
+                            )
+
+
+def load_compact_graph(path: str) -> cpt.CompactGraph:
+    """Memory-maps a file in the binary graph format, and creates a compact graph backed by it.
+    The file is kept mapped for as long as the graph, or anything taken from its tables, is alive.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return load_compact_graph_from_buffer(buffer)
@@ -0,0 +1,135 @@
+"""Seeded generation of synthetic procedure paths, for measuring how graph building and walking scale.
+
+The same parameters and seed always give the same procedure path, including token IDs.
+"""
+
+import itertools
+import random
+import typing as typ
+
+import cheffu.ids as cids
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.types.tokens as ctpt
+
+
+class SyntheticPathParams(typ.NamedTuple):
+    # Number of tokens in the top-level procedure path, not counting those inside of alts.
+    token_count: int = 10
+
+    # Number of alt sequences in the top-level procedure path, interleaved with its tokens.
+    alt_sequence_count: int = 3
+
+    # Number of alts in each alt sequence.
+    alt_width: int = 2
+
+    # Number of levels of alt sequences. Each non-null alt above the deepest level contains one nested alt sequence.
+    # If zero, the procedure path only contains tokens.
+    nesting_depth: int = 1
+
+    # Number of tokens in each non-null alt, not counting those inside of nested alts.
+    alt_token_count: int = 1
+
+    # Chance of each alt being a null alt, which contains no items.
+    null_alt_ratio: float = 0.0
+
+    # Number of slots that alt slot filters are made from.
+    slot_count: int = 2
+
+    # Chance of each alt also allowing each slot assigned to one of its siblings.
+    # If zero, the alts of an alt sequence allow disjoint sets of slots, as long as there are enough slots.
+    slot_filter_overlap: float = 0.0
+
+
+def _check_params(params: SyntheticPathParams) -> None:
+    for field in ('token_count', 'alt_sequence_count', 'nesting_depth', 'alt_token_count'):
+        if getattr(params, field) < 0:
+            raise ValueError(f'Synthetic path parameter must not be negative; {field} = {getattr(params, field)}')
+
+    for field in ('alt_width', 'slot_count'):
+        if getattr(params, field) < 1:
+            raise ValueError(f'Synthetic path parameter must be positive; {field} = {getattr(params, field)}')
+
+    for field in ('null_alt_ratio', 'slot_filter_overlap'):
+        if not 0.0 <= getattr(params, field) <= 1.0:
+            raise ValueError(f'Synthetic path parameter must be between 0 and 1; {field} = {getattr(params, field)}')
+
+
+def generate_procedure_path(*
+                            , params: SyntheticPathParams = SyntheticPathParams()
+                            , seed: int = 0
+                            ) -> par.ProcedurePath:
+    """Generates a procedure path with the given shape, making random choices using the given seed.
+    The number of alts grows exponentially with the nesting depth, so deep paths should be kept narrow.
+    """
+    _check_params(params)
+
+    rng = random.Random(seed)
+
+    # Tokens are numbered in the order they are created, which also gives them reproducible IDs.
+    token_positions = itertools.count()
+
+    def make_token() -> ctpt.Token:
+        position = next(token_positions)
+        token_data = f'T{position}'
+        return ctpt.Token(id=cids.make_token_id(token_data=token_data, position=position)
+                          , type_def=None
+                          , data=token_data
+                          )
+
+    def make_slot_filters() -> typ.Sequence[sf.SlotFilter]:
+        # Deal out the slots between the alts, so that each alt gets at least one slot.
+        slots = list(range(params.slot_count))
+        rng.shuffle(slots)
+
+        assigned_slots = [set() for _ in range(params.alt_width)]
+        for i in range(max(params.slot_count, params.alt_width)):
+            assigned_slots[i % params.alt_width].add(slots[i % params.slot_count])
+
+        slot_filters = []
+        for own_slots in assigned_slots:
+            allowed_slots = set(own_slots)
+            for sibling_slots in assigned_slots:
+                if sibling_slots is not own_slots:
+                    allowed_slots.update(slot for slot in sorted(sibling_slots)
+                                         if rng.random() < params.slot_filter_overlap
+                                         )
+
+            slot_filters.append(sf.make_white_list(*sorted(allowed_slots)))
+
+        return slot_filters
+
+    def make_path(item_count: int, alt_sequence_count: int, depth: int) -> par.ProcedurePath:
+        # Choose where in the path the alt sequences go, then fill in the rest with tokens.
+        alt_sequence_indices = set(rng.sample(range(item_count + alt_sequence_count), alt_sequence_count))
+
+        return tuple(make_alt_sequence(depth) if i in alt_sequence_indices else make_token()
+                     for i in range(item_count + alt_sequence_count)
+                     )
+
+    def make_alt_sequence(depth: int) -> par.AltSequence:
+        alt_sequence = []
+        for slot_filter in make_slot_filters():
+            if rng.random() < params.null_alt_ratio:
+                alt_sequence.append(par.FilteredAlt(slot_filter=slot_filter))
+                continue
+
+            nested_alt_sequence_count = 1 if depth + 1 < params.nesting_depth else 0
+            items = make_path(params.alt_token_count, nested_alt_sequence_count, depth + 1)
+            alt_sequence.append(par.FilteredAlt(items=items, slot_filter=slot_filter))
+
+        return tuple(alt_sequence)
+
+    alt_sequence_count = params.alt_sequence_count if params.nesting_depth > 0 else 0
+    return make_path(params.token_count, alt_sequence_count, 0)
+
+
+def count_tokens(procedure_path: par.ProcedurePath) -> int:
+    """Counts all tokens in a procedure path, including those inside of alts."""
+    count = 0
+    for item in procedure_path:
+        if isinstance(item, ctpt.Token):
+            count += 1
+        else:
+            count += sum(count_tokens(alt.items) for alt in item)
+    return count
@@ -0,0 +1,155 @@
+"""Opt-in tracing of pipeline stages, exported as Chrome trace-event JSON.
+
+Traces can be opened in chrome://tracing or the Perfetto UI. Each span is recorded as a complete event with its
+attributes as event arguments, and spans opened inside other spans on the same thread show up nested beneath them.
+Tracing is disabled by default, in which case opening a span only costs a flag check.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import typing as typ
+
+# Environment variable holding the path of a file to write a trace to, used by scripts that support tracing.
+TRACE_FILE_ENV_VAR = 'CHEFFU_TRACE_FILE'
+
+# Category of all events recorded by Cheffu.
+TRACE_CATEGORY = 'cheffu'
+
+SpanArgs = typ.MutableMapping[str, typ.Any]
+
+
+class Span:
+    """A running span, recorded once it is finished. Can be used as a context manager, or finished explicitly."""
+    __slots__ = ('tracer', 'name', 'args', 'start_ns')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: SpanArgs):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start_ns = time.perf_counter_ns()
+
+    def set(self, **args) -> None:
+        """Adds or replaces attributes of this span."""
+        self.args.update(args)
+
+    def finish(self, **args) -> None:
+        self.args.update(args)
+        self.tracer.add_event(self, time.perf_counter_ns())
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.finish()
+        return False
+
+
+class _NullSpan:
+    """Stands in for a span when tracing is disabled, and does nothing."""
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        pass
+
+    def finish(self, **args) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+AnySpan = typ.Union[Span, _NullSpan]
+
+
+class Tracer:
+    """Records finished spans as trace events. Nothing is recorded unless the tracer is enabled."""
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.events: typ.MutableSequence[typ.Mapping[str, typ.Any]] = []
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, **args) -> AnySpan:
+        """Starts a span with the given attributes."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    def add_event(self, span: Span, end_ns: int) -> None:
+        # Timestamps and durations are in microseconds.
+        event = {'name': span.name
+                 , 'cat': TRACE_CATEGORY
+                 , 'ph': 'X'
+                 , 'ts': (span.start_ns - self._origin_ns) / 1000
+                 , 'dur': (end_ns - span.start_ns) / 1000
+                 , 'pid': os.getpid()
+                 , 'tid': threading.get_ident()
+                 , 'args': span.args
+                 }
+
+        with self._lock:
+            self.events.append(event)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events.clear()
+            self._origin_ns = time.perf_counter_ns()
+
+    def trace(self) -> typ.Mapping[str, typ.Any]:
+        """Returns all recorded events as a trace, in the JSON object format."""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_json(self, path: str) -> None:
+        # Attributes that are not JSON types, such as nodule IDs, are written as strings.
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f, default=str)
+
+
+# Tracer used by Cheffu itself.
+TRACER = Tracer()
+
+
+def enable() -> None:
+    TRACER.enabled = True
+
+
+def disable() -> None:
+    TRACER.enabled = False
+
+
+def span(name: str, **args) -> AnySpan:
+    if not TRACER.enabled:
+        return _NULL_SPAN
+    return Span(TRACER, name, args)
+
+
+@contextlib.contextmanager
+def recording(path: typ.Optional[str]) -> typ.Iterator[Tracer]:
+    """Traces everything done in its body, and writes the trace to a file at the end.
+    If no path is given, nothing is traced.
+    """
+    if path is None:
+        yield TRACER
+        return
+
+    was_enabled = TRACER.enabled
+    TRACER.reset()
+    enable()
+    try:
+        yield TRACER
+    finally:
+        TRACER.enabled = was_enabled
+        TRACER.write_json(path)
@@ -1,10 +1,9 @@
 """Type hints that are not specific to any module."""
 
 import typing as typ
-import uuid
 
-# Unique IDs for identifying graph components.
-UniqueId = typ.NewType('UniqueId', uuid.UUID)
+# Unique IDs for identifying graph components, such as UUIDs or integers.
+UniqueId = typ.NewType('UniqueId', typ.Hashable)
 
 # Callable that generates new unique IDs.
 UniqueIdGen = typ.Callable[[], UniqueId]
@@ -0,0 +1,257 @@
+"""Batch validation of stack command sequences using NumPy arrays.
+
+Sequences are encoded as two integer arrays with one row per sequence: one of stack directions, and one of interned
+slot filter IDs. Shorter sequences are padded with no-ops. Slot filters are stored as fixed-width two's complement
+words, wide enough that intersecting any of them can be done with bitwise array operations without losing any bits.
+
+Validation then steps through all sequences at once, one stack command at a time, and gives exactly the same results
+as cheffu.parallel.validate_stack_cmd_seq.
+"""
+
+import itertools
+import typing as typ
+
+import numpy as np
+
+import cheffu.exceptions as chex
+import cheffu.logging as clog
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.tracing as ctr
+
+logger = clog.get_logger(__name__)
+
+# Direction codes for encoded stack commands.
+NO_OP_CODE = 0
+PUSH_CODE = 1
+POP_CODE = -1
+
+# Number of bits in each word of an encoded slot filter.
+FILTER_WORD_BITS = 64
+FILTER_WORD_DTYPE = np.dtype('<u8')
+
+# Number of sequences validated together by validate_stack_cmd_seqs.
+DEFAULT_BATCH_SIZE = 4096
+
+ValidationResult = typ.Tuple[bool, typ.Optional[par.SlotFilterChoiceSequence]]
+
+
+class EncodedStackCommandSequences(typ.NamedTuple):
+    # Direction codes, with one row per sequence.
+    directions: np.ndarray
+
+    # Slot filter IDs, with one row per sequence. Entries for no-ops are zero, and should be ignored.
+    filter_ids: np.ndarray
+
+    # Interned slot filters, indexed by slot filter ID.
+    slot_filters: typ.Sequence[sf.SlotFilter]
+
+    # Slot filters as two's complement words, least significant word first, with one row per slot filter ID.
+    filter_words: np.ndarray
+
+    @property
+    def seq_count(self) -> int:
+        return self.directions.shape[0]
+
+
+def encode_slot_filters(slot_filters: typ.Sequence[sf.SlotFilter]) -> np.ndarray:
+    """Encodes slot filters as rows of two's complement words, all of the same width.
+    The width leaves room for a sign bit, so that the intersection of any of the encoded slot filters is block-all
+    exactly when its encoded words are all zero.
+    """
+    max_bit_length = max((slot_filter.bit_length() for slot_filter in slot_filters), default=0)
+    word_count = max_bit_length // FILTER_WORD_BITS + 1
+    byte_count = word_count * FILTER_WORD_DTYPE.itemsize
+
+    encoded = b''.join(slot_filter.to_bytes(byte_count, 'little', signed=True) for slot_filter in slot_filters)
+    return np.frombuffer(encoded, dtype=FILTER_WORD_DTYPE).reshape(len(slot_filters), word_count)
+
+
+def decode_slot_filter(filter_words: np.ndarray) -> sf.SlotFilter:
+    """Decodes a single row of two's complement words back into a slot filter."""
+    return sf.SlotFilter(int.from_bytes(filter_words.astype(FILTER_WORD_DTYPE).tobytes(), 'little', signed=True))
+
+
+def encode_stack_cmd_seqs(stack_cmd_seqs: typ.Iterable[par.StackCommandSequence]) -> EncodedStackCommandSequences:
+    """Encodes stack command sequences as arrays of direction codes and slot filter IDs."""
+    stack_cmd_seqs = tuple(tuple(stack_cmd_seq) for stack_cmd_seq in stack_cmd_seqs)
+    seq_len = max(map(len, stack_cmd_seqs), default=0)
+
+    directions = np.full((len(stack_cmd_seqs), seq_len), NO_OP_CODE, dtype=np.int8)
+    filter_ids = np.zeros((len(stack_cmd_seqs), seq_len), dtype=np.intp)
+
+    # Slot filters are interned, so that equal slot filters always get the same ID.
+    slot_filters: typ.MutableSequence[sf.SlotFilter] = []
+    filter_id_map: typ.MutableMapping[sf.SlotFilter, int] = {}
+
+    for i, stack_cmd_seq in enumerate(stack_cmd_seqs):
+        for j, stack_cmd in enumerate(stack_cmd_seq):
+            if stack_cmd is None:
+                continue
+
+            slot_filter: sf.SlotFilter = stack_cmd.slot_filter
+            if slot_filter not in filter_id_map:
+                filter_id_map[slot_filter] = len(slot_filters)
+                slot_filters.append(slot_filter)
+
+            directions[i, j] = PUSH_CODE if stack_cmd.direction == par.StackDirection.PUSH else POP_CODE
+            filter_ids[i, j] = filter_id_map[slot_filter]
+
+    return EncodedStackCommandSequences(directions=directions
+                                        , filter_ids=filter_ids
+                                        , slot_filters=tuple(slot_filters)
+                                        , filter_words=encode_slot_filters(slot_filters)
+                                        )
+
+
+def validate_encoded_stack_cmd_seqs(encoded: EncodedStackCommandSequences) -> typ.Sequence[ValidationResult]:
+    """Calculates if each of a batch of encoded stack command sequences is legal.
+    Returns a validity flag and slot choice sequence per sequence, as validate_stack_cmd_seq would, and raises the same
+    exceptions for illegal pops.
+    """
+    directions = encoded.directions
+    filter_ids = encoded.filter_ids
+    filter_words = encoded.filter_words
+
+    seq_count, seq_len = directions.shape
+    word_count = filter_words.shape[1]
+
+    # The stack can never be deeper than the number of pushes in a sequence.
+    max_depth = max(int((directions == PUSH_CODE).sum(axis=1).max(initial=0)), 1)
+    depth_range = np.arange(max_depth)
+
+    rows = np.arange(seq_count)
+    valid = np.ones(seq_count, dtype=bool)
+    depths = np.zeros(seq_count, dtype=np.intp)
+
+    # Per-sequence slot filter stacks, as slot filter IDs.
+    stacks = np.zeros((seq_count, max_depth), dtype=np.intp)
+
+    # Per-sequence and per-depth running intersections, along with whether a scope is open at that depth.
+    caches = np.zeros((seq_count, max_depth, word_count), dtype=FILTER_WORD_DTYPE)
+    open_scopes = np.zeros((seq_count, max_depth), dtype=bool)
+
+    # Scopes are only added to the choice sequence once they are closed, which is when their cache is deleted.
+    # Scopes at the same depth are closed in the order that they were opened.
+    closed_rows: typ.MutableSequence[np.ndarray] = []
+    closed_depths: typ.MutableSequence[np.ndarray] = []
+    closed_steps: typ.MutableSequence[np.ndarray] = []
+    closed_words: typ.MutableSequence[np.ndarray] = []
+
+    def close_scopes(step: int, scope_rows: np.ndarray, closing: np.ndarray):
+        closing_rows, closing_depths = np.nonzero(closing)
+        closing_rows = scope_rows[closing_rows]
+
+        closed_rows.append(closing_rows)
+        closed_depths.append(closing_depths)
+        closed_steps.append(np.full(len(closing_rows), step, dtype=np.intp))
+        closed_words.append(caches[closing_rows, closing_depths])
+
+        open_scopes[closing_rows, closing_depths] = False
+
+    for step in range(seq_len):
+        step_directions = directions[:, step]
+        step_filter_ids = filter_ids[:, step]
+
+        is_push = valid & (step_directions == PUSH_CODE)
+        if is_push.any():
+            push_rows = rows[is_push]
+            push_depths = depths[is_push]
+            push_filter_ids = step_filter_ids[is_push]
+
+            stacks[push_rows, push_depths] = push_filter_ids
+
+            # A new scope starts out with the first slot filter pushed at its depth.
+            is_new = ~open_scopes[push_rows, push_depths]
+            caches[push_rows[is_new], push_depths[is_new]] = filter_words[push_filter_ids[is_new]]
+            open_scopes[push_rows, push_depths] = True
+
+            # Test the pushed slot filters against the cached slot filters for their depths.
+            intersects = caches[push_rows, push_depths] & filter_words[push_filter_ids]
+            caches[push_rows, push_depths] = intersects
+            valid[push_rows[~intersects.any(axis=1)]] = False
+
+            depths[push_rows] = push_depths + 1
+
+        is_pop = valid & (step_directions == POP_CODE)
+        if is_pop.any():
+            pop_rows = rows[is_pop]
+            pop_depths = depths[is_pop]
+            pop_filter_ids = step_filter_ids[is_pop]
+
+            is_empty = pop_depths == 0
+            if is_empty.any():
+                expected = encoded.slot_filters[pop_filter_ids[is_empty][0]]
+                raise chex.SlotFilterStackEmpty(f'Slot filter stack empty; expected = {expected}')
+
+            popped_filter_ids = stacks[pop_rows, pop_depths - 1]
+            is_mismatch = popped_filter_ids != pop_filter_ids
+            if is_mismatch.any():
+                expected = encoded.slot_filters[pop_filter_ids[is_mismatch][0]]
+                popped = encoded.slot_filters[popped_filter_ids[is_mismatch][0]]
+                raise chex.SlotFilterStackResultMismatch(f'Unexpected value popped from slot filter stack; '
+                                                         f'expected = {expected}, found = {popped}')
+
+            next_depths = pop_depths - 1
+            depths[pop_rows] = next_depths
+
+            # Delete caches deeper than the new path depth.
+            close_scopes(step, pop_rows, open_scopes[pop_rows] & (depth_range > next_depths[:, np.newaxis]))
+
+    # If a sequence is valid, it should once again be left with an empty stack.
+    valid &= depths == 0
+
+    # Any scopes still open are closed at the end of their sequence.
+    close_scopes(seq_len, rows[valid], open_scopes[valid])
+
+    closed_rows = np.concatenate(closed_rows)
+    closed_depths = np.concatenate(closed_depths)
+    closed_steps = np.concatenate(closed_steps)
+    closed_words = np.concatenate(closed_words)
+
+    is_kept = valid[closed_rows]
+    closed_rows = closed_rows[is_kept]
+    closed_depths = closed_depths[is_kept]
+    closed_words = closed_words[is_kept]
+
+    # Sort closed scopes by sequence, then by depth, then by when they were closed.
+    order = np.lexsort((closed_steps[is_kept], closed_depths, closed_rows))
+
+    choice_seqs: typ.MutableMapping[int, par.SlotFilterChoiceSequence] = {}
+    grouped = itertools.groupby(order, key=lambda i: closed_rows[i])
+    for row, row_order in grouped:
+        row_order = tuple(row_order)
+        choice_seqs[int(row)] = tuple(
+            tuple(decode_slot_filter(closed_words[i]) for i in depth_order)
+            for _, depth_order in itertools.groupby(row_order, key=lambda i: closed_depths[i])
+        )
+
+    logger.debug('Validated %d stack command sequences, %s of which are legal'
+                 , seq_count, clog.lazy(lambda: int(valid.sum())))
+
+    return tuple((True, choice_seqs.get(row, ())) if is_valid else (False, None)
+                 for row, is_valid in enumerate(valid.tolist())
+                 )
+
+
+def validate_stack_cmd_seqs(*
+                            , stack_cmd_seqs: typ.Iterable[par.StackCommandSequence]
+                            , batch_size: int = DEFAULT_BATCH_SIZE
+                            ) -> typ.Sequence[ValidationResult]:
+    """Calculates if each of many stack command sequences is legal, encoding and validating them in batches.
+    Gives the same results as calling validate_stack_cmd_seq on each sequence.
+    """
+    span = ctr.span('validate_stack_cmd_seqs', batch_size=batch_size)
+    results: typ.MutableSequence[ValidationResult] = []
+
+    stack_cmd_seq_iter = iter(stack_cmd_seqs)
+    while True:
+        batch = tuple(itertools.islice(stack_cmd_seq_iter, batch_size))
+        if not batch:
+            break
+
+        results.extend(validate_encoded_stack_cmd_seqs(encode_stack_cmd_seqs(batch)))
+
+    span.finish(seq_count=len(results), valid_count=sum(1 for is_valid, _ in results if is_valid))
+
+    return tuple(results)
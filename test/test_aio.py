@@ -0,0 +1,120 @@
+import asyncio
+import concurrent.futures as cf
+import unittest
+
+import cheffu.aio as caio
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+import cheffu.slot_filter as sf
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+    async def test_yield_pruned_valid_hop_seqs(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            expected = tuple(par.yield_pruned_valid_hop_seqs(**kwargs))
+
+            self.assertEqual(tuple(par.yield_valid_hop_seqs(**kwargs))
+                             , tuple([x async for x in caio.yield_valid_hop_seqs(hops_per_yield=3, **kwargs)])
+                             )
+            self.assertEqual(expected
+                             , tuple([x async for x in caio.yield_pruned_valid_hop_seqs(hops_per_yield=3, **kwargs)])
+                             )
+
+            with cf.ThreadPoolExecutor(max_workers=1) as executor:
+                actual = tuple([x async for x in caio.yield_pruned_valid_hop_seqs_in_executor(executor=executor
+                                                                                              , chunk_size=5
+                                                                                              , **kwargs
+                                                                                              )])
+                self.assertEqual(expected, actual)
+
+                _, _, choice_seq = expected[-1]
+                self.assertEqual(par.resolve_walk_from_choice_seq(choice_seq=choice_seq, **kwargs)
+                                 , await caio.resolve_walk_from_choice_seq(choice_seq=choice_seq
+                                                                           , executor=executor
+                                                                           , **kwargs
+                                                                           )
+                                 )
+                self.assertEqual(expected[-1], await caio.get_valid_hop_seq(index=len(expected) - 1, **kwargs))
+
+    async def test_yield_during_invalid_walks(self):
+        # Sequential alt sequences with disjoint alts only allow the walks taking the same side every time.
+        l_sf = sf.make_white_list(0)
+        r_sf = sf.invert(l_sf)
+        alt_seq_count = 12
+        token_path = tuple((par.FilteredAlt(items=(stp.token(f'L{i}'),), slot_filter=l_sf),
+                            par.FilteredAlt(items=(stp.token(f'R{i}'),), slot_filter=r_sf),
+                            )
+                           for i in range(alt_seq_count)
+                           )
+
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                      , edge_lookup_map=edge_lookup_map
+                      , start_nodule=start_nodule
+                      , close_nodule=close_nodule
+                      )
+
+        tick_count = 0
+        stopped = False
+
+        async def tick():
+            nonlocal tick_count
+            while not stopped:
+                tick_count += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        try:
+            # Let the ticker start running.
+            await asyncio.sleep(0)
+
+            # The first and last of all walks are the only valid ones, so the ticker has to run in between.
+            # The filter-after enumerator tries every hop of every walk, while the pruning one tries far fewer.
+            for enumerator, hops_per_yield in ((caio.yield_valid_hop_seqs, 100)
+                                               , (caio.yield_pruned_valid_hop_seqs, 2)
+                                               ):
+                ticks_at_walks = [tick_count async for _ in enumerator(hops_per_yield=hops_per_yield, **kwargs)]
+                self.assertEqual(2, len(ticks_at_walks))
+                self.assertGreater(ticks_at_walks[1], ticks_at_walks[0])
+        finally:
+            stopped = True
+            await ticker
+
+    async def test_cancel_enumeration(self):
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+            procedure_path=stp.SAMPLE_TOKEN_PATHS['kitchen_sink']
+        )
+        kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                      , edge_lookup_map=edge_lookup_map
+                      , start_nodule=start_nodule
+                      , close_nodule=close_nodule
+                      )
+
+        # Closing a generator early should stop its enumeration.
+        walks = caio.yield_pruned_valid_hop_seqs_in_executor(chunk_size=2, **kwargs)
+        self.assertIsNotNone(await walks.__anext__())
+        await walks.aclose()
+
+        # Cancelling a consumer should not keep the event loop from serving other consumers.
+        consumed = []
+
+        async def consume():
+            async for walk in caio.yield_pruned_valid_hop_seqs(hops_per_yield=1, **kwargs):
+                consumed.append(walk)
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(consume())
+        while len(consumed) < 3:
+            await asyncio.sleep(0)
+        task.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertLess(len(consumed), par.count_valid_walks(**kwargs))
@@ -0,0 +1,78 @@
+import unittest
+
+import cheffu.compact as cpt
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+
+
+class TestCompact(unittest.TestCase):
+    def test_expand_compact_graph(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            compact_graph = cpt.make_compact_graph(nodule_out_edge_map=nodule_out_edge_map
+                                                   , edge_lookup_map=edge_lookup_map
+                                                   , start_nodule=start_nodule
+                                                   , close_nodule=close_nodule
+                                                   )
+
+            self.assertEqual(len(nodule_out_edge_map), compact_graph.nodule_count)
+            self.assertEqual(len(edge_lookup_map), compact_graph.edge_count)
+
+            (actual_nodule_out_edge_map, actual_edge_lookup_map,
+             actual_start_nodule, actual_close_nodule) = cpt.expand_compact_graph(compact_graph)
+
+            self.assertEqual(start_nodule, actual_start_nodule)
+            self.assertEqual(close_nodule, actual_close_nodule)
+
+            self.assertEqual(set(nodule_out_edge_map), set(actual_nodule_out_edge_map))
+            for nodule, out_edge_ids in nodule_out_edge_map.items():
+                # Out edge order should be preserved.
+                self.assertEqual(tuple(out_edge_ids), tuple(actual_nodule_out_edge_map[nodule]))
+
+            self.assertEqual(set(edge_lookup_map), set(actual_edge_lookup_map))
+            for edge_id, edge_def in edge_lookup_map.items():
+                actual_edge_def = actual_edge_lookup_map[edge_id]
+                self.assertEqual(edge_def._replace(token_seq=tuple(edge_def.token_seq)), actual_edge_def)
+
+    def test_view_compact_graph(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            compact_graph = cpt.make_compact_graph(nodule_out_edge_map=nodule_out_edge_map
+                                                   , edge_lookup_map=edge_lookup_map
+                                                   , start_nodule=start_nodule
+                                                   , close_nodule=close_nodule
+                                                   )
+
+            expected = tuple(
+                (tuple(hop.edge_id for hop in graph_hop_seq), choice_seq)
+                for graph_hop_seq, _, choice_seq in par.yield_pruned_valid_hop_seqs(
+                    nodule_out_edge_map=nodule_out_edge_map
+                    , edge_lookup_map=edge_lookup_map
+                    , start_nodule=start_nodule
+                    , close_nodule=close_nodule
+                )
+            )
+
+            (view_nodule_out_edge_map, view_edge_lookup_map,
+             view_start_nodule, view_close_nodule) = cpt.view_compact_graph(compact_graph)
+
+            actual = tuple(
+                (tuple(compact_graph.edge_ids[hop.edge_id] for hop in graph_hop_seq), choice_seq)
+                for graph_hop_seq, _, choice_seq in par.yield_pruned_valid_hop_seqs(
+                    nodule_out_edge_map=view_nodule_out_edge_map
+                    , edge_lookup_map=view_edge_lookup_map
+                    , start_nodule=view_start_nodule
+                    , close_nodule=view_close_nodule
+                )
+            )
+
+            self.assertEqual(expected, actual)
+            self.assertEqual(len(expected), par.count_valid_walks(nodule_out_edge_map=view_nodule_out_edge_map
+                                                                  , edge_lookup_map=view_edge_lookup_map
+                                                                  , start_nodule=view_start_nodule
+                                                                  , close_nodule=view_close_nodule
+                                                                  ))
+
+
+if __name__ == '__main__':
+    unittest.main()
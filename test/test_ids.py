@@ -0,0 +1,46 @@
+import unittest
+
+import cheffu.ids as cids
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+
+
+class TestIds(unittest.TestCase):
+    def test_make_counter_id_gen(self):
+        id_gen = cids.make_counter_id_gen()
+        self.assertEqual([0, 1, 2], [id_gen() for _ in range(3)])
+
+        id_gen = cids.make_counter_id_gen(start=10)
+        self.assertEqual([10, 11, 12], [id_gen() for _ in range(3)])
+
+    def test_make_seeded_id_gen(self):
+        id_gen_a = cids.make_seeded_id_gen('a')
+        id_gen_b = cids.make_seeded_id_gen('a')
+        id_gen_c = cids.make_seeded_id_gen('c')
+
+        ids_a = [id_gen_a() for _ in range(100)]
+        ids_b = [id_gen_b() for _ in range(100)]
+        ids_c = [id_gen_c() for _ in range(100)]
+
+        self.assertEqual(ids_a, ids_b)
+        self.assertEqual(100, len(set(ids_a)))
+        self.assertFalse(set(ids_a) & set(ids_c))
+
+    def test_make_token_id(self):
+        self.assertEqual(cids.make_token_id(token_data='A', position=0), cids.make_token_id(token_data='A', position=0))
+        self.assertNotEqual(cids.make_token_id(token_data='A', position=0), cids.make_token_id(token_data='A', position=1))
+        self.assertNotEqual(cids.make_token_id(token_data='A', position=0), cids.make_token_id(token_data='B', position=0))
+
+    def test_process_is_reproducible(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map_a, edge_lookup_map_a, *nodules_a = par.process(procedure_path=token_path)
+            nodule_out_edge_map_b, edge_lookup_map_b, *nodules_b = par.process(procedure_path=token_path)
+
+            self.assertEqual(nodules_a, nodules_b)
+            self.assertEqual(edge_lookup_map_a, edge_lookup_map_b)
+            self.assertEqual({k: tuple(v) for k, v in nodule_out_edge_map_a.items()},
+                             {k: tuple(v) for k, v in nodule_out_edge_map_b.items()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import logging
+import os
+import unittest
+import unittest.mock
+
+import cheffu.logging as clog
+
+
+class TestLogging(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        clog.configure(level=logging.INFO, stream=self.stream)
+        self.logger = clog.get_logger('cheffu.test')
+
+    def tearDown(self):
+        clog.configure()
+
+    def test_resolve_level(self):
+        self.assertEqual(logging.DEBUG, clog.resolve_level('debug'))
+        self.assertEqual(logging.ERROR, clog.resolve_level(logging.ERROR))
+        self.assertEqual(15, clog.resolve_level('15'))
+        self.assertRaises(ValueError, clog.resolve_level, 'LOUD')
+
+        with unittest.mock.patch.dict(os.environ, {clog.LOG_LEVEL_ENV_VAR: 'error'}):
+            self.assertEqual(logging.ERROR, clog.resolve_level())
+        with unittest.mock.patch.dict(os.environ, {clog.LOG_LEVEL_ENV_VAR: ''}):
+            self.assertEqual(clog.DEFAULT_LOG_LEVEL, clog.resolve_level())
+
+    def test_shared_handler(self):
+        root_logger = logging.getLogger(clog.ROOT_LOGGER_NAME)
+        handler_count = len(root_logger.handlers)
+
+        # Getting loggers does not add any handlers, and all of them end up under the root Cheffu logger.
+        other_logger = clog.get_logger('some_script')
+        clog.get_logger('cheffu.test')
+        self.assertEqual('cheffu.some_script', other_logger.name)
+        self.assertEqual(handler_count, len(root_logger.handlers))
+        self.assertFalse(self.logger.handlers)
+
+        self.logger.info('Hello, %s', 'world')
+        self.logger.debug('Not shown')
+        other_logger.warning('Shown once')
+
+        output = self.stream.getvalue()
+        self.assertIn('cheffu.test - INFO - Hello, world', output)
+        self.assertNotIn('Not shown', output)
+        self.assertEqual(1, output.count('Shown once'))
+
+    def test_lazy(self):
+        calls = []
+
+        def expensive(value):
+            calls.append(value)
+            return value * 2
+
+        self.logger.debug('Value = %s', clog.lazy(expensive, 1))
+        self.logger.debug(clog.lazy(expensive, 2))
+        self.assertEqual([], calls)
+
+        self.logger.info('Value = %s', clog.lazy(expensive, 3))
+        self.logger.info(clog.lazy(expensive, 4))
+        self.assertEqual([3, 4], calls)
+        self.assertIn('Value = 6', self.stream.getvalue())
+
+    def test_ring_buffer(self):
+        ring_buffer = clog.add_ring_buffer(capacity=2, fmt='%(levelname)s %(message)s')
+        try:
+            for i in range(3):
+                self.logger.info('Message %d', i)
+            self.logger.debug('Not kept')
+        finally:
+            clog.remove_ring_buffer(ring_buffer)
+
+        self.logger.info('Not kept either')
+
+        self.assertEqual(('INFO Message 1', 'INFO Message 2'), ring_buffer.messages())
+
+        ring_buffer.clear()
+        self.assertEqual((), ring_buffer.messages())
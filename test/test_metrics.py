@@ -0,0 +1,92 @@
+import json
+import math
+import os
+import tempfile
+import unittest
+
+import cheffu.metrics as cmet
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        cmet.REGISTRY.reset()
+
+    def tearDown(self):
+        cmet.disable()
+        cmet.REGISTRY.reset()
+
+    def test_disabled(self):
+        par.process(procedure_path=stp.SAMPLE_TOKEN_PATHS['kitchen_sink'])
+        cmet.increment('events')
+        cmet.observe('latency_seconds', 1.0)
+        with cmet.time_stage('stage'):
+            pass
+
+        self.assertEqual({'counters': {}, 'histograms': {}}, cmet.REGISTRY.snapshot())
+
+    def test_hot_path_metrics(self):
+        cmet.enable()
+
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+            procedure_path=stp.SAMPLE_TOKEN_PATHS['kitchen_sink']
+        )
+        kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                      , edge_lookup_map=edge_lookup_map
+                      , start_nodule=start_nodule
+                      , close_nodule=close_nodule
+                      )
+
+        counters = cmet.REGISTRY.counters
+        self.assertEqual(len(edge_lookup_map), counters[cmet.EDGES_CREATED])
+        self.assertEqual(len(nodule_out_edge_map), counters[cmet.NODULES_CREATED])
+        self.assertEqual(1, cmet.REGISTRY.histograms['process_seconds'].count)
+
+        # The filter-after enumerator never prunes, but fails validation on some walks.
+        walk_count = sum(1 for _ in par.yield_valid_hop_seqs(**kwargs))
+        hops_visited = counters[cmet.HOPS_VISITED]
+        self.assertGreater(hops_visited, 0)
+        self.assertEqual(0, counters[cmet.WALKS_PRUNED])
+        self.assertGreater(counters[cmet.VALIDATION_FAILURES], 0)
+
+        # The pruning enumerator visits fewer hops.
+        self.assertEqual(walk_count, sum(1 for _ in par.yield_pruned_valid_hop_seqs(**kwargs)))
+        self.assertLess(counters[cmet.HOPS_VISITED] - hops_visited, hops_visited)
+        self.assertGreater(counters[cmet.WALKS_PRUNED], 0)
+
+        # Counts should still be recorded if enumeration is stopped early.
+        hops_visited = counters[cmet.HOPS_VISITED]
+        walks = iter(par.yield_pruned_valid_hop_seqs(**kwargs))
+        next(walks)
+        walks.close()
+        self.assertGreater(counters[cmet.HOPS_VISITED], hops_visited)
+
+    def test_export(self):
+        registry = cmet.MetricsRegistry(enabled=True)
+        registry.increment('events', 3)
+        for value in (0.00005, 0.002, 20.0):
+            registry.observe('latency_seconds', value)
+
+        histogram = registry.histograms['latency_seconds']
+        self.assertEqual(3, histogram.count)
+        self.assertEqual(3, histogram.cumulative_counts()[-1])
+        self.assertEqual(1, histogram.cumulative_counts()[0])
+        self.assertEqual(math.inf, histogram.buckets[-1])
+
+        text = registry.prometheus_text()
+        self.assertIn('cheffu_events_total 3\n', text)
+        self.assertIn('cheffu_latency_seconds_bucket{le="0.005"} 2\n', text)
+        self.assertIn('cheffu_latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('cheffu_latency_seconds_count 3\n', text)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'metrics.json')
+            registry.write_json(json_path)
+            with open(json_path) as f:
+                self.assertEqual(registry.snapshot(), json.load(f))
+
+            prometheus_path = os.path.join(tmp_dir, 'metrics.prom')
+            registry.write_prometheus(prometheus_path)
+            with open(prometheus_path) as f:
+                self.assertEqual(text, f.read())
@@ -1,12 +1,19 @@
 import unittest
+import unittest.mock
 import typing as typ
 import itertools
 import functools as ft
+import collections
+import uuid
+import time
 
+import cheffu.compact as cpt
 import cheffu.parallel as par
 import cheffu.slot_filter as sf
 import cheffu.exceptions as chex
 import cheffu.helpers as chlp
+import cheffu.sample_token_paths as stp
+import cheffu.types.tokens as ctpt
 
 
 def yield_valid_stack_cmd_seqs(length: int) -> typ.Iterable[par.StackCommandSequence]:
@@ -425,6 +432,31 @@ class TestParallel(unittest.TestCase):
         itertools.chain.from_iterable(yield_valid_stack_cmd_seqs(i) for i in range(6))
     )
 
+    def test_normalize_alt_sequence(self):
+        # Copies of the same branch under different slot filters should be coalesced into one alt.
+        alt_sequence = (
+            par.FilteredAlt(items=(stp.token('A'), stp.token('B')), slot_filter=sf.make_white_list(0)),
+            par.FilteredAlt(items=(stp.token('C'),), slot_filter=sf.make_white_list(1)),
+            par.FilteredAlt(items=(stp.token('A'), stp.token('B')), slot_filter=sf.make_white_list(2)),
+            par.FilteredAlt(slot_filter=sf.make_white_list(3)),
+            par.FilteredAlt(items=(stp.token('C'),), slot_filter=sf.BLOCK_ALL),
+        )
+
+        normalized = par.normalize_alt_sequence(alt_sequence)
+
+        self.assertEqual(3, len(normalized))
+        self.assertEqual(alt_sequence[0].items, normalized[0].items)
+        self.assertEqual(sf.make_white_list(0, 2), normalized[0].slot_filter)
+        self.assertEqual(alt_sequence[1], normalized[1])
+        self.assertEqual(par.FilteredAlt(slot_filter=sf.make_black_list(0, 1, 2)), normalized[2])
+
+        # Only the token IDs of the first copy survive coalescing.
+        self.assertEqual(tuple(t.id for t in alt_sequence[0].items), tuple(t.id for t in normalized[0].items))
+        self.assertTrue({t.id for t in alt_sequence[2].items}.isdisjoint(t.id for t in normalized[0].items))
+
+        # Normalizing is memoized, and should give the same result for the same content.
+        self.assertIs(normalized, par.normalize_alt_sequence(list(alt_sequence)))
+
     def test_process_stack(self):
         for v_stack, v_stack_cmd in itertools.product(self.VALID_STACKS, self.VALID_STACK_COMMANDS):
             # By default, use an empty context manager for later.
@@ -458,10 +490,643 @@ class TestParallel(unittest.TestCase):
                 actual_stack = par.process_stack(stack=v_stack, stack_cmd=v_stack_cmd)
                 self.assertEqual(expected_stack, actual_stack)
 
+    def test_process_persistent_stack(self):
+        for v_stack, v_stack_cmd in itertools.product(self.VALID_STACKS, self.VALID_STACK_COMMANDS):
+            persistent_stack = chlp.PersistentStack.from_iterable(v_stack)
+
+            try:
+                expected_stack = par.process_stack(stack=v_stack, stack_cmd=v_stack_cmd)
+            except chex.SlotFilterStackException as e:
+                with self.assertRaises(type(e)):
+                    par.process_stack(stack=persistent_stack, stack_cmd=v_stack_cmd)
+                continue
+
+            actual_stack = par.process_stack(stack=persistent_stack, stack_cmd=v_stack_cmd)
+            self.assertIsInstance(actual_stack, chlp.PersistentStack)
+            self.assertEqual(expected_stack, tuple(actual_stack))
+
+            # Equal stacks built separately should be equal and hash the same.
+            rebuilt_stack = chlp.PersistentStack.from_iterable(expected_stack)
+            self.assertEqual(rebuilt_stack, actual_stack)
+            self.assertEqual(hash(rebuilt_stack), hash(actual_stack))
+
     def test_validate_stack_cmd_seq_a(self):
         for stack_cmd_seq in self.VALID_STACK_CMD_SEQS:
             is_valid, _ = par.validate_stack_cmd_seq(stack_cmd_seq=stack_cmd_seq)
             self.assertTrue(is_valid)
 
+    def test_yield_pruned_valid_hop_seqs(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            expected = tuple(par.yield_valid_hop_seqs(**kwargs))
+            actual = tuple(par.yield_pruned_valid_hop_seqs(**kwargs))
+            self.assertEqual(expected, actual)
+
+    def test_yield_hop_seqs_long_recipe(self):
+        # Enough hops to exceed the default recursion limit many times over.
+        alt_seq_count = 10000
+        token_path = tuple((par.FilteredAlt(items=(stp.token(str(i)),)),) for i in range(alt_seq_count))
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                      , edge_lookup_map=edge_lookup_map
+                      , start_nodule=start_nodule
+                      , close_nodule=close_nodule
+                      )
+
+        (graph_hop_seq, _), = par.yield_all_hop_seqs(**kwargs)
+        self.assertEqual(2 * alt_seq_count + 1, len(graph_hop_seq))
+
+        (graph_hop_seq, _, choice_seq), = par.yield_pruned_valid_hop_seqs(**kwargs)
+        self.assertEqual(2 * alt_seq_count + 1, len(graph_hop_seq))
+        self.assertEqual(((sf.ALLOW_ALL,),), choice_seq)
+
+    def test_count_valid_walks(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            expected = sum(1 for _ in par.yield_valid_hop_seqs(**kwargs))
+            actual = par.count_valid_walks(**kwargs)
+            self.assertEqual(expected, actual)
+
+        # Independent alt sequences multiply the number of walks, far beyond what could be enumerated.
+        alt_seq_count = 100
+        token_path = tuple(
+            (par.FilteredAlt(items=(stp.token(f'{i}'),)), par.FilteredAlt(items=(stp.token(f'{i}~'),)),)
+            for i in range(alt_seq_count)
+        )
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        actual = par.count_valid_walks(nodule_out_edge_map=nodule_out_edge_map
+                                       , edge_lookup_map=edge_lookup_map
+                                       , start_nodule=start_nodule
+                                       , close_nodule=close_nodule
+                                       )
+        self.assertEqual(2 ** alt_seq_count, actual)
+
+    def test_valid_walk_cursors(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            expected = tuple(par.yield_pruned_valid_hop_seqs(**kwargs))
+            cursor_results = tuple(par.yield_valid_hop_seqs_from_cursor(**kwargs))
+            self.assertEqual(expected, tuple(r[1:] for r in cursor_results))
+
+            # The same walk count table can be reused for every lookup.
+            walk_count_table = par.make_walk_count_table(**kwargs)
+            self.assertEqual(len(expected), walk_count_table.walk_count)
+
+            for index, (cursor, *hop_seqs) in enumerate(cursor_results):
+                self.assertEqual(cursor, par.find_valid_walk_cursor(index=index, **kwargs))
+                self.assertEqual(cursor, par.find_valid_walk_cursor(index=index
+                                                                    , walk_count_table=walk_count_table
+                                                                    , **kwargs
+                                                                    ))
+                self.assertEqual(expected[index], par.get_valid_hop_seq(index=index, **kwargs))
+                self.assertEqual(expected[index], par.get_valid_hop_seq(index=index
+                                                                        , walk_count_table=walk_count_table
+                                                                        , **kwargs
+                                                                        ))
+
+                resumed = tuple(r[1:] for r in par.yield_valid_hop_seqs_from_cursor(cursor=cursor, **kwargs))
+                self.assertEqual(expected[index:], resumed)
+
+            with self.assertRaises(IndexError):
+                par.find_valid_walk_cursor(index=len(expected), **kwargs)
+
+    def test_valid_walk_order_is_deterministic(self):
+        def walk_token_data(token_path):
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            return tuple(
+                tuple(t.data for hop in graph_hop_seq for t in edge_lookup_map[hop.edge_id].token_seq)
+                for graph_hop_seq, _, _ in par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                           , edge_lookup_map=edge_lookup_map
+                                                                           , start_nodule=start_nodule
+                                                                           , close_nodule=close_nodule
+                                                                           )
+            )
+
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            self.assertEqual(walk_token_data(token_path), walk_token_data(token_path))
+
+    def test_resolve_walk(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            # Each choice sequence should resolve to the first enumerated walk with that choice sequence.
+            expected_map = {}
+            for graph_hop_seq, _, choice_seq in par.yield_pruned_valid_hop_seqs(**kwargs):
+                expected_map.setdefault(choice_seq, graph_hop_seq)
+
+            for choice_seq, expected_graph_hop_seq in expected_map.items():
+                graph_walk, token_seq = par.resolve_walk_from_choice_seq(choice_seq=choice_seq, **kwargs)
+                self.assertEqual(expected_graph_hop_seq, graph_walk.hop_seq)
+                self.assertEqual(tuple(par.yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                                        , edge_lookup_map=edge_lookup_map
+                                                                        , graph_walk=graph_walk
+                                                                        )), token_seq)
+
+            # Every chosen alt of a walk resolved from a slot selection should allow that slot.
+            for slot_index in range(3):
+                slot_selection = sf.make_white_list(slot_index)
+                graph_walk, _ = par.resolve_walk_from_slot_selection(slot_selection=slot_selection, **kwargs)
+                for graph_hop in graph_walk.hop_seq:
+                    start_cmd = edge_lookup_map[graph_hop.edge_id].start_cmd
+                    if start_cmd is not None:
+                        self.assertTrue(sf.all_pass(start_cmd.slot_filter, slot_selection))
+
+            with self.assertRaises(chex.InvalidSlotFilterPath):
+                par.resolve_walk_from_choice_seq(choice_seq=((sf.BLOCK_ALL,),), **kwargs)
+
+    def test_find_walk_from_choice_seq_does_not_backtrack_exponentially(self):
+        # Each alt sequence narrows the same scope, so taking the allow-all alt anywhere only fails at the very end.
+        sequence_count = 30
+        token_path = tuple(
+            (
+                par.FilteredAlt(items=(stp.token(f'A{i}'),)),
+                par.FilteredAlt(items=(stp.token(f'B{i}'),), slot_filter=sf.make_black_list(i + 1)),
+            )
+            for i in range(sequence_count)
+        )
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        choice_seq = ((sf.make_black_list(*range(1, sequence_count + 1)),),)
+
+        start = time.perf_counter()
+        graph_walk = par.find_walk_from_choice_seq(nodule_out_edge_map=nodule_out_edge_map
+                                                   , edge_lookup_map=edge_lookup_map
+                                                   , start_nodule=start_nodule
+                                                   , close_nodule=close_nodule
+                                                   , choice_seq=choice_seq
+                                                   )
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        token_data = tuple(t.data for hop in graph_walk.hop_seq for t in edge_lookup_map[hop.edge_id].token_seq)
+        self.assertEqual(tuple(f'B{i}' for i in range(sequence_count)), token_data)
+
+    def test_build_variant_index(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            for share_subgraphs in (False, True):
+                nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+                    procedure_path=token_path
+                    , share_subgraphs=share_subgraphs
+                )
+                kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                              , edge_lookup_map=edge_lookup_map
+                              , start_nodule=start_nodule
+                              , close_nodule=close_nodule
+                              )
+
+                # Build the expected bitsets by enumerating every walk and scanning its edges and tokens.
+                expected_edge_variants = collections.defaultdict(int)
+                expected_token_variants = collections.defaultdict(int)
+                variant_count = 0
+                for index, (graph_hop_seq, _, _) in enumerate(par.yield_pruned_valid_hop_seqs(**kwargs)):
+                    for graph_hop in graph_hop_seq:
+                        expected_edge_variants[graph_hop.edge_id] |= 1 << index
+                        for token in edge_lookup_map[graph_hop.edge_id].token_seq:
+                            expected_token_variants[token.id] |= 1 << index
+                    variant_count += 1
+
+                variant_index = par.build_variant_index(**kwargs)
+
+                self.assertEqual(variant_count, variant_index.variant_count)
+                self.assertEqual(dict(expected_edge_variants), variant_index.edge_variants)
+                self.assertEqual(dict(expected_token_variants), variant_index.token_variants)
+
+        self.assertEqual((0, 3, 64), tuple(par.yield_variant_indices(1 | 1 << 3 | 1 << 64)))
+
+    def test_diff_graph_walks(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            walks = tuple((par.GraphWalk(start=start_nodule, hop_seq=graph_hop_seq), choice_seq)
+                          for graph_hop_seq, _, choice_seq in itertools.islice(par.yield_pruned_valid_hop_seqs(**kwargs)
+                                                                               , 20
+                                                                               )
+                          )
+
+            for (graph_walk_a, _), (graph_walk_b, _) in itertools.product(walks, repeat=2):
+                differences = par.diff_graph_walks(edge_lookup_map=edge_lookup_map
+                                                   , graph_walk_a=graph_walk_a
+                                                   , graph_walk_b=graph_walk_b
+                                                   )
+
+                if graph_walk_a == graph_walk_b:
+                    self.assertEqual((), differences)
+                    continue
+
+                self.assertTrue(differences)
+
+                # Replacing each differing region of walk A with that of walk B should give walk B.
+                hop_seq = list(graph_walk_a.hop_seq)
+                token_seq = list(par.yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                                  , edge_lookup_map=edge_lookup_map
+                                                                  , graph_walk=graph_walk_a
+                                                                  ))
+                for difference in reversed(differences):
+                    # Both walks arrive at the destination nodule, which is the source nodule for an empty region.
+                    for graph_walk, hop_range in ((graph_walk_a, difference.hop_range_a)
+                                                  , (graph_walk_b, difference.hop_range_b)
+                                                  ):
+                        end_nodule = graph_walk.hop_seq[hop_range[-1]].nodule if hop_range else difference.src_nodule
+                        self.assertEqual(end_nodule, difference.dst_nodule)
+
+                    hop_range_a = difference.hop_range_a
+                    hop_seq[hop_range_a.start:hop_range_a.stop] = graph_walk_b.hop_seq[difference.hop_range_b.start:
+                                                                                       difference.hop_range_b.stop]
+
+                    token_start = sum(len(edge_lookup_map[hop.edge_id].token_seq)
+                                      for hop in graph_walk_a.hop_seq[:hop_range_a.start]
+                                      )
+                    token_seq[token_start:token_start + len(difference.token_seq_a)] = difference.token_seq_b
+
+                self.assertEqual(tuple(graph_walk_b.hop_seq), tuple(hop_seq))
+                self.assertEqual(tuple(par.yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                                        , edge_lookup_map=edge_lookup_map
+                                                                        , graph_walk=graph_walk_b
+                                                                        )), tuple(token_seq))
+
+            # Diffing choice sequences should diff the first walks with those choice sequences.
+            (graph_walk_a, choice_seq_a), (_, choice_seq_b) = walks[0], walks[-1]
+            graph_walk_b = next(graph_walk for graph_walk, choice_seq in walks if choice_seq == choice_seq_b)
+            self.assertEqual(par.diff_graph_walks(edge_lookup_map=edge_lookup_map
+                                                  , graph_walk_a=graph_walk_a
+                                                  , graph_walk_b=graph_walk_b
+                                                  )
+                             , par.diff_choice_seqs(choice_seq_a=choice_seq_a, choice_seq_b=choice_seq_b, **kwargs)
+                             )
+
+    def test_diff_graph_walks_of_unequal_length(self):
+        # Nodule 0 reaches nodule 3 either directly, or by way of nodule 1 or nodule 2.
+        # Nodule 3 then goes on to nodule 4, and nodule 1 is also a dead end of its own.
+        edges = {'01': (0, 1), '13': (1, 3), '02': (0, 2), '23': (2, 3), '03': (0, 3), '34': (3, 4)}
+        edge_lookup_map = {edge_id: par.EdgeDef(id=edge_id
+                                                , src_nodule=src_nodule
+                                                , dst_nodule=dst_nodule
+                                                , token_seq=(stp.token(edge_id),)
+                                                , start_cmd=None
+                                                , close_cmd=None
+                                                )
+                           for edge_id, (src_nodule, dst_nodule) in edges.items()
+                           }
+
+        def make_walk(*edge_ids: str) -> par.GraphWalk:
+            return par.GraphWalk(start=0
+                                 , hop_seq=tuple(par.GraphHop(edge_id=edge_id, nodule=edges[edge_id][1])
+                                                 for edge_id in edge_ids
+                                                 ))
+
+        def diff(walk_a: par.GraphWalk, walk_b: par.GraphWalk) -> typ.Sequence[typ.Tuple]:
+            return tuple((d.src_nodule, d.dst_nodule, d.hop_range_a, d.hop_range_b)
+                         for d in par.diff_graph_walks(edge_lookup_map=edge_lookup_map
+                                                       , graph_walk_a=walk_a
+                                                       , graph_walk_b=walk_b
+                                                       ))
+
+        # One walk takes more hops than the other to reach the same nodule.
+        self.assertEqual(((0, 3, range(0, 2), range(0, 1)),)
+                         , diff(make_walk('01', '13', '34'), make_walk('03', '34'))
+                         )
+        self.assertEqual(((0, 3, range(0, 1), range(0, 2)),)
+                         , diff(make_walk('03', '34'), make_walk('02', '23', '34'))
+                         )
+
+        # One walk ends while the other keeps going, so one of them has no hops in the differing region.
+        self.assertEqual(((3, None, range(1, 1), range(1, 2)),)
+                         , diff(make_walk('03'), make_walk('03', '34'))
+                         )
+        self.assertEqual(((3, None, range(2, 3), range(2, 2)),)
+                         , diff(make_walk('02', '23', '34'), make_walk('02', '23'))
+                         )
+
+        # The walks never meet again, and end at different nodules.
+        differences = par.diff_graph_walks(edge_lookup_map=edge_lookup_map
+                                           , graph_walk_a=make_walk('01')
+                                           , graph_walk_b=make_walk('02', '23', '34')
+                                           )
+        self.assertEqual(((0, None, range(0, 1), range(0, 3)),), diff(make_walk('01'), make_walk('02', '23', '34')))
+        self.assertEqual(('01',), tuple(token.data for token in differences[0].token_seq_a))
+        self.assertEqual(('02', '23', '34'), tuple(token.data for token in differences[0].token_seq_b))
+
+    def test_yield_valid_hop_seqs_in_pool(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+
+            expected = tuple(par.yield_pruned_valid_hop_seqs(**kwargs))
+
+            # Small chunks and windows, so that subspaces need to be paused and resumed several times.
+            for split_count, window in itertools.product((0, 1, 3), (None, 1, 3)):
+                ordered = tuple(par.yield_valid_hop_seqs_in_pool(split_count=split_count
+                                                                 , jobs=2
+                                                                 , chunk_size=5
+                                                                 , window=window
+                                                                 , **kwargs
+                                                                 ))
+                self.assertEqual(expected, ordered)
+
+                unordered = tuple(par.yield_valid_hop_seqs_in_pool(split_count=split_count
+                                                                   , jobs=2
+                                                                   , chunk_size=5
+                                                                   , ordered=False
+                                                                   , window=window
+                                                                   , **kwargs
+                                                                   ))
+                self.assertCountEqual(expected, unordered)
+
+            with self.assertRaises(ValueError):
+                tuple(par.yield_valid_hop_seqs_in_pool(window=0, **kwargs))
+
+    def test_yield_valid_hop_seqs_in_pool_window(self):
+        # Four alt sequences of three alts each, split into 27 subspaces of three walks each.
+        token_path = tuple(tuple(par.FilteredAlt(items=(stp.token(f'{i}{j}'),)) for j in 'ABC') for i in range(4))
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                      , edge_lookup_map=edge_lookup_map
+                      , start_nodule=start_nodule
+                      , close_nodule=close_nodule
+                      )
+
+        # Count submitted chunks using threads in place of processes, so that submissions can be seen from here.
+        submitted = []
+
+        class CountingExecutor(par.cf.ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                submitted.append(args)
+                return super().submit(fn, *args, **kwargs)
+
+        with unittest.mock.patch.object(par.cf, 'ProcessPoolExecutor', CountingExecutor):
+            for ordered in (True, False):
+                submitted.clear()
+                walks = par.yield_valid_hop_seqs_in_pool(split_count=3
+                                                         , jobs=2
+                                                         , chunk_size=1
+                                                         , ordered=ordered
+                                                         , window=4
+                                                         , **kwargs
+                                                         )
+
+                # Only a window's worth of chunks should be submitted before anything is yielded, plus one more
+                # to let the next subspace to be yielded go on.
+                next(walks)
+                self.assertLessEqual(len(submitted), 4 + 1)
+
+                remaining = tuple(walks)
+                self.assertEqual(81, 1 + len(remaining))
+
+    def test_process_many(self):
+        token_paths = tuple(stp.SAMPLE_TOKEN_PATHS.values())
+
+        for share_subgraphs in (False, True):
+            expected = tuple(
+                cpt.make_compact_graph(**dict(zip(('nodule_out_edge_map', 'edge_lookup_map',
+                                                   'start_nodule', 'close_nodule')
+                                                  , par.process(procedure_path=token_path
+                                                                , share_subgraphs=share_subgraphs
+                                                                )
+                                                  )))
+                for token_path in token_paths
+            )
+
+            actual = tuple(par.process_many(token_paths * 2
+                                            , jobs=2
+                                            , chunk_size=3
+                                            , share_subgraphs=share_subgraphs
+                                            , warm_up_modules=('cheffu.sample_token_paths',)
+                                            ))
+
+            self.assertEqual(expected * 2, actual)
+
+        # Warm-up modules that cannot be imported, such as those missing optional dependencies, are skipped.
+        actual = tuple(par.process_many(token_paths
+                                        , jobs=2
+                                        , warm_up_modules=(*par.TOKEN_DEF_WARM_UP_MODULES, 'cheffu.no_such_module')
+                                        , window=1
+                                        ))
+        self.assertEqual(len(token_paths), len(actual))
+
+        # Procedure paths are read lazily, so an endless supply can be processed for as long as needed.
+        actual = tuple(itertools.islice(par.process_many(itertools.cycle(token_paths), jobs=2, chunk_size=2)
+                                        , len(token_paths) * 3
+                                        ))
+        self.assertEqual(len(token_paths) * 3, len(actual))
+
+    def test_fingerprint_graph(self):
+        fingerprints = set()
+
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, _ = par.process(procedure_path=token_path)
+            expected = par.fingerprint_graph(nodule_out_edge_map=nodule_out_edge_map
+                                             , edge_lookup_map=edge_lookup_map
+                                             , start_nodule=start_nodule
+                                             )
+
+            # Neither random IDs nor shared subgraphs should change the fingerprint.
+            for share_subgraphs in (False, True):
+                nodule_out_edge_map, edge_lookup_map, start_nodule, _ = par.process(procedure_path=token_path
+                                                                                    , nodule_gen=uuid.uuid4
+                                                                                    , edge_id_gen=uuid.uuid4
+                                                                                    , share_subgraphs=share_subgraphs
+                                                                                    )
+                self.assertEqual(expected, par.fingerprint_graph(nodule_out_edge_map=nodule_out_edge_map
+                                                                 , edge_lookup_map=edge_lookup_map
+                                                                 , start_nodule=start_nodule
+                                                                 ))
+
+            fingerprints.add(expected)
+
+        # Different procedure paths should have different fingerprints.
+        self.assertEqual(len(stp.SAMPLE_TOKEN_PATHS), len(fingerprints))
+
+        # Changing a single token should change the fingerprint.
+        sequence = stp.SAMPLE_TOKEN_PATHS['sequence']
+        changed = (*sequence[:-1], sequence[-1]._replace(data='Z'))
+        self.assertNotIn(par.fingerprint_graph(**dict(zip(('nodule_out_edge_map', 'edge_lookup_map', 'start_nodule')
+                                                          , par.process(procedure_path=changed)
+                                                          ))), fingerprints)
+
+    def test_process_lazily(self):
+        def yield_walk_contents(nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule):
+            for graph_hop_seq, stack_hop_seq, choice_seq in par.yield_pruned_valid_hop_seqs(
+                    nodule_out_edge_map=nodule_out_edge_map
+                    , edge_lookup_map=edge_lookup_map
+                    , start_nodule=start_nodule
+                    , close_nodule=close_nodule
+            ):
+                graph_walk = par.GraphWalk(start=start_nodule, hop_seq=graph_hop_seq)
+                yield (tuple(par.yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                              , edge_lookup_map=edge_lookup_map
+                                                              , graph_walk=graph_walk
+                                                              ))
+                       , tuple(stack_hop_seq)
+                       , choice_seq
+                       )
+
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            graph = par.process(procedure_path=token_path)
+            lazy_graph = par.process_lazily(procedure_path=token_path)
+
+            # Walks should be the same and in the same order, regardless of IDs.
+            self.assertEqual(tuple(yield_walk_contents(*graph)), tuple(yield_walk_contents(*lazy_graph)))
+            self.assertEqual(par.fingerprint_graph(nodule_out_edge_map=graph[0]
+                                                   , edge_lookup_map=graph[1]
+                                                   , start_nodule=graph[2]
+                                                   )
+                             , par.fingerprint_graph(nodule_out_edge_map=lazy_graph[0]
+                                                     , edge_lookup_map=lazy_graph[1]
+                                                     , start_nodule=lazy_graph[2]
+                                                     ))
+
+            # Iterating over a lazy graph builds all of it.
+            self.assertEqual(len(graph[0]), len(lazy_graph[0]))
+            self.assertEqual(len(graph[1]), len(lazy_graph[1]))
+
+        # Resolving a single walk should only build part of the graph.
+        token_path = stp.SAMPLE_TOKEN_PATHS['kitchen_sink']
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+        lazy_graph = par.LazyGraph(procedure_path=token_path)
+
+        _, _, choice_seq = next(iter(par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                     , edge_lookup_map=edge_lookup_map
+                                                                     , start_nodule=start_nodule
+                                                                     , close_nodule=close_nodule
+                                                                     )))
+        _, expected_token_seq = par.resolve_walk_from_choice_seq(nodule_out_edge_map=nodule_out_edge_map
+                                                                 , edge_lookup_map=edge_lookup_map
+                                                                 , start_nodule=start_nodule
+                                                                 , close_nodule=close_nodule
+                                                                 , choice_seq=choice_seq
+                                                                 )
+        _, actual_token_seq = par.resolve_walk_from_choice_seq(nodule_out_edge_map=lazy_graph.nodule_out_edge_map
+                                                               , edge_lookup_map=lazy_graph.edge_lookup_map
+                                                               , start_nodule=lazy_graph.start_nodule
+                                                               , close_nodule=lazy_graph.close_nodule
+                                                               , choice_seq=choice_seq
+                                                               )
+
+        self.assertEqual(expected_token_seq, actual_token_seq)
+        self.assertLess(lazy_graph.built_edge_count, len(edge_lookup_map))
+
+    def test_build_token_trie(self):
+        for token_path in stp.SAMPLE_TOKEN_PATHS.values():
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=token_path)
+            graph_hop_seqs = tuple(
+                graph_hop_seq
+                for graph_hop_seq, _, _ in par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                                           , edge_lookup_map=edge_lookup_map
+                                                                           , start_nodule=start_nodule
+                                                                           , close_nodule=close_nodule
+                                                                           )
+            )
+
+            token_trie = par.build_token_trie(edge_lookup_map=edge_lookup_map, graph_hop_seqs=graph_hop_seqs)
+            self.assertEqual(len(graph_hop_seqs), len(token_trie.walk_leaves))
+
+            for walk_index, graph_hop_seq in enumerate(graph_hop_seqs):
+                graph_walk = par.GraphWalk(start=start_nodule, hop_seq=graph_hop_seq)
+                expected = tuple(par.yield_tokens_from_graph_walk(nodule_out_edge_map=nodule_out_edge_map
+                                                                  , edge_lookup_map=edge_lookup_map
+                                                                  , graph_walk=graph_walk
+                                                                  ))
+                actual = tuple(par.yield_tokens_from_token_trie(token_trie=token_trie, walk_index=walk_index))
+                self.assertEqual(expected, actual)
+
+            # Shared prefixes should only be stored once, so there should never be more trie nodes than hops.
+            self.assertLessEqual(len(token_trie.node_parents) - 1, sum(len(h) for h in graph_hop_seqs))
+
+    def test_process_share_subgraphs(self):
+        def walk_summary(token_path, share_subgraphs):
+            nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+                procedure_path=token_path,
+                share_subgraphs=share_subgraphs,
+            )
+            kwargs = dict(nodule_out_edge_map=nodule_out_edge_map
+                          , edge_lookup_map=edge_lookup_map
+                          , start_nodule=start_nodule
+                          , close_nodule=close_nodule
+                          )
+            walks = tuple(
+                (tuple(t.data for hop in graph_hop_seq for t in edge_lookup_map[hop.edge_id].token_seq), choice_seq)
+                for graph_hop_seq, _, choice_seq in par.yield_pruned_valid_hop_seqs(**kwargs)
+            )
+
+            # Validating walks after the fact should agree with pruning them along the way.
+            self.assertEqual(walks, tuple(
+                (tuple(t.data for hop in graph_hop_seq for t in edge_lookup_map[hop.edge_id].token_seq), choice_seq)
+                for graph_hop_seq, _, choice_seq in par.yield_valid_hop_seqs(**kwargs)
+            ))
+
+            return walks, len(edge_lookup_map)
+
+        def mirror(token_path, token_data_map):
+            return tuple(
+                stp.token(token_data_map.get(item.data, item.data)) if isinstance(item, ctpt.Token)
+                else tuple(alt._replace(items=mirror(alt.items, token_data_map)) for alt in item)
+                for item in token_path
+            )
+
+        # A sub-procedure that is reused in several places, leading to the same place each time.
+        sub_alt_seq = (par.FilteredAlt(items=(stp.token('S'),)), par.FilteredAlt(items=(stp.token('T'),)))
+        shared_token = stp.token('Y')
+        shared_token_path = (
+            stp.token('A'),
+            (
+                par.FilteredAlt(items=(stp.token('X'), sub_alt_seq, shared_token)),
+                par.FilteredAlt(items=(stp.token('Z'), sub_alt_seq, shared_token)),
+            ),
+            sub_alt_seq,
+            shared_token,
+        )
+
+        # The symmetric sample path, with the mirrored alts of each alt sequence given the same tokens after their
+        # first one. The tokens of the sample path itself are all different, so there is nothing in it to share.
+        mirrored_token_path = mirror(stp.SAMPLE_TOKEN_PATHS['symmetric_depth_2']
+                                     , {'F': 'D', 'G': 'E', 'I': 'H', 'L': 'J', 'M': 'K', 'O': 'N'
+                                        , 'U': 'S', 'V': 'T', 'X': 'W', '0': 'Y', '1': 'Z', '3': '2'
+                                        })
+
+        for token_path in (*stp.SAMPLE_TOKEN_PATHS.values(), shared_token_path, mirrored_token_path):
+            expected_walks, expected_edge_count = walk_summary(token_path, False)
+            actual_walks, actual_edge_count = walk_summary(token_path, True)
+
+            self.assertEqual(expected_walks, actual_walks)
+            self.assertLessEqual(actual_edge_count, expected_edge_count)
+
+        self.assertLess(walk_summary(shared_token_path, True)[1], walk_summary(shared_token_path, False)[1])
+
+        # Sibling alts with different slot filters share everything after their own entry edges.
+        self.assertEqual(8, len(walk_summary(mirrored_token_path, True)[0]))
+        self.assertEqual((31, 23), (walk_summary(mirrored_token_path, False)[1]
+                                    , walk_summary(mirrored_token_path, True)[1]
+                                    ))
+
 if __name__ == '__main__':
     unittest.main()
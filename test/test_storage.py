@@ -0,0 +1,127 @@
+import os
+import struct
+import tempfile
+import unittest
+import uuid
+
+import cheffu.compact as cpt
+import cheffu.exceptions as chex
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+import cheffu.storage as cst
+
+
+class TestStorage(unittest.TestCase):
+    def test_save_load_compact_graph(self):
+        # Integer, UUID and arbitrary IDs are each stored differently.
+        id_gen_factories = (None, lambda: uuid.uuid4, lambda: (lambda: f'id_{uuid.uuid4()}'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for key, token_path in stp.SAMPLE_TOKEN_PATHS.items():
+                for i, id_gen_factory in enumerate(id_gen_factories):
+                    id_gen = None if id_gen_factory is None else id_gen_factory()
+                    nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+                        procedure_path=token_path
+                        , nodule_gen=id_gen
+                        , edge_id_gen=id_gen
+                    )
+                    compact_graph = cpt.make_compact_graph(nodule_out_edge_map=nodule_out_edge_map
+                                                           , edge_lookup_map=edge_lookup_map
+                                                           , start_nodule=start_nodule
+                                                           , close_nodule=close_nodule
+                                                           )
+
+                    path = os.path.join(tmp_dir, f'{key}_{i}.chg')
+                    cst.save_compact_graph(compact_graph=compact_graph, path=path)
+                    loaded_graph = cst.load_compact_graph(path)
+
+                    self.assertEqual(compact_graph.nodule_count, loaded_graph.nodule_count)
+                    self.assertEqual(compact_graph.edge_count, loaded_graph.edge_count)
+                    self.assertEqual(compact_graph.stack_cmds, loaded_graph.stack_cmds)
+
+                    # Expanding the loaded graph should give back the original graph.
+                    expanded = cpt.expand_compact_graph(loaded_graph)
+                    for edge_id, edge_def in edge_lookup_map.items():
+                        self.assertEqual(edge_def._replace(token_seq=tuple(edge_def.token_seq)), expanded[1][edge_id])
+                    self.assertEqual(start_nodule, expanded[2])
+                    self.assertEqual(close_nodule, expanded[3])
+                    for nodule, out_edge_ids in nodule_out_edge_map.items():
+                        self.assertEqual(tuple(out_edge_ids), tuple(expanded[0][nodule]))
+
+                    # Walks over the loaded graph should match walks over the original graph.
+                    kwargs = dict(zip(('nodule_out_edge_map', 'edge_lookup_map', 'start_nodule', 'close_nodule')
+                                      , cpt.view_compact_graph(compact_graph)
+                                      ))
+                    loaded_kwargs = dict(zip(('nodule_out_edge_map', 'edge_lookup_map', 'start_nodule', 'close_nodule')
+                                             , cpt.view_compact_graph(loaded_graph)
+                                             ))
+                    self.assertEqual(tuple(par.yield_pruned_valid_hop_seqs(**kwargs))
+                                     , tuple(par.yield_pruned_valid_hop_seqs(**loaded_kwargs))
+                                     )
+
+    def test_load_invalid_compact_graph(self):
+        data = cst.dump_compact_graph(cpt.make_compact_graph(**dict(zip(
+            ('nodule_out_edge_map', 'edge_lookup_map', 'start_nodule', 'close_nodule'),
+            par.process(procedure_path=stp.SAMPLE_TOKEN_PATHS['sequence']),
+        ))))
+
+        with self.assertRaises(chex.InvalidGraphFile):
+            cst.load_compact_graph_from_buffer(b'NOTCHEFF' + data[8:])
+
+        with self.assertRaises(chex.InvalidGraphFile):
+            cst.load_compact_graph_from_buffer(data[:8] + (cst.FORMAT_VERSION + 1).to_bytes(2, 'little') + data[10:])
+
+        with self.assertRaises(chex.InvalidGraphFile):
+            cst.load_compact_graph_from_buffer(data[:4])
+
+        # Section table entries start right after the header, and the first one is the META section.
+        entry_offset = cst.HEADER_STRUCT.size
+        tag, meta_offset, meta_length = cst.SECTION_STRUCT.unpack_from(data, entry_offset)
+        self.assertEqual(cst.META, tag)
+
+        def with_section_entry(tag: bytes, offset: int, length: int) -> bytes:
+            entry = cst.SECTION_STRUCT.pack(tag, offset, length)
+            return data[:entry_offset] + entry + data[entry_offset + len(entry):]
+
+        corrupt_buffers = (
+            # More sections than fit in the file.
+            data[:12] + struct.pack('<I', 2 ** 31) + data[16:],
+            # Sections outside of the file, overlapping the header, or not aligned.
+            with_section_entry(cst.META, 2 ** 40, meta_length),
+            with_section_entry(cst.META, 0, meta_length),
+            with_section_entry(cst.META, meta_offset + 1, meta_length),
+            # A truncated META section.
+            with_section_entry(cst.META, meta_offset, meta_length - 1),
+            # A missing META section.
+            with_section_entry(b'XXXX', meta_offset, meta_length),
+            # A start nodule out of range.
+            data[:meta_offset] + struct.pack('<I', 1000) + data[meta_offset + 4:],
+            # An unknown nodule ID kind.
+            data[:meta_offset + 8] + bytes([99]) + data[meta_offset + 9:],
+        )
+        for corrupt_buffer in corrupt_buffers:
+            with self.assertRaises(chex.InvalidGraphFile):
+                cst.load_compact_graph_from_buffer(corrupt_buffer)
+
+        # Corrupt tokens are only found once they are decoded.
+        graph = cst.load_compact_graph_from_buffer(data.replace(b'"data"', b'"dat\xff"'))
+        with self.assertRaises(chex.InvalidGraphFile):
+            graph.tokens[0]
+
+    def test_save_unsupported_compact_graph(self):
+        def make_compact_graph(procedure_path, id_gen=None):
+            return cpt.make_compact_graph(**dict(zip(
+                ('nodule_out_edge_map', 'edge_lookup_map', 'start_nodule', 'close_nodule'),
+                par.process(procedure_path=procedure_path, nodule_gen=id_gen),
+            )))
+
+        # IDs of other types, which could only be stored by pickling them, are rejected.
+        ids = iter(range(1000))
+        with self.assertRaises(chex.UnsupportedGraphContent):
+            cst.dump_compact_graph(make_compact_graph(stp.SAMPLE_TOKEN_PATHS['sequence'], lambda: ('id', next(ids))))
+
+        # Token data has to load back from JSON unchanged.
+        for data in (object(), ('a', 'b'), float('nan')):
+            token = stp.token('A')._replace(data=data)
+            with self.assertRaises(chex.UnsupportedGraphContent):
+                cst.dump_compact_graph(make_compact_graph((token,)))
@@ -0,0 +1,85 @@
+import unittest
+
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.synthetic as syn
+import cheffu.types.tokens as ctpt
+
+
+def yield_alt_sequences(procedure_path: par.ProcedurePath, depth: int = 0):
+    """Yields each alt sequence in a procedure path, along with its nesting depth."""
+    for item in procedure_path:
+        if not isinstance(item, ctpt.Token):
+            yield item, depth
+            for alt in item:
+                yield from yield_alt_sequences(alt.items, depth + 1)
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_generate_procedure_path(self):
+        params = syn.SyntheticPathParams(token_count=12
+                                         , alt_sequence_count=4
+                                         , alt_width=3
+                                         , nesting_depth=2
+                                         , alt_token_count=2
+                                         , slot_count=3
+                                         )
+
+        procedure_path = syn.generate_procedure_path(params=params, seed=7)
+
+        # The same seed always gives the same path, down to token IDs.
+        self.assertEqual(procedure_path, syn.generate_procedure_path(params=params, seed=7))
+        self.assertNotEqual(procedure_path, syn.generate_procedure_path(params=params, seed=8))
+
+        self.assertEqual(12, sum(isinstance(item, ctpt.Token) for item in procedure_path))
+        self.assertEqual(16, len(procedure_path))
+
+        alt_sequences = tuple(yield_alt_sequences(procedure_path))
+        self.assertEqual(4, sum(depth == 0 for _, depth in alt_sequences))
+        self.assertEqual(4 * 3, sum(depth == 1 for _, depth in alt_sequences))
+        self.assertEqual({0, 1}, {depth for _, depth in alt_sequences})
+
+        # Without overlap, sibling alts allow disjoint slots that cover all slots between them.
+        for alt_sequence, _ in alt_sequences:
+            self.assertEqual(3, len(alt_sequence))
+            slot_filters = [alt.slot_filter for alt in alt_sequence]
+            self.assertEqual(3, len(set().union(*(set(sf.allowed_slots(f)) for f in slot_filters))))
+            for a, b in zip(slot_filters, slot_filters[1:]):
+                self.assertEqual(sf.BLOCK_ALL, sf.intersection(a, b))
+
+        # Alt sequences at the deepest level contain only tokens.
+        token_count = 12 + 4 * 3 * 2 + 4 * 3 * 3 * 2
+        self.assertEqual(token_count, syn.count_tokens(procedure_path))
+
+        nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(procedure_path=procedure_path)
+        self.assertEqual(token_count, sum(len(edge_def.token_seq) for edge_def in edge_lookup_map.values()))
+
+    def test_ratios(self):
+        params = syn.SyntheticPathParams(alt_width=4, slot_count=4, null_alt_ratio=1.0, slot_filter_overlap=1.0)
+        procedure_path = syn.generate_procedure_path(params=params)
+
+        all_slots = sf.make_white_list(0, 1, 2, 3)
+        for alt_sequence, _ in yield_alt_sequences(procedure_path):
+            for alt in alt_sequence:
+                self.assertEqual((), alt.items)
+                self.assertEqual(all_slots, alt.slot_filter)
+
+        # More alts than slots means some alts have to share slots.
+        params = syn.SyntheticPathParams(alt_width=3, slot_count=2)
+        for alt_sequence, _ in yield_alt_sequences(syn.generate_procedure_path(params=params)):
+            for alt in alt_sequence:
+                self.assertNotEqual(sf.BLOCK_ALL, alt.slot_filter)
+
+    def test_no_nesting(self):
+        params = syn.SyntheticPathParams(token_count=5, nesting_depth=0)
+        procedure_path = syn.generate_procedure_path(params=params)
+
+        self.assertEqual(5, len(procedure_path))
+        self.assertTrue(all(isinstance(item, ctpt.Token) for item in procedure_path))
+
+    def test_invalid_params(self):
+        for params in (syn.SyntheticPathParams(token_count=-1)
+                       , syn.SyntheticPathParams(alt_width=0)
+                       , syn.SyntheticPathParams(null_alt_ratio=1.5)
+                       ):
+            self.assertRaises(ValueError, syn.generate_procedure_path, params=params)
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+
+import cheffu.parallel as par
+import cheffu.sample_token_paths as stp
+import cheffu.tracing as ctr
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        ctr.TRACER.reset()
+
+    def tearDown(self):
+        ctr.disable()
+        ctr.TRACER.reset()
+
+    def test_disabled(self):
+        par.process(procedure_path=stp.SAMPLE_TOKEN_PATHS['kitchen_sink'])
+        with ctr.span('stage', value=1) as span:
+            span.set(other=2)
+
+        self.assertEqual([], ctr.TRACER.events)
+
+    def test_span(self):
+        tracer = ctr.Tracer(enabled=True)
+
+        with tracer.span('outer', recipe='kitchen_sink') as outer:
+            with tracer.span('inner'):
+                pass
+            outer.set(edge_count=3)
+
+        with self.assertRaises(KeyError):
+            with tracer.span('failing'):
+                raise KeyError()
+
+        inner, outer, failing = tracer.events
+        self.assertEqual(['inner', 'outer', 'failing'], [event['name'] for event in tracer.events])
+        self.assertEqual({'recipe': 'kitchen_sink', 'edge_count': 3}, outer['args'])
+        self.assertEqual({'error': 'KeyError'}, failing['args'])
+
+        # The inner span is nested within the outer span.
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'], outer['ts'] + outer['dur'])
+
+        for event in tracer.events:
+            self.assertEqual('X', event['ph'])
+            self.assertEqual(ctr.TRACE_CATEGORY, event['cat'])
+
+        trace = tracer.trace()
+        self.assertEqual(['outer', 'inner', 'failing'], [event['name'] for event in trace['traceEvents']])
+
+    def test_recording(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'trace.json')
+
+            with ctr.recording(path):
+                nodule_out_edge_map, edge_lookup_map, start_nodule, close_nodule = par.process(
+                    procedure_path=stp.SAMPLE_TOKEN_PATHS['kitchen_sink']
+                )
+                variant_count = par.count_valid_walks(nodule_out_edge_map=nodule_out_edge_map
+                                                      , edge_lookup_map=edge_lookup_map
+                                                      , start_nodule=start_nodule
+                                                      , close_nodule=close_nodule
+                                                      )
+                walks = tuple(par.yield_pruned_valid_hop_seqs(nodule_out_edge_map=nodule_out_edge_map
+                                                              , edge_lookup_map=edge_lookup_map
+                                                              , start_nodule=start_nodule
+                                                              , close_nodule=close_nodule
+                                                              ))
+
+            self.assertFalse(ctr.TRACER.enabled)
+
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace['traceEvents']
+        events_by_name = {}
+        for event in events:
+            events_by_name.setdefault(event['name'], []).append(event)
+
+        process_event, = events_by_name['process']
+        self.assertEqual(len(edge_lookup_map), process_event['args']['edge_count'])
+        self.assertEqual(len(nodule_out_edge_map), process_event['args']['nodule_count'])
+
+        # Alt sequence spans are nested within the process span, and together cover all edges built within them.
+        alt_seq_events = events_by_name['process_alt_sequence']
+        self.assertTrue(alt_seq_events)
+        for event in alt_seq_events:
+            self.assertLessEqual(process_event['ts'], event['ts'])
+            self.assertGreater(event['args']['alt_count'], 0)
+            self.assertLessEqual(event['args']['edge_count'], len(edge_lookup_map))
+
+        count_event, = events_by_name['count_valid_walks']
+        self.assertEqual(variant_count, count_event['args']['variant_count'])
+
+        enumerate_event, = events_by_name['enumerate_walks']
+        self.assertEqual(len(walks), enumerate_event['args']['walk_count'])
@@ -0,0 +1,66 @@
+import itertools
+import unittest
+
+import cheffu.exceptions as chex
+import cheffu.parallel as par
+import cheffu.slot_filter as sf
+import cheffu.vectorized as vec
+
+from test_parallel import yield_valid_stack_cmd_seqs
+
+
+def remap_slot_filters(stack_cmd_seq: par.StackCommandSequence, slot_filters) -> par.StackCommandSequence:
+    """Consistently replaces each distinct slot filter in a stack command sequence, keeping pushes and pops paired."""
+    mapping = {}
+    slot_filter_iter = itertools.cycle(slot_filters)
+
+    def remap(stack_cmd: par.StackCommand) -> par.StackCommand:
+        if stack_cmd is None:
+            return None
+        if stack_cmd.slot_filter not in mapping:
+            mapping[stack_cmd.slot_filter] = next(slot_filter_iter)
+        return stack_cmd._replace(slot_filter=mapping[stack_cmd.slot_filter])
+
+    return tuple(remap(stack_cmd) for stack_cmd in stack_cmd_seq)
+
+
+class TestVectorized(unittest.TestCase):
+    def test_encode_slot_filters(self):
+        slot_filters = (sf.ALLOW_ALL, sf.BLOCK_ALL, sf.make_white_list(0, 70), sf.make_black_list(3, 200))
+        filter_words = vec.encode_slot_filters(slot_filters)
+
+        self.assertEqual(4, filter_words.shape[1])
+        for slot_filter, words in zip(slot_filters, filter_words):
+            self.assertEqual(slot_filter, vec.decode_slot_filter(words))
+
+    def test_validate_stack_cmd_seqs(self):
+        valid_seqs = tuple(itertools.chain.from_iterable(yield_valid_stack_cmd_seqs(i) for i in range(7)))
+
+        # Small white lists often fail to intersect, giving plenty of illegal sequences.
+        white_lists = tuple(sf.make_white_list(*indices) for indices in ((0,), (0, 1), (1,), (1, 2, 64)))
+        remapped_seqs = tuple(remap_slot_filters(stack_cmd_seq, white_lists[i % 4:] + white_lists[:i % 4])
+                              for i, stack_cmd_seq in enumerate(valid_seqs)
+                              )
+
+        # Unbalanced sequences, which leave slot filters on the stack.
+        unbalanced_seqs = tuple(stack_cmd_seq[:-1] for stack_cmd_seq in valid_seqs if stack_cmd_seq[-1:] != (None,))
+
+        stack_cmd_seqs = valid_seqs + remapped_seqs + unbalanced_seqs
+
+        expected = tuple(par.validate_stack_cmd_seq(stack_cmd_seq=stack_cmd_seq) for stack_cmd_seq in stack_cmd_seqs)
+        actual = vec.validate_stack_cmd_seqs(stack_cmd_seqs=stack_cmd_seqs, batch_size=100)
+
+        self.assertEqual(expected, actual)
+        self.assertIn((True, ()), actual)
+        self.assertIn((False, None), actual)
+
+    def test_validate_stack_cmd_seqs_illegal_pops(self):
+        push_0 = par.StackOperation(direction=par.StackDirection.PUSH, slot_filter=sf.make_white_list(0))
+        pop_0 = par.StackOperation(direction=par.StackDirection.POP, slot_filter=sf.make_white_list(0))
+        pop_1 = par.StackOperation(direction=par.StackDirection.POP, slot_filter=sf.make_white_list(1))
+
+        with self.assertRaises(chex.SlotFilterStackEmpty):
+            vec.validate_stack_cmd_seqs(stack_cmd_seqs=((push_0, pop_0), (pop_0,)))
+
+        with self.assertRaises(chex.SlotFilterStackResultMismatch):
+            vec.validate_stack_cmd_seqs(stack_cmd_seqs=((push_0, pop_1),))